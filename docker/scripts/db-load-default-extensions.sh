@@ -8,3 +8,6 @@ set -e
 # way to install the extension as part of the test run.
 psql -U django -d template1 -v ON_ERROR_STOP=1 -c 'CREATE EXTENSION IF NOT EXISTS citext;'
 
+# The trigram indexes of the document search index need pg_trgm, which only a
+# superuser can install (see ietf/doc/migrations/0021_documentsearchindex.py).
+psql -U django -d template1 -v ON_ERROR_STOP=1 -c 'CREATE EXTENSION IF NOT EXISTS pg_trgm;'
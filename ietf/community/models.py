@@ -111,3 +111,12 @@ def notify_events(sender, instance, **kwargs):
 
 
 signals.post_save.connect(notify_events)
+
+
+def search_rule_changed(sender, instance, **kwargs):
+    from ietf.community.utils import invalidate_name_contains_matcher
+    invalidate_name_contains_matcher()
+
+
+signals.post_save.connect(search_rule_changed, sender=SearchRule)
+signals.post_delete.connect(search_rule_changed, sender=SearchRule)
@@ -2,15 +2,20 @@
 # -*- coding: utf-8 -*-
 
 
+import mock
+
 from pyquery import PyQuery
 
+from django.db import transaction
+from django.test import override_settings
 from django.urls import reverse as urlreverse
 
 import debug                            # pyflakes:ignore
 
 from ietf.community.models import CommunityList, SearchRule, EmailSubscription
-from ietf.community.utils import docs_matching_community_list_rule, community_list_rules_matching_doc
-from ietf.community.utils import reset_name_contains_index_for_rule
+from ietf.community.utils import docs_matching_community_list_rule, community_list_rules_matching_doc, docs_tracked_by_community_list
+from ietf.community.utils import reset_name_contains_index_for_rule, update_name_contains_indexes_with_new_doc, NameContainsMatcher
+from ietf.community.utils import invalidate_name_contains_matcher, name_contains_matcher
 import ietf.community.views
 from ietf.group.models import Group
 from ietf.group.utils import setup_default_community_list_for_group
@@ -19,7 +24,7 @@ from ietf.doc.utils import add_state_change_event
 from ietf.person.models import Person, Email, Alias
 from ietf.utils.test_utils import TestCase, login_testing_unauthorized
 from ietf.utils.mail import outbox
-from ietf.doc.factories import WgDraftFactory
+from ietf.doc.factories import WgDraftFactory, WgRfcFactory
 from ietf.group.factories import GroupFactory, RoleFactory
 from ietf.person.factories import PersonFactory, EmailFactory, AliasFactory
 
@@ -86,6 +91,92 @@ class CommunityListTests(TestCase):
         # rule -> docs
         self.assertTrue(draft in list(docs_matching_community_list_rule(rule_group_exp)))
 
+    def test_name_contains_index_with_new_doc(self):
+        active = State.objects.get(type="draft", slug="active")
+        clist = CommunityList.objects.create(person=PersonFactory())
+        other_clist = CommunityList.objects.create(person=PersonFactory())
+        rule_mars = SearchRule.objects.create(rule_type="name_contains", state=active, text="-mars-", community_list=clist)
+        rule_mars_too = SearchRule.objects.create(rule_type="name_contains", state=active, text="-mars-", community_list=other_clist)
+        rule_regex = SearchRule.objects.create(rule_type="name_contains", state=active, text=r"^draft-ietf-[a-z]+-te?st$", community_list=clist)
+        rule_invalid = SearchRule.objects.create(rule_type="name_contains", state=active, text="draft-(", community_list=clist)
+
+        draft = WgDraftFactory(name="draft-ietf-mars-test")
+        update_name_contains_indexes_with_new_doc(draft)
+        self.assertEqual(set(draft.searchrule_set.all()), set([rule_mars, rule_mars_too, rule_regex]))
+        # updating again doesn't add anything
+        update_name_contains_indexes_with_new_doc(draft)
+        self.assertEqual(draft.searchrule_set.count(), 3)
+
+        other = WgDraftFactory(name="draft-ietf-venus-tst")
+        update_name_contains_indexes_with_new_doc(other)
+        self.assertEqual(list(other.searchrule_set.all()), [rule_regex])
+
+        # rule changes are picked up
+        rule_invalid.text = "-venus-"
+        rule_invalid.save()
+        rule_regex.delete()
+        update_name_contains_indexes_with_new_doc(other)
+        self.assertEqual(list(other.searchrule_set.all()), [rule_invalid])
+
+        # rules sharing a text, and patterns that can't be combined
+        self.assertEqual(NameContainsMatcher([(1, "a"), (2, "b"), (3, "a")]).matching_rule_ids("cab"), [1, 3, 2])
+        self.assertEqual(NameContainsMatcher([(1, r"(a)\1"), (2, "(?i)B")]).matching_rule_ids("aab"), [1, 2])
+        self.assertEqual(NameContainsMatcher([]).matching_rule_ids("a"), [])
+        # capturing groups keep their numbering
+        self.assertEqual(NameContainsMatcher([(1, "(a)b"), (2, r"(x)\1")]).matching_rule_ids("xx"), [2])
+        self.assertEqual(NameContainsMatcher([(1, "(a)b"), (2, r"(x)\1"), (3, "c")]).matching_rule_ids("abxx"), [1, 2])
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+    def test_name_contains_matcher_invalidation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_name_contains_matcher()
+        self.assertIs(name_contains_matcher(), name_contains_matcher())
+
+        clist = CommunityList.objects.create(person=PersonFactory())
+        with self.captureOnCommitCallbacks(execute=True):
+            rule = SearchRule.objects.create(rule_type="name_contains", state=State.objects.get(type="draft", slug="active"), text="-mars-", community_list=clist)
+            # a matcher built from uncommitted rules isn't kept
+            self.assertIsNot(name_contains_matcher(), name_contains_matcher())
+            self.assertEqual(name_contains_matcher().matching_rule_ids("draft-ietf-mars-test"), [rule.pk])
+        self.assertIs(name_contains_matcher(), name_contains_matcher())
+        self.assertEqual(name_contains_matcher().matching_rule_ids("draft-ietf-mars-test"), [rule.pk])
+
+    def test_name_contains_matcher_rolled_back_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_name_contains_matcher()
+        clist = CommunityList.objects.create(person=PersonFactory())
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                SearchRule.objects.create(rule_type="name_contains", state=State.objects.get(type="draft", slug="active"), text="-mars-", community_list=clist)
+                raise RuntimeError
+        # still inside the test's transaction, the matcher isn't kept
+        self.assertIsNot(name_contains_matcher(), name_contains_matcher())
+        self.assertEqual(name_contains_matcher().matching_rule_ids("draft-ietf-mars-test"), [])
+        # once outside any transaction it is kept again, although the on_commit callback never ran
+        with mock.patch.object(transaction.get_connection(), 'in_atomic_block', False):
+            self.assertIs(name_contains_matcher(), name_contains_matcher())
+
+    def test_docs_tracked_by_community_list(self):
+        clist = CommunityList.objects.create(person=PersonFactory())
+        added = WgDraftFactory()
+        rfc = WgRfcFactory()
+        added.relateddocument_set.create(relationship_id="became_rfc", target=rfc)
+        clist.added_docs.add(added)
+        group_draft = WgDraftFactory()
+        author_draft = WgDraftFactory(authors=[PersonFactory()])
+        WgDraftFactory()  # not tracked
+        active = State.objects.get(type="draft", slug="active")
+        SearchRule.objects.create(rule_type="group", group=group_draft.group, state=active, community_list=clist)
+        SearchRule.objects.create(rule_type="author", person=author_draft.documentauthor_set.first().person, state=active, community_list=clist)
+        SearchRule.objects.create(rule_type="group_exp", group=group_draft.group, state=State.objects.get(type="draft", slug="expired"), community_list=clist)
+
+        # one query for the rules, one for the documents
+        with self.assertNumQueries(2):
+            docs = list(docs_tracked_by_community_list(clist))
+        self.assertCountEqual(docs, [added, rfc, group_draft, author_draft])
+
+        self.assertEqual(list(docs_tracked_by_community_list(CommunityList(person=PersonFactory()))), [])
+
     def test_view_list_duplicates(self):
         person = PersonFactory(name="John Q. Public", user__username="bazquux@example.com")
         PersonFactory(name="John Q. Public", user__username="foobar@example.com")
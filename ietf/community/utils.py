@@ -2,19 +2,28 @@
 # -*- coding: utf-8 -*-
 
 
+import operator
 import re
+import threading
+import uuid
 
+from collections import defaultdict
+from functools import reduce
+
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Q
 from django.conf import settings
 
 import debug                            # pyflakes:ignore
 
 from ietf.community.models import CommunityList, EmailSubscription, SearchRule
-from ietf.doc.models import Document, State
+from ietf.doc.models import Document, RelatedDocument, State
 from ietf.group.models import Role
 from ietf.person.models import Person
 from ietf.ietfauth.utils import has_role
 
+from ietf.utils.log import log
 from ietf.utils.mail import send_mail
 
 def states_of_significant_change():
@@ -48,14 +57,114 @@ def reset_name_contains_index_for_rule(rule):
 
     rule.name_contains_index.set(Document.objects.filter(name__regex=rule.text))
 
+class NameContainsMatcher:
+    """Matches a document name against all the name_contains rules at once.
+
+    Each distinct rule text is compiled once, and those without capturing
+    groups are also combined into a single alternation which is used to
+    quickly rule out names that match none of them. Patterns with groups
+    are always tried one by one, as combining them would renumber their
+    groups and break back references.
+    """
+    def __init__(self, rules, version=None):
+        self.version = version
+        self.rule_ids = defaultdict(list)
+        for pk, text in rules:
+            self.rule_ids[text].append(pk)
+        self.patterns = []
+        for text in self.rule_ids:
+            try:
+                self.patterns.append((text, re.compile(text)))
+            except re.error as e:
+                log("Ignoring name_contains rule with invalid regexp %r: %s" % (text, e))
+        combinable = [text for text, pattern in self.patterns if pattern.groups == 0]
+        self.uncombined = [(text, pattern) for text, pattern in self.patterns if pattern.groups > 0]
+        try:
+            self.combined = re.compile("|".join("(?:%s)" % text for text in combinable)) if combinable else None
+        except re.error:
+            # e.g. global flags, which must start the expression; fall back
+            # to trying each pattern
+            self.combined = None
+            self.uncombined = self.patterns
+
+    def matching_rule_ids(self, name):
+        if self.combined is not None and self.combined.search(name):
+            candidates = self.patterns
+        else:
+            candidates = self.uncombined
+        return [pk for text, pattern in candidates if pattern.search(name) for pk in self.rule_ids[text]]
+
+NAME_CONTAINS_RULES_VERSION_CACHE_KEY = "community:name_contains_rules_version"
+
+_name_contains_matcher = None
+
+class _NameContainsRuleChanges(threading.local):
+    # True while this thread's transaction has rule changes that may still
+    # be rolled back
+    pending = False
+
+_name_contains_rule_changes = _NameContainsRuleChanges()
+
+def invalidate_name_contains_matcher():
+    """Rebuild the name_contains matcher after a change to the rules
+
+    Other processes are told through a new rules version in the cache,
+    once the transaction changing the rules has committed. Until the
+    transaction ends, this thread rebuilds the matcher on each use rather
+    than sharing one built from changes that may still be rolled back.
+    """
+    global _name_contains_matcher
+    _name_contains_matcher = None
+    _name_contains_rule_changes.pending = True
+    transaction.on_commit(_name_contains_rules_committed)
+
+def _name_contains_rules_committed():
+    global _name_contains_matcher
+    _name_contains_matcher = None
+    _name_contains_rule_changes.pending = False
+    cache.set(NAME_CONTAINS_RULES_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+def name_contains_matcher():
+    """Return a NameContainsMatcher for the current name_contains rules.
+
+    The matcher is kept between calls, and rebuilt when the rules version
+    stored in the cache changes, which happens whenever a name_contains rule
+    is saved or deleted (see the signal hook in ietf.community.models), so
+    all processes see rule changes. Without a version in the cache, as with
+    the DummyCache used in development, the matcher is kept until it is
+    invalidated in this process.
+    """
+    global _name_contains_matcher
+    if _name_contains_rule_changes.pending and not transaction.get_connection().in_atomic_block:
+        # the changes were committed or rolled back
+        _name_contains_rule_changes.pending = False
+    pending = _name_contains_rule_changes.pending
+    version = cache.get(NAME_CONTAINS_RULES_VERSION_CACHE_KEY)
+    if not pending and _name_contains_matcher is not None and version in (None, _name_contains_matcher.version):
+        return _name_contains_matcher
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(NAME_CONTAINS_RULES_VERSION_CACHE_KEY, version, None)
+    matcher = NameContainsMatcher(
+        SearchRule.objects.filter(rule_type="name_contains").values_list("pk", "text"),
+        version,
+    )
+    if not pending:
+        _name_contains_matcher = matcher
+    return matcher
+
 def update_name_contains_indexes_with_new_doc(doc):
-    for r in SearchRule.objects.filter(rule_type="name_contains"):
-        # in theory we could use the database to do this query, but
-        # Django doesn't support a reversed regex operator, and regexp
-        # support needs backend-specific code so custom SQL is a bit
-        # cumbersome too
-        if re.search(r.text, doc.name) and not doc in r.name_contains_index.all():
-            r.name_contains_index.add(doc)
+    # in theory we could use the database to do this query, but
+    # Django doesn't support a reversed regex operator, and regexp
+    # support needs backend-specific code so custom SQL is a bit
+    # cumbersome too
+    rule_ids = name_contains_matcher().matching_rule_ids(doc.name)
+    if rule_ids:
+        through = SearchRule.name_contains_index.through
+        through.objects.bulk_create(
+            [through(searchrule_id=pk, document_id=doc.pk) for pk in rule_ids],
+            ignore_conflicts=True,
+        )
 
 
 def docs_matching_community_list_rule(rule):
@@ -162,18 +271,23 @@ def docs_tracked_by_community_list(clist):
     if clist.pk is None:
         return Document.objects.none()
 
-    # in theory, we could use an OR query, but databases seem to have
-    # trouble with OR queries and complicated joins so do the OR'ing
-    # manually
-    doc_ids = set()
-    for doc in clist.added_docs.all():
-        doc_ids.add(doc.pk)
-        doc_ids.update(rfc.pk for rfc in doc.related_that_doc("became_rfc"))
-
+    # databases seem to have trouble with OR queries and complicated
+    # joins, so rather than OR'ing the rule conditions, each source of
+    # documents is a separate subquery selecting document ids, and only
+    # those are OR'ed; this gives a single query without joins at the
+    # top level, whatever the number of rules and tracked documents
+    added = CommunityList.added_docs.through.objects.filter(communitylist=clist)
+    subqueries = [
+        added.values("document_id"),
+        RelatedDocument.objects.filter(
+            relationship_id="became_rfc",
+            source__in=added.values("document_id"),
+        ).values("target_id"),
+    ]
     for rule in clist.searchrule_set.all():
-        doc_ids = doc_ids | set(docs_matching_community_list_rule(rule).values_list("pk", flat=True))
+        subqueries.append(docs_matching_community_list_rule(rule).values("pk"))
 
-    return Document.objects.filter(pk__in=doc_ids)
+    return Document.objects.filter(reduce(operator.or_, (Q(pk__in=q) for q in subqueries)))
 
 def community_lists_tracking_doc(doc):
     return CommunityList.objects.filter(Q(added_docs=doc) | Q(searchrule__in=community_list_rules_matching_doc(doc)))
@@ -10,6 +10,7 @@ import uuid
 from django.http import HttpResponse, HttpResponseRedirect, Http404
 from django.shortcuts import get_object_or_404, render
 from django.contrib.auth.decorators import login_required
+from django.db.models import OuterRef, Subquery
 from django.utils import timezone
 from django.utils.html import strip_tags
 
@@ -237,18 +238,24 @@ def export_to_csv(request, email_or_name=None, acronym=None):
     ]
     writer.writerow(header)
 
-    docs = docs_tracked_by_community_list(clist).select_related('type', 'group', 'ad')
+    docs = docs_tracked_by_community_list(clist).select_related('type', 'group', 'ad', 'std_level')
+    docs = docs.annotate(
+        latest_revision_time=Subquery(
+            DocEvent.objects.filter(doc=OuterRef('pk'), type='new_revision').order_by('-time', '-id').values('time')[:1]
+        ),
+        latest_event_time=Subquery(
+            DocEvent.objects.filter(doc=OuterRef('pk')).order_by('-time', '-id').values('time')[:1]
+        ),
+    )
     for doc in docs.prefetch_related("states", "tags"):
         row = []
         row.append(doc.name)
         row.append(doc.title)
-        e = doc.latest_event(type='new_revision')
-        row.append(e.time.strftime("%Y-%m-%d") if e else "")
+        row.append(doc.latest_revision_time.strftime("%Y-%m-%d") if doc.latest_revision_time else "")
         row.append(strip_tags(doc.friendly_state()))
         row.append(doc.group.acronym if doc.group else "")
         row.append(str(doc.ad) if doc.ad else "")
-        e = doc.latest_event()
-        row.append(e.time.strftime("%Y-%m-%d") if e else "")
+        row.append(doc.latest_event_time.strftime("%Y-%m-%d") if doc.latest_event_time else "")
         writer.writerow(row)
 
     return response
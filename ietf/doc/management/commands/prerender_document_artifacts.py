@@ -0,0 +1,68 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+import multiprocessing
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document
+from ietf.doc.utils import prerender_document_artifacts
+
+
+def _prerender(name):
+    doc = Document.objects.get(name=name)
+    try:
+        return name, 'rendered' if prerender_document_artifacts(doc) else 'missing'
+    except Exception as e:
+        return name, f'failed: {e}'
+
+
+class Command(BaseCommand):
+    help = ('Render the htmlized and pdfized versions of active drafts into the artifact cache. '
+            'New revisions are rendered in the background when they are posted; this is for '
+            'warming an empty cache, e.g. after a renderer upgrade.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='only render these documents')
+        parser.add_argument('--rfcs', action='store_true', help='render RFCs as well as active drafts')
+        parser.add_argument('-j', '--jobs', type=int, default=4,
+                            help='number of documents rendered in parallel (default 4)')
+
+    def handle(self, *args, **options):
+        if not settings.ARTIFACT_CACHE_DIR:
+            raise CommandError('ARTIFACT_CACHE_DIR is not set, there is no cache to fill')
+        if options['names']:
+            docs = Document.objects.filter(name__in=options['names'])
+        else:
+            docs = Document.objects.filter(type_id='draft', states__type_id='draft', states__slug='active')
+            if options['rfcs']:
+                docs = docs.union(Document.objects.filter(type_id='rfc'))
+        names = sorted(docs.values_list('name', flat=True))
+
+        beg_time = time.time()
+        counts = {'rendered': 0, 'missing': 0, 'failed': 0}
+        if options['jobs'] > 1:
+            connections.close_all()  # each worker opens a connection of its own
+            with ProcessPoolExecutor(
+                    max_workers=options['jobs'],
+                    mp_context=multiprocessing.get_context('fork'),
+            ) as executor:
+                results = executor.map(_prerender, names, chunksize=10)
+                self._report(results, counts, options['verbosity'])
+        else:
+            self._report(map(_prerender, names), counts, options['verbosity'])
+        if options['verbosity'] > 0:
+            self.stdout.write('Rendered %d documents in %.1fs, %d without a file, %d failed' % (
+                counts['rendered'], time.time() - beg_time, counts['missing'], counts['failed']))
+
+    def _report(self, results, counts, verbosity):
+        for name, result in results:
+            counts[result.split(':')[0]] += 1
+            if result.startswith('failed') or verbosity > 1:
+                self.stdout.write(f'{name}: {result}')
@@ -0,0 +1,50 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import Document, DocumentSearchIndex
+
+
+# Columns of the search index matched with substring lookups
+TRIGRAM_COLUMNS = ["name", "title", "subseries", "came_from", "authors", "numbers"]
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the document search index from scratch.  The index is normally kept up to date '
+            'when documents, authors and relations are saved, but changes made with bulk database '
+            'operations are not seen by it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='only update the entries for these documents')
+        parser.add_argument('--trigram-indexes', action='store_true',
+                            help='(re)create the trigram indexes of the search index instead, once a database '
+                                 'superuser has installed the pg_trgm extension')
+
+    def handle(self, *args, **options):
+        if options['trigram_indexes']:
+            self.create_trigram_indexes()
+            if options['verbosity'] > 0:
+                self.stdout.write('Created trigram indexes on %s' % ', '.join(TRIGRAM_COLUMNS))
+            return
+        with transaction.atomic():
+            if options['names']:
+                docs = Document.objects.filter(name__in=options['names'])
+                DocumentSearchIndex.update_for(docs.values_list('pk', flat=True))
+            else:
+                DocumentSearchIndex.update_for()
+        if options['verbosity'] > 0:
+            self.stdout.write('%d entries in the document search index' % DocumentSearchIndex.objects.count())
+
+    def create_trigram_indexes(self):
+        table = DocumentSearchIndex._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                raise CommandError('The pg_trgm extension is not installed. A database superuser has to run '
+                                   '"CREATE EXTENSION IF NOT EXISTS pg_trgm;" first.')
+            for column in TRIGRAM_COLUMNS:
+                cursor.execute(f'DROP INDEX IF EXISTS doc_searchindex_{column}_search')
+                cursor.execute(f'CREATE INDEX doc_searchindex_{column}_search ON {table} USING gin ({column} gin_trgm_ops)')
@@ -0,0 +1,119 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# The trigram indexes let postgres answer the substring (LIKE '%...%')
+# lookups of the document search from the index instead of scanning the
+# table. They need the pg_trgm extension, which only a database superuser
+# can install, so it is a deployment prerequisite (see dev/INSTALL) rather
+# than something this migration does. Without it, only the name gets a
+# plain index, which serves prefix matches; the trigram indexes can be added
+# later with "update_document_search_index --trigram-indexes". They are
+# created here rather than in the model Meta so that test databases, which
+# are created without migrations, don't need pg_trgm.
+trigram_columns = ["name", "title", "subseries", "came_from", "authors"]
+
+
+def has_pg_trgm(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def create_search_indexes(apps, schema_editor):
+    if has_pg_trgm(schema_editor):
+        for column in trigram_columns:
+            schema_editor.execute(
+                f"CREATE INDEX doc_searchindex_{column}_search ON doc_documentsearchindex USING gin ({column} gin_trgm_ops)"
+            )
+    else:
+        schema_editor.execute(
+            "CREATE INDEX doc_searchindex_name_search ON doc_documentsearchindex (name text_pattern_ops)"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    for column in trigram_columns:
+        schema_editor.execute(f"DROP INDEX IF EXISTS doc_searchindex_{column}_search")
+
+
+# Same content as DocumentSearchIndex.update_for(), in a single statement
+populate_index = """
+INSERT INTO doc_documentsearchindex (document_id, name, title, subseries, came_from, authors, draft_state)
+SELECT
+    d.id,
+    lower(d.name),
+    lower(d.title),
+    coalesce((SELECT lower(string_agg(s.name || E'\\n' || s.title, E'\\n'))
+              FROM doc_relateddocument r JOIN doc_document s ON s.id = r.source_id
+              WHERE r.target_id = d.id AND r.relationship_id = 'contains'), ''),
+    coalesce((SELECT lower(string_agg(s.name, E'\\n'))
+              FROM doc_relateddocument r JOIN doc_document s ON s.id = r.source_id
+              WHERE r.target_id = d.id AND r.relationship_id = 'became_rfc'), ''),
+    coalesce((SELECT lower(string_agg(p.s, E'\\n'))
+              FROM (SELECT a.name::text AS s
+                    FROM doc_documentauthor da JOIN person_alias a ON a.person_id = da.person_id
+                    WHERE da.document_id = d.id
+                    UNION ALL
+                    SELECT e.address::text
+                    FROM doc_documentauthor da JOIN person_email e ON e.person_id = da.person_id
+                    WHERE da.document_id = d.id) p), ''),
+    coalesce((SELECT st.slug
+              FROM doc_document_states ds JOIN doc_state st ON st.id = ds.state_id
+              WHERE ds.document_id = d.id AND st.type_id = 'draft'
+              LIMIT 1), '')
+FROM doc_document d;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("person", "0001_initial"),
+        ("doc", "0020_move_errata_tags"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentSearchIndex",
+            fields=[
+                (
+                    "document",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="doc.document",
+                    ),
+                ),
+                ("name", models.TextField(blank=True)),
+                ("title", models.TextField(blank=True)),
+                (
+                    "subseries",
+                    models.TextField(
+                        blank=True,
+                        help_text="Names and titles of the subseries documents containing this document",
+                    ),
+                ),
+                (
+                    "came_from",
+                    models.TextField(
+                        blank=True,
+                        help_text="Names of the drafts that became this document",
+                    ),
+                ),
+                (
+                    "authors",
+                    models.TextField(
+                        blank=True,
+                        help_text="Author names, including aliases, and email addresses",
+                    ),
+                ),
+                ("draft_state", models.CharField(blank=True, db_index=True, max_length=50)),
+            ],
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunSQL(populate_index, migrations.RunSQL.noop),
+    ]
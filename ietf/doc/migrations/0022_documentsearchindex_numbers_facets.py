@@ -0,0 +1,69 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+from django.db import migrations, models
+
+
+# See 0021_documentsearchindex for why the trigram index is optional
+def has_pg_trgm(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def create_numbers_index(apps, schema_editor):
+    if has_pg_trgm(schema_editor):
+        schema_editor.execute(
+            "CREATE INDEX doc_searchindex_numbers_search ON doc_documentsearchindex USING gin (numbers gin_trgm_ops)"
+        )
+
+
+def drop_numbers_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS doc_searchindex_numbers_search")
+
+
+# Same content as DocumentSearchIndex.update_for()
+populate_fields = """
+UPDATE doc_documentsearchindex i
+SET
+    numbers = coalesce((SELECT ' ' || lower(string_agg(n.name, ' ')) || ' '
+                        FROM (SELECT d.name WHERE d.type_id IN ('rfc', 'bcp', 'std', 'fyi')
+                              UNION ALL
+                              SELECT s.name
+                              FROM doc_relateddocument r JOIN doc_document s ON s.id = r.source_id
+                              WHERE r.target_id = d.id AND r.relationship_id = 'contains') n), ''),
+    stream = coalesce(d.stream_id, ''),
+    "group" = coalesce((SELECT lower(g.acronym) FROM group_group g WHERE g.id = d.group_id), '')
+FROM doc_document d
+WHERE d.id = i.document_id;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("doc", "0021_documentsearchindex"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentsearchindex",
+            name="numbers",
+            field=models.TextField(
+                blank=True,
+                help_text='Space delimited RFC and subseries numbers of this document, like " rfc1234 bcp14 "',
+            ),
+        ),
+        migrations.AddField(
+            model_name="documentsearchindex",
+            name="stream",
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name="documentsearchindex",
+            name="group",
+            field=models.CharField(
+                blank=True, db_index=True, help_text="Lowercased group acronym", max_length=40
+            ),
+        ),
+        migrations.RunPython(create_numbers_index, drop_numbers_index),
+        migrations.RunSQL(populate_fields, migrations.RunSQL.noop),
+    ]
@@ -6,6 +6,10 @@ import datetime
 import logging
 import io
 import os
+import threading
+import uuid
+
+from collections import defaultdict
 
 import django.db
 import rfc2html
@@ -16,9 +20,10 @@ from typing import Optional, TYPE_CHECKING
 from weasyprint import HTML as wpHTML
 from weasyprint.text.fonts import FontConfiguration
 
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import receiver
 from django.core import checks
-from django.core.cache import caches
+from django.core.cache import cache
 from django.core.validators import URLValidator, RegexValidator
 from django.urls import reverse as urlreverse
 from django.contrib.contenttypes.models import ContentType
@@ -34,9 +39,9 @@ from ietf.group.models import Group
 from ietf.name.models import ( DocTypeName, DocTagName, StreamName, IntendedStdLevelName, StdLevelName,
     DocRelationshipName, DocReminderTypeName, BallotPositionName, ReviewRequestStateName, ReviewAssignmentStateName, FormalLanguageName,
     DocUrlTagName, ExtResourceName)
-from ietf.person.models import Email, Person
+from ietf.person.models import Alias, Email, Person
 from ietf.person.utils import get_active_balloters
-from ietf.utils import log
+from ietf.utils import artifact_cache, log
 from ietf.utils.decorators import memoize
 from ietf.utils.validators import validate_no_control_chars
 from ietf.utils.mail import formataddr
@@ -467,14 +472,26 @@ class DocumentInfo(models.Model):
             raise TypeError("Expected method called on Document or DocHistory")
 
     def all_relations_that(self, relationship, related=None):
-        if not related:
-            related = tuple([])
-        rels = self.relations_that(relationship)
-        for r in rels:
-            if not r in related:
-                related += ( r, )
-                related = r.source.all_relations_that(relationship, related)
-        return related
+        """Return the related-document objects that describe a given relationship targeting
+        self, or targeting the source of one of those, and so on."""
+        if isinstance(relationship, str):
+            relationship = ( relationship, )
+        if not isinstance(relationship, tuple):
+            raise TypeError("Expected a string or tuple, received %s" % type(relationship))
+        if isinstance(self, Document):
+            return transitive_relations([self], that=relationship)
+        elif isinstance(self, DocHistory):
+            # the sources are DocHistory objects too, follow them through their documents
+            related = []
+            front = seen = { self.doc_id }
+            while front:
+                rels = list(RelatedDocHistory.objects.filter(target__in=front, relationship__in=relationship).select_related('source'))
+                related += rels
+                front = set(r.source.doc_id for r in rels) - seen
+                seen = seen | front
+            return related
+        else:
+            raise TypeError("Expected method called on Document or DocHistory")
 
     def relations_that_doc(self, relationship):
         """Return the related-document objects that describe a given relationship from self to other documents."""
@@ -490,14 +507,15 @@ class DocumentInfo(models.Model):
             raise TypeError("Expected method called on Document or DocHistory")
 
     def all_relations_that_doc(self, relationship, related=None):
-        if not related:
-            related = tuple([])
-        rels = self.relations_that_doc(relationship)
-        for r in rels:
-            if not r in related:
-                related += ( r, )
-                related = r.target.all_relations_that_doc(relationship, related)
-        return related
+        """Return the related-document objects that describe a given relationship from self
+        to other documents, and from those documents on, and so on."""
+        if isinstance(relationship, str):
+            relationship = ( relationship, )
+        if isinstance(self, Document):
+            return transitive_relations([self], that_doc=relationship)
+        # the targets of the relations of a DocHistory are documents
+        rels = list(self.relations_that_doc(relationship))
+        return rels + transitive_relations([r.target for r in rels], that_doc=relationship)
 
     def related_that(self, relationship):
         return list(set([x.source for x in self.relations_that(relationship)]))
@@ -590,23 +608,19 @@ class DocumentInfo(models.Model):
             return None
         html = ""
         if text:
-            cache = caches['htmlized']
-            cache_key = name.split('.')[0]
-            try:
-                html = cache.get(cache_key)
-            except EOFError:
-                html = None
-            if not html:
+            def render():
                 # The path here has to match the urlpattern for htmlized
                 # documents in order to produce correct intra-document links
                 html = rfc2html.markup(text, path=settings.HTMLIZER_URL_PREFIX)
-                html = f'<div class="rfcmarkup">{html}</div>'
-                if html:
-                    cache.set(cache_key, html, settings.HTMLIZER_CACHE_TIME)
+                return f'<div class="rfcmarkup">{html}</div>'.encode('utf-8')
+            html = artifact_cache.get_or_render(
+                'htmlized',
+                [text, artifact_cache.renderer_version('rfc2html'), settings.HTMLIZER_VERSION, settings.HTMLIZER_URL_PREFIX],
+                render,
+            ).decode('utf-8')
         return html
 
     def pdfized(self):
-        name = self.get_base_name()
         text = self.html_body(classes="rfchtml")
         stylesheets = [finders.find("ietf/css/document_html_referenced.css")]
         if text:
@@ -615,16 +629,10 @@ class DocumentInfo(models.Model):
             text = self.htmlized()
         stylesheets.append(f'{settings.STATIC_IETF_ORG_INTERNAL}/fonts/noto-sans-mono/import.css')
 
-        cache = caches["pdfized"]
-        cache_key = name.split(".")[0]
-        try:
-            pdf = cache.get(cache_key)
-        except EOFError:
-            pdf = None
-        if not pdf:
+        def render():
             try:
                 font_config = FontConfiguration()
-                pdf = wpHTML(
+                return wpHTML(
                     string=text, base_url=settings.IDTRACKER_BASE_URL
                 ).write_pdf(
                     stylesheets=stylesheets,
@@ -633,13 +641,16 @@ class DocumentInfo(models.Model):
                     optimize_images=True,
                 )
             except AssertionError:
-                pdf = None
+                return None
             except Exception as e:
                 log.log('weasyprint failed:'+str(e))
                 raise
-            if pdf:
-                cache.set(cache_key, pdf, settings.PDFIZER_CACHE_TIME)
-        return pdf
+
+        # the stylesheets are part of the source of the pdf
+        key_parts = [text, artifact_cache.renderer_version('weasyprint'), settings.IDTRACKER_BASE_URL]
+        for stylesheet in stylesheets:
+            key_parts.append(Path(stylesheet).read_bytes() if stylesheet and os.path.exists(stylesheet) else stylesheet)
+        return artifact_cache.get_or_render('pdfized', key_parts, render)
 
     def references(self):
         return self.relations_that_doc(('refnorm','refinfo','refunk','refold'))
@@ -766,6 +777,43 @@ class RelatedDocument(models.Model):
 
         return False
 
+def transitive_relations(docs, that_doc=(), that=()):
+    """Return the related-document objects reachable from the given documents
+
+    Relations with a relationship in that_doc are followed from their source
+    to their target, those with a relationship in that from their target to
+    their source, so e.g. that_doc=("replaces",) gives everything the documents
+    replace, directly or through a chain of replacements.
+
+    The relations are fetched a level at a time for all of the documents
+    reached so far, so the number of queries is the length of the longest
+    chain rather than the number of documents in it.
+    """
+    if isinstance(that_doc, str):
+        that_doc = ( that_doc, )
+    if isinstance(that, str):
+        that = ( that, )
+    related = {}
+    front = seen = set(d.pk for d in docs)
+    while front:
+        q = models.Q(pk__in=[])
+        if that_doc:
+            q |= models.Q(source__in=front, relationship__in=that_doc)
+        if that:
+            q |= models.Q(target__in=front, relationship__in=that)
+        reached = set()
+        for r in RelatedDocument.objects.filter(q).select_related('source', 'target'):
+            if r.pk in related:
+                continue
+            related[r.pk] = r
+            if r.relationship_id in that_doc and r.source_id in front:
+                reached.add(r.target_id)
+            if r.relationship_id in that and r.target_id in front:
+                reached.add(r.source_id)
+        front = reached - seen
+        seen = seen | front
+    return list(related.values())
+
 class DocumentAuthorInfo(models.Model):
     person = ForeignKey(Person)
     # email should only be null for some historic documents
@@ -990,26 +1038,22 @@ class Document(DocumentInfo):
         return mark_safe('<a href="%s">%s-%s</a>' % (self.get_absolute_url(), self.name , self.rev))
 
     def ipr(self,states=settings.PUBLISH_IPR_STATES):
-        """Returns the IPR disclosures against this document (as a queryset over IprDocRel)."""
-        # from ietf.ipr.models import IprDocRel
-        # return IprDocRel.objects.filter(document__docs=self, disclosure__state__in=states) # TODO - clear these comments away
+        """Returns the IPR disclosures against this document (as IprDocRels)."""
+        if states == settings.PUBLISH_IPR_STATES and hasattr(self, '_cached_ipr'):
+            # filled in for document lists, see ietf.ipr.utils.fill_in_ipr()
+            return self._cached_ipr
         return self.iprdocrel_set.filter(disclosure__state__in=states)
 
     def related_ipr(self):
-        """Returns the IPR disclosures against this document and those documents this
-        document directly or indirectly obsoletes or replaces
+        """Returns the ids of the IPR disclosures against this document and those
+        documents this document directly or indirectly obsoletes or replaces
         """
-        from ietf.ipr.models import IprDocRel
-        iprs = (
-            IprDocRel.objects.filter(
-                document__in=[self]
-                + self.all_related_that_doc(("obs", "replaces"))
-            )
-            .filter(disclosure__state__in=settings.PUBLISH_IPR_STATES)
-            .values_list("disclosure", flat=True)
-            .distinct()
-        )
-        return iprs
+        if not hasattr(self, '_cached_related_ipr'):
+            # filled in for document tables by fill_in_related_ipr()
+            from ietf.ipr.utils import related_iprs_by_document
+            rels = related_iprs_by_document([self])[self.pk]
+            self._cached_related_ipr = sorted(set(rel.disclosure_id for rel in rels))
+        return self._cached_related_ipr
 
 
     def future_presentations(self):
@@ -1089,6 +1133,101 @@ class Document(DocumentInfo):
         iesg_state = self.get_state('draft-iesg')
         return iesg_state and iesg_state.slug != 'idexists'
 
+class DocumentSearchIndex(models.Model):
+    """Denormalized, lowercased search text for a document
+
+    This lets the document search match on names, titles, containing
+    subseries, the draft an RFC came from, RFC and subseries numbers and
+    author names and emails, and filter on the draft state, stream and group,
+    without joining through the relationship and author tables. The
+    entries are kept up to date by the signal hooks at the bottom of this
+    file, which recompute each touched entry once, when the transaction
+    commits. The search only looks at the entries, so code making bulk
+    changes that bypass signals (queryset update() and bulk_create()) must
+    call schedule_search_index_update() for the documents it touched; the
+    update_document_search_index management command rebuilds the entries
+    from scratch.
+    """
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='search_index')
+    name = models.TextField(blank=True)
+    title = models.TextField(blank=True)
+    subseries = models.TextField(blank=True, help_text="Names and titles of the subseries documents containing this document")
+    came_from = models.TextField(blank=True, help_text="Names of the drafts that became this document")
+    authors = models.TextField(blank=True, help_text="Author names, including aliases, and email addresses")
+    numbers = models.TextField(blank=True, help_text="Space delimited RFC and subseries numbers of this document, like \" rfc1234 bcp14 \"")
+    draft_state = models.CharField(max_length=50, blank=True, db_index=True)
+    stream = models.CharField(max_length=32, blank=True, db_index=True)
+    group = models.CharField(max_length=40, blank=True, db_index=True, help_text="Lowercased group acronym")
+
+    def __str__(self):
+        return self.document.name
+
+    @staticmethod
+    def number_token(name):
+        """The numbers token for an RFC or subseries name like "RFC 0791", or None"""
+        name = name.lower()
+        number = name[3:].strip()
+        if name[:3] in ('rfc', 'bcp', 'std', 'fyi') and number.isdigit():
+            return f"{name[:3]}{int(number)}"
+        return None
+
+    @classmethod
+    def update_for(cls, doc_ids=None, batch_size=2000):
+        """Recompute the entries for the given document ids, or for all documents"""
+        if doc_ids is None:
+            cls.objects.all().delete()
+            doc_ids = Document.objects.order_by('pk').values_list('pk', flat=True)
+        doc_ids = list(doc_ids)
+        for i in range(0, len(doc_ids), batch_size):
+            batch = doc_ids[i:i + batch_size]
+            entries = cls._build_entries(batch)
+            cls.objects.filter(document_id__in=batch).delete()
+            cls.objects.bulk_create(entries)
+
+    @classmethod
+    def _build_entries(cls, doc_ids):
+        draft_state = dict(
+            Document.states.through.objects.filter(document_id__in=doc_ids, state__type_id='draft')
+            .values_list('document_id', 'state__slug')
+        )
+        subseries = defaultdict(list)
+        numbers = defaultdict(list)
+        for target_id, name, title in RelatedDocument.objects.filter(
+                target_id__in=doc_ids, relationship_id='contains').values_list('target_id', 'source__name', 'source__title'):
+            subseries[target_id].extend([name, title])
+            numbers[target_id].append(name)
+        came_from = defaultdict(list)
+        for target_id, name in RelatedDocument.objects.filter(
+                target_id__in=doc_ids, relationship_id='became_rfc').values_list('target_id', 'source__name'):
+            came_from[target_id].append(name)
+        doc_persons = defaultdict(set)
+        for doc_id, person_id in DocumentAuthor.objects.filter(document_id__in=doc_ids).values_list('document_id', 'person_id'):
+            doc_persons[doc_id].add(person_id)
+        person_ids = set().union(*doc_persons.values())
+        person_strings = defaultdict(list)
+        for person_id, name in Alias.objects.filter(person_id__in=person_ids).order_by('pk').values_list('person_id', 'name'):
+            person_strings[person_id].append(name)
+        for person_id, address in Email.objects.filter(person_id__in=person_ids).order_by('pk').values_list('person_id', 'address'):
+            person_strings[person_id].append(address)
+
+        entries = []
+        for doc_id, name, type_id, title, stream_id, acronym in Document.objects.filter(pk__in=doc_ids).values_list(
+                'pk', 'name', 'type_id', 'title', 'stream_id', 'group__acronym'):
+            tokens = ([name] if type_id in ('rfc', 'bcp', 'std', 'fyi') else []) + numbers[doc_id]
+            entries.append(cls(
+                document_id=doc_id,
+                name=name.lower(),
+                title=title.lower(),
+                subseries='\n'.join(subseries[doc_id]).lower(),
+                came_from='\n'.join(came_from[doc_id]).lower(),
+                authors='\n'.join(s for p in sorted(doc_persons[doc_id]) for s in person_strings[p]).lower(),
+                numbers=f" {' '.join(tokens)} ".lower() if tokens else '',
+                draft_state=draft_state.get(doc_id, ''),
+                stream=stream_id or '',
+                group=(acronym or '').lower(),
+            ))
+        return entries
+
 class DocumentURL(models.Model):
     doc  = ForeignKey(Document)
     tag  = ForeignKey(DocUrlTagName)
@@ -1508,3 +1647,122 @@ class BofreqEditorDocEvent(DocEvent):
 class BofreqResponsibleDocEvent(DocEvent):
     """ Capture the responsible leadership (IAB and IESG members) for a BOF Request """
     responsible = models.ManyToManyField('person.Person', blank=True)
+
+# --- Signal hooks for the document search index ---
+
+def _deleted_with(origin, doc_id):
+    """True if a post_delete comes from deleting the document itself
+
+    Refreshing the search index entry in that case would recreate it for a
+    document that is about to disappear.
+    """
+    if isinstance(origin, Document):
+        return origin.pk == doc_id
+    return isinstance(origin, models.QuerySet) and origin.model is Document
+
+class _PendingSearchIndexUpdates(threading.local):
+    def __init__(self):
+        self.doc_ids = set()
+
+_pending_search_index_updates = _PendingSearchIndexUpdates()
+
+def schedule_search_index_update(doc_ids):
+    """Update the search index entries of doc_ids when the current transaction commits
+
+    However often a document changes within a transaction, its entry is
+    recomputed once. Outside of a transaction the entries are updated right
+    away. Ids left over from a rolled back transaction are updated with the
+    next commit, which does no harm.
+    """
+    _pending_search_index_updates.doc_ids.update(doc_ids)
+    transaction.on_commit(flush_search_index_updates)
+
+def flush_search_index_updates():
+    """Apply this thread's pending search index updates now"""
+    doc_ids = _pending_search_index_updates.doc_ids
+    _pending_search_index_updates.doc_ids = set()
+    if doc_ids:
+        DocumentSearchIndex.update_for(sorted(doc_ids))
+
+# The hooks also act on raw saves, so that loaddata creates the entries; they
+# are computed when it commits, after all the objects have been loaded.
+
+@receiver(models.signals.post_save, sender=Document)
+def update_search_index_for_document(sender, instance, **kwargs):
+    doc_ids = [instance.pk]
+    if instance.type_id in ('bcp', 'std', 'fyi'):
+        # the subseries title is indexed on the contained documents
+        doc_ids.extend(instance.relateddocument_set.filter(relationship_id='contains').values_list('target_id', flat=True))
+    schedule_search_index_update(doc_ids)
+
+@receiver(models.signals.m2m_changed, sender=Document.states.through)
+def update_search_index_for_states(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        schedule_search_index_update([instance.pk])
+    elif pk_set:
+        schedule_search_index_update(pk_set)
+
+@receiver(models.signals.post_save, sender=DocumentAuthor)
+@receiver(models.signals.post_delete, sender=DocumentAuthor)
+def update_search_index_for_author(sender, instance, origin=None, **kwargs):
+    if not _deleted_with(origin, instance.document_id):
+        schedule_search_index_update([instance.document_id])
+
+@receiver(models.signals.post_save, sender=RelatedDocument)
+@receiver(models.signals.post_delete, sender=RelatedDocument)
+def update_search_index_for_relation(sender, instance, origin=None, **kwargs):
+    if _deleted_with(origin, instance.target_id):
+        return
+    if instance.relationship_id in ('contains', 'became_rfc'):
+        schedule_search_index_update([instance.target_id])
+
+@receiver(models.signals.post_save, sender=Alias)
+@receiver(models.signals.post_delete, sender=Alias)
+@receiver(models.signals.post_save, sender=Email)
+@receiver(models.signals.post_delete, sender=Email)
+def update_search_index_for_person(sender, instance, **kwargs):
+    if instance.person_id:
+        schedule_search_index_update(
+            DocumentAuthor.objects.filter(person_id=instance.person_id).values_list('document_id', flat=True)
+        )
+
+@receiver(models.signals.post_save, sender=Group)
+def update_search_index_for_group(sender, instance, **kwargs):
+    # only a changed acronym matters, so update the group facet in place
+    # rather than recomputing the entries of all the group's documents
+    DocumentSearchIndex.objects.filter(document__group=instance).exclude(
+        group=instance.acronym.lower()).update(group=instance.acronym.lower())
+
+
+# Deleted authors and relations don't change any maximum id or time, so
+# whoever needs to notice them (such as the I-D index fingerprint) can't
+# see them in the tables; this version in the cache changes instead.
+DOCUMENT_LINKS_DELETED_CACHE_KEY = "doc:links_deleted_version"
+
+def _links_deleted():
+    cache.set(DOCUMENT_LINKS_DELETED_CACHE_KEY, uuid.uuid4().hex, None)
+
+@receiver(models.signals.post_delete, sender=DocumentAuthor)
+@receiver(models.signals.post_delete, sender=RelatedDocument)
+def document_link_deleted(sender, instance, **kwargs):
+    transaction.on_commit(_links_deleted)
+
+
+@receiver(models.signals.post_save, sender=NewRevisionDocEvent)
+@receiver(models.signals.post_save, sender=DocEvent)
+def prerender_new_revision(sender, instance, created, raw=False, **kwargs):
+    """Render new revisions and newly published RFCs into the artifact cache in the background
+
+    This way the first visitor of the htmlized or pdfized view doesn't have
+    to wait for it to be rendered.
+    """
+    if raw or not created or not settings.ARTIFACT_CACHE_DIR:
+        return
+    if sender is DocEvent and instance.type != 'published_rfc':
+        return
+    from ietf.doc.tasks import prerender_document_artifacts_task  # circular import
+    name, rev = instance.doc.name, instance.rev
+    # the task must not start before the revision and its files are in place
+    transaction.on_commit(lambda: prerender_document_artifacts_task.delay(name, rev))
@@ -0,0 +1,96 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+# -*- coding: utf-8 -*-
+"""
+In-memory graph of document relations, for jobs that follow relation chains
+from many documents, like the IPR exports.
+
+The relations of the given types are loaded with a single query and kept as
+arrays of integer document ids: for each relationship, the targets of each
+source document and the sources of each target document.  Transitive
+closures are memoized, and a closure reuses those already computed for the
+documents it reaches, so following overlapping chains from thousands of
+documents costs little more than following each relation once.
+
+The graph is a snapshot; relations added or removed after loading it are not
+seen.
+"""
+
+from array import array
+from collections import defaultdict
+
+import debug                            # pyflakes:ignore
+
+from ietf.doc.models import RelatedDocument
+
+
+class RelationshipGraph:
+    def __init__(self, relationships):
+        if isinstance(relationships, str):
+            relationships = ( relationships, )
+        self.relationships = tuple(relationships)
+        targets = dict((slug, defaultdict(list)) for slug in self.relationships)
+        sources = dict((slug, defaultdict(list)) for slug in self.relationships)
+        for slug, source_id, target_id in RelatedDocument.objects.filter(
+                relationship__in=self.relationships).values_list("relationship_id", "source_id", "target_id").iterator():
+            targets[slug][source_id].append(target_id)
+            sources[slug][target_id].append(source_id)
+        self._targets = self._compact(targets)
+        self._sources = self._compact(sources)
+        self._closures = {}
+
+    @staticmethod
+    def _compact(adjacency):
+        return dict(
+            (slug, dict((doc_id, array("q", ids)) for doc_id, ids in ids_by_doc.items()))
+            for slug, ids_by_doc in adjacency.items()
+        )
+
+    def _relationships(self, relationships):
+        if relationships is None:
+            return self.relationships
+        if isinstance(relationships, str):
+            relationships = ( relationships, )
+        missing = set(relationships) - set(self.relationships)
+        if missing:
+            raise ValueError("Relationships not loaded in the graph: %s" % ", ".join(sorted(missing)))
+        return tuple(sorted(relationships))
+
+    def targets(self, doc_id, relationships=None):
+        """Return the ids of the documents doc_id relates to directly"""
+        return set(t for slug in self._relationships(relationships) for t in self._targets[slug].get(doc_id, ()))
+
+    def sources(self, doc_id, relationships=None):
+        """Return the ids of the documents relating directly to doc_id"""
+        return set(s for slug in self._relationships(relationships) for s in self._sources[slug].get(doc_id, ()))
+
+    def closure_that_doc(self, doc_id, relationships=None):
+        """Return the ids of the documents doc_id relates to, directly or through a chain of
+        relations, like DocumentInfo.all_related_that_doc()"""
+        return self._closure(doc_id, self._relationships(relationships), self._targets, "that_doc")
+
+    def closure_that(self, doc_id, relationships=None):
+        """Return the ids of the documents relating to doc_id, directly or through a chain of
+        relations, like DocumentInfo.all_related_that()"""
+        return self._closure(doc_id, self._relationships(relationships), self._sources, "that")
+
+    def _closure(self, doc_id, relationships, adjacency, direction):
+        memo = self._closures.setdefault((direction, relationships), {})
+        if doc_id in memo:
+            return memo[doc_id]
+        reached = set()
+        stack = [doc_id]
+        while stack:
+            current = stack.pop()
+            for slug in relationships:
+                for other in adjacency[slug].get(current, ()):
+                    if other in reached:
+                        continue
+                    reached.add(other)
+                    known = memo.get(other)
+                    if known is None:
+                        stack.append(other)
+                    else:
+                        # everything reachable from other is already known
+                        reached |= known
+        memo[doc_id] = frozenset(reached)
+        return memo[doc_id]
@@ -18,7 +18,7 @@ from ietf.doc.models import (BallotType, DeletedEvent, StateType, State, Documen
     RelatedDocHistory, BallotPositionDocEvent, AddedMessageEvent, SubmissionDocEvent,
     ReviewRequestDocEvent, ReviewAssignmentDocEvent, EditedAuthorsDocEvent, DocumentURL,
     IanaExpertDocEvent, IRSGBallotDocEvent, DocExtResource, DocumentActionHolder, 
-    BofreqEditorDocEvent,BofreqResponsibleDocEvent)
+    BofreqEditorDocEvent,BofreqResponsibleDocEvent, DocumentSearchIndex)
 
 from ietf.name.resources import BallotPositionNameResource, DocTypeNameResource
 class BallotTypeResource(ModelResource):
@@ -844,3 +844,26 @@ class BofreqResponsibleDocEventResource(ModelResource):
             "responsible": ALL_WITH_RELATIONS,
         }
 api.doc.register(BofreqResponsibleDocEventResource())
+
+
+class DocumentSearchIndexResource(ModelResource):
+    document         = ToOneField(DocumentResource, 'document')
+    class Meta:
+        queryset = DocumentSearchIndex.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'documentsearchindex'
+        ordering = ['document', ]
+        filtering = { 
+            "name": ALL,
+            "title": ALL,
+            "subseries": ALL,
+            "came_from": ALL,
+            "authors": ALL,
+            "numbers": ALL,
+            "draft_state": ALL,
+            "stream": ALL,
+            "group": ALL,
+            "document": ALL_WITH_RELATIONS,
+        }
+api.doc.register(DocumentSearchIndexResource())
@@ -21,6 +21,7 @@ from .expire import (
     send_expire_warning_for_draft,
 )
 from .models import Document
+from .utils import prerender_document_artifacts
 
 
 @shared_task
@@ -54,3 +55,25 @@ def expire_ids_task():
 def notify_expirations_task(notify_days=14):
     for doc in get_soon_to_expire_drafts(notify_days):
         send_expire_warning_for_draft(doc)
+
+
+@shared_task(bind=True, max_retries=12, default_retry_delay=15 * 60)
+def prerender_document_artifacts_task(self, name, rev):
+    """Render a new document revision into the artifact cache
+
+    Retried for a few hours if the document file isn't there yet, which
+    happens for RFCs announced before their files are synced.
+    """
+    doc = Document.objects.filter(name=name).first()
+    if doc is None:
+        log.log(f"prerender_document_artifacts_task called for missing document {name}")
+        return
+    if doc.rev != rev:
+        return  # superseded by a newer revision, which has a task of its own
+    try:
+        rendered = prerender_document_artifacts(doc)
+    except Exception as e:
+        log.log(f"Failed to prerender {name}-{rev}: {e}")
+        return
+    if not rendered:
+        raise self.retry()
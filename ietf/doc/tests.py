@@ -20,12 +20,14 @@ from tempfile import NamedTemporaryFile
 from collections import defaultdict
 from zoneinfo import ZoneInfo
 
+from django.core import serializers
 from django.core.management import call_command
 from django.urls import reverse as urlreverse
 from django.conf import settings
 from django.forms import Form
 from django.utils.html import escape
-from django.test import override_settings
+from django.contrib.auth.models import AnonymousUser
+from django.test import override_settings, RequestFactory
 from django.utils import timezone
 from django.utils.text import slugify
 
@@ -35,15 +37,16 @@ from weasyprint.urls import URLFetchingError
 
 import debug                            # pyflakes:ignore
 
-from ietf.doc.models import ( Document, DocRelationshipName, RelatedDocument, State,
+from ietf.doc.models import ( Document, DocRelationshipName, RelatedDocument, State, DocumentSearchIndex,
     DocEvent, BallotPositionDocEvent, LastCallDocEvent, WriteupDocEvent, NewRevisionDocEvent, BallotType,
-    EditedAuthorsDocEvent )
+    EditedAuthorsDocEvent, DocumentAuthor, transitive_relations )
 from ietf.doc.factories import ( DocumentFactory, DocEventFactory, CharterFactory,
     ConflictReviewFactory, WgDraftFactory, IndividualDraftFactory, WgRfcFactory, 
     IndividualRfcFactory, StateDocEventFactory, BallotPositionDocEventFactory, 
     BallotDocEventFactory, DocumentAuthorFactory, NewRevisionDocEventFactory,
     StatusChangeFactory, DocExtResourceFactory, RgDraftFactory, BcpFactory)
 from ietf.doc.forms import NotifyForm
+from ietf.doc.relationship_graph import RelationshipGraph
 from ietf.doc.fields import SearchableDocumentsField
 from ietf.doc.utils import create_ballot_if_not_open, uppercase_std_abbreviated_name
 from ietf.group.models import Group, Role
@@ -61,7 +64,7 @@ from ietf.utils.test_utils import login_testing_unauthorized, unicontent
 from ietf.utils.test_utils import TestCase
 from ietf.utils.text import normalize_text
 from ietf.utils.timezone import date_today, datetime_today, DEADLINE_TZINFO, RPC_TZINFO
-from ietf.doc.utils_search import AD_WORKLOAD
+from ietf.doc.utils_search import AD_WORKLOAD, prepare_document_table
 
 
 class SearchTests(TestCase):
@@ -175,6 +178,160 @@ class SearchTests(TestCase):
         self.assertEqual(r.status_code, 200)
         self.assertContains(r, rfc.title)
 
+    def test_search_index(self):
+        # the entries are updated when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            author = PersonFactory(name="Henrietta Quux")
+            draft = WgDraftFactory(title="Martian Network Topologies", authors=[author])
+            rfc = WgRfcFactory()
+            bcp = BcpFactory(title="Best Martian Practice", contains=[rfc])
+            draft.relateddocument_set.create(relationship_id="became_rfc", target=rfc)
+
+        entry = draft.search_index
+        self.assertEqual(entry.name, draft.name)
+        self.assertEqual(entry.title, "martian network topologies")
+        self.assertIn("henrietta quux", entry.authors)
+        self.assertEqual(entry.draft_state, "active")
+
+        rfc_entry = rfc.search_index
+        self.assertEqual(rfc_entry.subseries, f"{bcp.name}\nbest martian practice")
+        self.assertEqual(rfc_entry.came_from, draft.name)
+        self.assertEqual(rfc_entry.numbers, f" {rfc.name} {bcp.name} ")
+        self.assertEqual(rfc_entry.stream, "ietf")
+        self.assertEqual(rfc_entry.group, rfc.group.acronym)
+        self.assertEqual(draft.search_index.numbers, "")
+
+        # changes to the document, its states, authors and relations are
+        # picked up, with one update for all changes in a transaction
+        with mock.patch.object(DocumentSearchIndex, "update_for", wraps=DocumentSearchIndex.update_for) as update_for:
+            with self.captureOnCommitCallbacks(execute=True):
+                draft.title = "Venusian Network Topologies"
+                draft.save()
+                draft.set_state(State.objects.get(type="draft", slug="expired"))
+                author.alias_set.create(name="Hetty Quux")
+                EmailFactory(person=author, address="Hetty@example.org")
+                self.assertEqual(update_for.call_count, 0)
+        self.assertEqual(update_for.call_count, 1)
+        draft.search_index.refresh_from_db()
+        self.assertEqual(draft.search_index.title, "venusian network topologies")
+        self.assertEqual(draft.search_index.draft_state, "expired")
+        self.assertIn("hetty quux", draft.search_index.authors)
+        self.assertIn("hetty@example.org", draft.search_index.authors)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bcp.title = "Best Venusian Practice"
+            bcp.save()
+        rfc.search_index.refresh_from_db()
+        self.assertIn("best venusian practice", rfc.search_index.subseries)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RelatedDocument.objects.get(source=draft, target=rfc).delete()
+        rfc.search_index.refresh_from_db()
+        self.assertEqual(rfc.search_index.came_from, "")
+
+        # the management command rebuilds the same entries
+        entries = list(DocumentSearchIndex.objects.order_by("pk").values())
+        DocumentSearchIndex.objects.all().delete()
+        call_command("update_document_search_index", verbosity=0)
+        self.assertEqual(list(DocumentSearchIndex.objects.order_by("pk").values()), entries)
+
+        # deleting a document removes its entry
+        draft.delete()
+        self.assertFalse(DocumentSearchIndex.objects.filter(document_id=entry.document_id).exists())
+
+        base_url = urlreverse('ietf.doc.views_search.search')
+        r = self.client.get(base_url + f"?rfcs=on&name={bcp.name}")
+        self.assertEqual(r.status_code, 200)
+        self.assertContains(r, rfc.title)
+
+        # numbers are matched exactly, ignoring leading zeros
+        r = self.client.get(base_url, {"rfcs": "on", "name": f"RFC 0{rfc.rfc_number}"})
+        self.assertContains(r, rfc.title)
+        r = self.client.get(base_url + f"?rfcs=on&name={bcp.name}0")
+        self.assertNotContains(r, rfc.title)
+
+        # group and stream facets
+        with self.captureOnCommitCallbacks(execute=True):
+            rfc.group.acronym = "venus"
+            rfc.group.save()
+        self.assertEqual(DocumentSearchIndex.objects.get(document=rfc).group, "venus")
+        r = self.client.get(base_url + "?rfcs=on&by=group&group=Venus")
+        self.assertContains(r, rfc.title)
+        r = self.client.get(base_url + "?rfcs=on&by=stream&stream=ietf")
+        self.assertContains(r, rfc.title)
+        r = self.client.get(base_url + "?rfcs=on&by=stream&stream=irtf")
+        self.assertNotContains(r, rfc.title)
+
+    def test_search_index_loaddata(self):
+        """Objects loaded from fixtures (raw saves) get search index entries"""
+        author = PersonFactory(name="Henrietta Quux")
+        draft = WgDraftFactory(title="Martian Network Topologies", authors=[author])
+        rfc = WgRfcFactory()
+        bcp = BcpFactory(contains=[rfc])
+        draft.relateddocument_set.create(relationship_id="became_rfc", target=rfc)
+        fixture = serializers.serialize("json", [draft, rfc, bcp] + list(DocumentAuthor.objects.filter(document=draft))
+                                        + list(RelatedDocument.objects.filter(target=rfc)))
+        DocumentSearchIndex.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for obj in serializers.deserialize("json", fixture):
+                obj.save()
+        self.assertCountEqual(DocumentSearchIndex.objects.values_list("document_id", flat=True), [draft.pk, rfc.pk, bcp.pk])
+
+        base_url = urlreverse('ietf.doc.views_search.search')
+        for params, doc in [
+            (f"activedrafts=on&name={draft.name}", draft),
+            ("activedrafts=on&name=martian", draft),
+            ("activedrafts=on&by=author&author=quux", draft),
+            (f"rfcs=on&name={bcp.name}", rfc),
+            (f"rfcs=on&name={draft.name}", rfc),
+            (f"rfcs=on&name={rfc.name.upper()}", rfc),
+            (f"rfcs=on&by=group&group={rfc.group.acronym.upper()}", rfc),
+            ("rfcs=on&by=stream&stream=ietf", rfc),
+        ]:
+            r = self.client.get(f"{base_url}?{params}")
+            self.assertEqual(r.status_code, 200)
+            self.assertContains(r, doc.title, msg_prefix=params)
+        r = self.client.get(base_url + "?olddrafts=on&name=martian")
+        self.assertNotContains(r, draft.title)
+
+        url = urlreverse('ietf.doc.views_search.ajax_select2_search_docs', kwargs={"model_name": "document", "doc_type": "draft"})
+        r = self.client.get(url, dict(q=draft.name))
+        self.assertEqual([d["id"] for d in r.json()], [draft.pk])
+
+    def test_document_table_query_count(self):
+        def make_docs(count):
+            docs = []
+            for _ in range(count):
+                draft = WgDraftFactory(authors=[PersonFactory()])
+                rfc = WgRfcFactory()
+                obsoleted = WgRfcFactory()
+                rfc.relateddocument_set.create(relationship_id="obs", target=obsoleted)
+                HolderIprDisclosureFactory(docs=[obsoleted])
+                docs.extend([draft, rfc])
+            return [d.pk for d in docs]
+
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+
+        def table_from_queryset(pks):
+            docs, meta = prepare_document_table(request, Document.objects.filter(pk__in=pks), max_results=1000)
+            self.assertEqual(len(docs), len(pks))
+            [d.related_ipr() for d in docs]
+
+        def table_from_list(pks):
+            docs, meta = prepare_document_table(request, list(Document.objects.filter(pk__in=pks)), max_results=1000)
+            [d.related_ipr() for d in docs]
+
+        small, large = make_docs(5), make_docs(100)
+        self.assertQueryCountIndependentOfSize(table_from_queryset, small, large)
+        self.assertQueryCountIndependentOfSize(table_from_list, small, large)
+
+        # the related IPR filled in for the table is the same as from the model
+        docs, meta = prepare_document_table(request, Document.objects.filter(pk__in=small))
+        for d in docs:
+            self.assertEqual(list(d.related_ipr()), sorted(Document.objects.get(pk=d.pk).related_ipr()))
+
     def test_search_for_name(self):
         draft = WgDraftFactory(name='draft-ietf-mars-test',group=GroupFactory(acronym='mars',parent=Group.objects.get(acronym='farfut')),authors=[PersonFactory()],ad=PersonFactory())
         draft.set_state(State.objects.get(used=True, type="draft-iesg", slug="pub-req"))
@@ -2986,6 +3143,56 @@ class DocInfoMethodsTests(TestCase):
         self.assertEqual(draft.revisions_by_dochistory(),[f"{i:02d}" for i in range(8,10)])
         self.assertEqual(draft.revisions_by_newrevisionevent(),[f"{i:02d}" for i in [*range(0,5), *range(6,10)]])      
 
+    def test_all_relations_that(self):
+        # draft3 replaces draft2, which replaces draft1, which replaces draft3, and became rfc1;
+        # rfc2 obsoletes rfc1
+        draft1, draft2, draft3 = WgDraftFactory.create_batch(3)
+        rfc1, rfc2 = WgRfcFactory.create_batch(2)
+        r21 = draft2.relateddocument_set.create(relationship_id="replaces", target=draft1)
+        r32 = draft3.relateddocument_set.create(relationship_id="replaces", target=draft2)
+        r13 = draft1.relateddocument_set.create(relationship_id="replaces", target=draft3)
+        draft1.relateddocument_set.create(relationship_id="became_rfc", target=rfc1)
+        o21 = rfc2.relateddocument_set.create(relationship_id="obs", target=rfc1)
+
+        with self.assertNumQueries(3):
+            self.assertCountEqual(draft3.all_relations_that_doc("replaces"), [r32, r21, r13])
+        self.assertCountEqual(draft1.all_relations_that("replaces"), [r21, r32, r13])
+        self.assertCountEqual(draft2.all_related_that_doc(("replaces", "obs")), [draft1, draft2, draft3])
+        self.assertCountEqual(rfc1.all_related_that("obs"), [rfc2])
+        self.assertEqual(rfc2.all_relations_that("obs"), [])
+
+        # from many documents, and following relations in both directions
+        self.assertCountEqual(transitive_relations([draft2, rfc2], that_doc="obs"), [o21])
+        self.assertCountEqual(
+            transitive_relations([rfc1], that_doc="replaces", that="became_rfc"),
+            RelatedDocument.objects.filter(source__in=[draft1, draft2, draft3]),
+        )
+
+    def test_relationship_graph(self):
+        draft1, draft2, draft3 = WgDraftFactory.create_batch(3)
+        rfc1, rfc2 = WgRfcFactory.create_batch(2)
+        draft2.relateddocument_set.create(relationship_id="replaces", target=draft1)
+        draft3.relateddocument_set.create(relationship_id="replaces", target=draft2)
+        draft1.relateddocument_set.create(relationship_id="became_rfc", target=rfc1)
+        rfc2.relateddocument_set.create(relationship_id="obs", target=rfc1)
+        rfc2.relateddocument_set.create(relationship_id="updates", target=rfc1)
+
+        with self.assertNumQueries(1):
+            graph = RelationshipGraph(("replaces", "obs", "became_rfc"))
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.targets(draft2.pk), {draft1.pk})
+            self.assertEqual(graph.sources(rfc1.pk), {draft1.pk, rfc2.pk})
+            self.assertEqual(graph.closure_that_doc(draft3.pk, "replaces"), {draft1.pk, draft2.pk})
+            self.assertEqual(graph.closure_that_doc(draft3.pk), {draft1.pk, draft2.pk, rfc1.pk})
+            self.assertEqual(graph.closure_that(rfc1.pk), {draft1.pk, draft2.pk, draft3.pk, rfc2.pk})
+            self.assertEqual(graph.closure_that(rfc1.pk, ("became_rfc", "obs")), {draft1.pk, rfc2.pk})
+        self.assertEqual(
+            set(graph.closure_that_doc(draft3.pk)),
+            set(d.pk for d in draft3.all_related_that_doc(("replaces", "obs", "became_rfc"))),
+        )
+        with self.assertRaises(ValueError):
+            graph.closure_that(rfc1.pk, "updates")
+
     def test_referenced_by_rfcs(self):
         # n.b., no significance to the ref* values in this test
         referring_draft = WgDraftFactory()
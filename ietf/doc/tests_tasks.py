@@ -1,12 +1,16 @@
 # Copyright The IETF Trust 2024, All Rights Reserved
 import mock
 
+from celery.exceptions import Retry
+from django.test import override_settings
+
+from ietf.person.models import Person
 from ietf.utils.test_utils import TestCase
 from ietf.utils.timezone import datetime_today
 
-from .factories import DocumentFactory
-from .models import Document
-from .tasks import expire_ids_task, notify_expirations_task
+from .factories import DocumentFactory, WgDraftFactory, WgRfcFactory
+from .models import Document, DocEvent, NewRevisionDocEvent
+from .tasks import expire_ids_task, notify_expirations_task, prerender_document_artifacts_task
 
 
 class TaskTests(TestCase):
@@ -61,3 +65,42 @@ class TaskTests(TestCase):
         notify_expirations_task()
         self.assertEqual(send_warning_mock.call_count, 1)
         self.assertEqual(send_warning_mock.call_args[0], ("sentinel",))
+
+    @mock.patch("ietf.doc.tasks.prerender_document_artifacts")
+    def test_prerender_document_artifacts_task(self, prerender_mock):
+        draft = WgDraftFactory(rev="03")
+        prerender_mock.return_value = True
+        prerender_document_artifacts_task(draft.name, "03")
+        self.assertEqual(prerender_mock.call_count, 1)
+        self.assertEqual(prerender_mock.call_args[0], (draft,))
+
+        # superseded revisions and missing documents are skipped
+        prerender_mock.reset_mock()
+        prerender_document_artifacts_task(draft.name, "02")
+        prerender_document_artifacts_task("draft-no-such-thing", "00")
+        self.assertFalse(prerender_mock.called)
+
+        # retried while the file isn't there
+        prerender_mock.return_value = False
+        with self.assertRaises(Retry):
+            prerender_document_artifacts_task(draft.name, "03")
+
+        # rendering errors are logged, not retried
+        prerender_mock.side_effect = RuntimeError
+        prerender_document_artifacts_task(draft.name, "03")
+
+    @mock.patch("ietf.doc.tasks.prerender_document_artifacts_task.delay")
+    def test_prerender_on_new_revision(self, delay_mock):
+        draft = WgDraftFactory(rev="01")
+        rfc = WgRfcFactory()
+        system = Person.objects.get(name="(System)")
+        with override_settings(ARTIFACT_CACHE_DIR=None):
+            with self.captureOnCommitCallbacks(execute=True):
+                NewRevisionDocEvent.objects.create(doc=draft, rev="01", by=system, type="new_revision", desc="New revision available")
+        self.assertFalse(delay_mock.called)
+        with override_settings(ARTIFACT_CACHE_DIR="/nonexistent"):
+            with self.captureOnCommitCallbacks(execute=True):
+                NewRevisionDocEvent.objects.create(doc=draft, rev="01", by=system, type="new_revision", desc="New revision available")
+                DocEvent.objects.create(doc=draft, rev="01", by=system, type="added_comment", desc="A comment")
+                DocEvent.objects.create(doc=rfc, rev=rfc.rev, by=system, type="published_rfc", desc="RFC published")
+        self.assertEqual([c[0] for c in delay_mock.call_args_list], [(draft.name, "01"), (rfc.name, rfc.rev)])
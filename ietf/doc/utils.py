@@ -34,7 +34,7 @@ from ietf.community.utils import docs_tracked_by_community_list
 from ietf.doc.models import Document, DocHistory, State, DocumentAuthor, DocHistoryAuthor
 from ietf.doc.models import RelatedDocument, RelatedDocHistory, BallotType, DocReminder
 from ietf.doc.models import DocEvent, ConsensusDocEvent, BallotDocEvent, IRSGBallotDocEvent, NewRevisionDocEvent, StateDocEvent
-from ietf.doc.models import TelechatDocEvent, DocumentActionHolder, EditedAuthorsDocEvent
+from ietf.doc.models import TelechatDocEvent, DocumentActionHolder, EditedAuthorsDocEvent, transitive_relations
 from ietf.name.models import DocReminderTypeName, DocRelationshipName
 from ietf.group.models import Role, Group, GroupFeatures
 from ietf.ietfauth.utils import has_role, is_authorized_in_doc_stream, is_individual_draft_author, is_bofreq_editor
@@ -945,36 +945,13 @@ def extract_complete_replaces_ancestor_mapping_for_docs(names):
 def make_rev_history(doc):
     # return document history data for inclusion in doc.json (used by timeline)
 
-    def get_predecessors(doc, predecessors=None):
-        if predecessors is None:
-            predecessors = set()
-        if hasattr(doc, 'relateddocument_set'):
-            for document in doc.related_that_doc('replaces'):
-                if document not in predecessors:
-                    predecessors.add(document)
-                    predecessors.update(get_predecessors(document, predecessors))
-        if doc.came_from_draft():
-            predecessors.add(doc.came_from_draft())
-            predecessors.update(get_predecessors(doc.came_from_draft(), predecessors))
-        return predecessors
-
-    def get_ancestors(doc, ancestors = None):
-        if ancestors is None:
-            ancestors = set()
-        if hasattr(doc, 'relateddocument_set'):
-            for document in doc.related_that('replaces'):
-                if document not in ancestors:
-                    ancestors.add(document)
-                    ancestors.update(get_ancestors(document, ancestors))
-        if doc.became_rfc():
-            if doc.became_rfc() not in ancestors:
-                ancestors.add(doc.became_rfc())
-                ancestors.update(get_ancestors(doc.became_rfc(), ancestors))
-        return ancestors
-
     def get_replaces_tree(doc):
-        tree = get_predecessors(doc)
-        tree.update(get_ancestors(doc))
+        # the drafts doc replaces or came from, and those that replace it or the RFC
+        # it became, transitively
+        tree = set()
+        for r in (transitive_relations([doc], that_doc=("replaces",), that=("became_rfc",))
+                  + transitive_relations([doc], that_doc=("became_rfc",), that=("replaces",))):
+            tree.update([r.source, r.target])
         return tree
 
     history = {}
@@ -1258,3 +1235,16 @@ def bibxml_for_draft(doc, rev=None):
         
     return render_to_string('doc/bibxml.xml', {'name':name, 'doc':doc, 'doc_bibtype':'I-D', 'settings':settings})
 
+
+
+def prerender_document_artifacts(doc):
+    """Render the htmlized and pdfized versions of doc into the artifact cache
+
+    Returns False if the document file isn't available (yet).  Rendering
+    errors are raised, as in Document.pdfized().
+    """
+    if not os.path.exists(doc.get_file_name()):
+        return False
+    doc.htmlized()
+    doc.pdfized()
+    return True
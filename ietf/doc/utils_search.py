@@ -5,13 +5,16 @@ import re
 import datetime
 import debug                            # pyflakes:ignore
 
+from collections import defaultdict
 from zoneinfo import ZoneInfo
 
 from django.conf import settings
+from django.db.models import prefetch_related_objects
 
 from ietf.doc.models import Document, RelatedDocument, DocEvent, TelechatDocEvent, BallotDocEvent, DocTypeName
 from ietf.doc.expire import expirable_drafts
 from ietf.doc.utils import augment_docs_and_person_with_person_info
+from ietf.ipr.utils import related_iprs_by_document
 from ietf.meeting.models import SessionPresentation, Meeting, Session
 from ietf.review.utils import review_assignments_to_list_for_docs
 from ietf.utils.timezone import date_today
@@ -41,7 +44,7 @@ def fill_in_document_sessions(docs, doc_dict, doc_ids):
     end_date = today+datetime.timedelta(days=30)
     meetings = Meeting.objects.filter(date__gte=beg_date, date__lte=end_date).prefetch_related('session_set')
     # get sessions
-    sessions = Session.objects.filter(meeting_id__in=[ m.id for m in meetings ])
+    sessions = Session.objects.filter(meeting_id__in=[ m.id for m in meetings ]).select_related('meeting', 'group')
     # get presentations
     presentations = SessionPresentation.objects.filter(session_id__in=[ s.id for s in sessions ])
     session_list = [ (p.document_id, p.session) for p in presentations ]
@@ -51,15 +54,31 @@ def fill_in_document_sessions(docs, doc_dict, doc_ids):
         if i in doc_ids:
             doc_dict[i].sessions.append(s)
 
+def fill_in_related_ipr(docs, doc_dict, doc_ids):
+    # Fill in the caches used by ipr() and related_ipr(), for all documents
+    # at once, see ietf.ipr.utils.related_iprs_by_document()
+    related = related_iprs_by_document(docs)
+    for d in docs:
+        d._cached_ipr = [rel for rel in related[d.pk] if rel.document_id == d.pk]
+        d.ipr_count = len(d._cached_ipr)
+        d._cached_related_ipr = sorted(set(rel.disclosure_id for rel in related[d.pk]))
+
 def fill_in_document_table_attributes(docs, have_telechat_date=False):
     # fill in some attributes for the document table results to save
     # some hairy template code and avoid repeated SQL queries
     # TODO - this function evolved from something that assumed it was handling only drafts. 
     #        It still has places where it assumes all docs are drafts where that is not a correct assumption
+    #
+    # Everything is fetched in bulk, so the number of queries made here does
+    # not grow with the number of documents.
 
     doc_dict = dict((d.pk, d) for d in docs)
     doc_ids = list(doc_dict.keys())
 
+    # documents coming from a prefetching queryset already have these
+    prefetch_related_objects(docs, "type", "states__type", "tags", "groupmilestone_set__group",
+                             "documentactionholder_set__person")
+
     rfcs = dict((d.pk, d.name) for d in docs if d.type_id == "rfc")
 
     # latest event cache
@@ -88,8 +107,12 @@ def fill_in_document_table_attributes(docs, have_telechat_date=False):
     # get meetings
     fill_in_document_sessions(docs, doc_dict, doc_ids)
 
+    fill_in_related_ipr(docs, doc_dict, doc_ids)
+
     # misc
-    expirable_pks = expirable_drafts(Document.objects.filter(pk__in=doc_ids)).values_list('pk', flat=True)
+    expirable_pks = set(expirable_drafts(Document.objects.filter(pk__in=doc_ids)).values_list('pk', flat=True))
+    review_assignments = review_assignments_to_list_for_docs(
+        [d for d in docs if d.type_id == "draft" and d.get_state_slug() != "rfc"])
     for d in docs:
 
         if d.type_id == "rfc" and d.latest_event_cache["published_rfc"]:
@@ -119,7 +142,7 @@ def fill_in_document_table_attributes(docs, have_telechat_date=False):
 
         if d.type_id == "draft" and d.get_state_slug() != "rfc":
             d.milestones = [ m for (t, s, v, m) in sorted(((m.time, m.state.slug, m.desc, m) for m in d.groupmilestone_set.all() if m.state_id == "active")) ]
-            d.review_assignments = review_assignments_to_list_for_docs([d]).get(d.name, [])
+            d.review_assignments = review_assignments.get(d.name, [])
 
         e = d.latest_event_cache.get('started_iesg_process', None)
         d.balloting_started = e.time if e else datetime.datetime.min
@@ -144,7 +167,7 @@ def fill_in_document_table_attributes(docs, have_telechat_date=False):
         RelatedDocument.objects.filter(
             target__name__in=list(rfcs.values()),
             relationship__in=("obs", "updates"),
-        ).select_related("target")
+        ).select_related("target", "source")
     )
     # TODO - this likely reduces to something even simpler
     rel_rfcs = {
@@ -174,11 +197,15 @@ def augment_docs_with_related_docs_info(docs):
     """Augment all documents with related documents information.
     At first, it handles only conflict review document page count to mirror the original document page count."""
 
+    conflrev_targets = defaultdict(set)
+    for rel in RelatedDocument.objects.filter(
+            source__in=[d for d in docs if d.type_id == 'conflrev'], relationship_id='conflrev').select_related('target'):
+        conflrev_targets[rel.source_id].add(rel.target)
     for d in docs:
         if d.type_id == 'conflrev':
-            if len(d.related_that_doc('conflrev')) != 1:
+            if len(conflrev_targets[d.pk]) != 1:
                 continue
-            originalDoc = d.related_that_doc('conflrev')[0]
+            originalDoc = list(conflrev_targets[d.pk])[0]
             d.pages = originalDoc.pages
 
 def prepare_document_table(request, docs, query=None, max_results=200, show_ad_and_shepherd=True):
@@ -237,7 +264,7 @@ def prepare_document_table(request, docs, query=None, max_results=200, show_ad_a
             else:
                 res.append(num(d.get_state().order) if d.get_state() else None)
         elif sort_key == "ipr":
-            res.append(len(d.ipr()))
+            res.append(d.ipr_count)
         elif sort_key == "ad":
             if rfc_num is not None:
                 res.append(rfc_num)
@@ -57,7 +57,7 @@ from django.utils.text import slugify
 
 import debug                            # pyflakes:ignore
 
-from ietf.doc.models import ( Document, DocHistory, State,
+from ietf.doc.models import ( Document, DocHistory, State, DocumentSearchIndex, flush_search_index_updates,
     LastCallDocEvent, NewRevisionDocEvent, IESG_SUBSTATE_TAGS,
     IESG_BALLOT_ACTIVE_STATES, IESG_STATCHG_CONFLREV_ACTIVE_STATES,
     IESG_CHARTER_ACTIVE_STATES )
@@ -152,6 +152,9 @@ def retrieve_search_results(form, all_types=False):
 
     query = form.cleaned_data
 
+    # let a search see the documents changed earlier in the same transaction
+    flush_search_index_updates()
+
     if all_types:
         # order by time here to retain the most recent documents in case we
         # find too many and have to chop the results list
@@ -172,52 +175,37 @@ def retrieve_search_results(form, all_types=False):
 
         docs = Document.objects.filter(type__in=types)
 
-    # name
+    # name, matched against the search index (see DocumentSearchIndex)
     if query["name"]:
-        look_for = query["name"]
-        queries = [
-            Q(name__icontains=look_for),
-            Q(title__icontains=look_for)
-        ]
-        # Check to see if this is just a search for an rfc look for a few variants
-        if look_for.lower()[:3] == "rfc" and look_for[3:].strip().isdigit():
-            spaceless = look_for.lower()[:3]+look_for[3:].strip()
-            if spaceless != look_for:
-                queries.extend([
-                    Q(name__icontains=spaceless),
-                    Q(title__icontains=spaceless)            
-                ])
-            singlespace = look_for.lower()[:3]+" "+look_for[3:].strip()
-            if singlespace != look_for:
-                queries.extend([
-                    Q(name__icontains=singlespace),
-                    Q(title__icontains=singlespace)            
-                ])        
-
-        # Do a similar thing if the search is just for a subseries doc, like a bcp.
-        if look_for.lower()[:3] in ["bcp", "fyi", "std"] and look_for[3:].strip().isdigit() and query["rfcs"]: # Also look for rfcs contained in the subseries.
+        look_for = query["name"].lower()
+        # Check to see if this is just a search for an rfc or subseries doc,
+        # and look for a few variants
+        variants = [look_for]
+        if look_for[:3] in ["rfc", "bcp", "fyi", "std"] and look_for[3:].strip().isdigit():
+            for variant in [look_for[:3]+look_for[3:].strip(), look_for[:3]+" "+look_for[3:].strip()]:
+                if variant not in variants:
+                    variants.append(variant)
+        if look_for[:3] == "rfc":
+            name_variants = variants
+        else:
+            name_variants = [look_for]
+        queries = []
+        for variant in name_variants:
             queries.extend([
-                Q(targets_related__source__name__icontains=look_for, targets_related__relationship_id="contains"),
-                Q(targets_related__source__title__icontains=look_for, targets_related__relationship_id="contains"),
+                Q(search_index__name__contains=variant),
+                Q(search_index__title__contains=variant),
             ])
-            spaceless = look_for.lower()[:3]+look_for[3:].strip()
-            if spaceless != look_for:
-                queries.extend([
-                    Q(targets_related__source__name__icontains=spaceless, targets_related__relationship_id="contains"),
-                    Q(targets_related__source__title__icontains=spaceless, targets_related__relationship_id="contains"),
-                ])
-            singlespace = look_for.lower()[:3]+" "+look_for[3:].strip()
-            if singlespace != look_for:
-                queries.extend([
-                    Q(targets_related__source__name__icontains=singlespace, targets_related__relationship_id="contains"),
-                    Q(targets_related__source__title__icontains=singlespace, targets_related__relationship_id="contains"),
-                ])
+        # Look up rfc and subseries numbers exactly, which also finds the
+        # rfcs contained in the subseries.
+        number = DocumentSearchIndex.number_token(look_for)
+        if number:
+            queries.append(Q(search_index__numbers__contains=f" {number} "))
 
         if query["rfcs"]:
-            queries.extend([Q(targets_related__source__name__icontains=look_for, targets_related__relationship_id="became_rfc")])
+            queries.append(Q(search_index__came_from__contains=look_for))
 
         combined_query = reduce(operator.or_, queries)
-        docs = docs.filter(combined_query).distinct()
+        docs = docs.filter(combined_query)
 
     # rfc/active/old check buttons
     allowed_draft_states = []
@@ -226,21 +214,17 @@ def retrieve_search_results(form, all_types=False):
     if query["olddrafts"]:
         allowed_draft_states.extend(['repl', 'expired', 'auth-rm', 'ietf-rm'])
 
-    docs = docs.filter(Q(states__slug__in=allowed_draft_states) |
-                       ~Q(type__slug='draft')).distinct()
+    docs = docs.filter(Q(search_index__draft_state__in=allowed_draft_states) | ~Q(type__slug='draft'))
 
     # radio choices
     by = query["by"]
     if by == "author":
-        docs = docs.filter(
-            Q(documentauthor__person__alias__name__icontains=query["author"]) |
-            Q(documentauthor__person__email__address__icontains=query["author"])
-        )
+        docs = docs.filter(search_index__authors__contains=query["author"].lower())
     elif by == "group":
-        docs = docs.filter(group__acronym__iexact=query["group"])
+        docs = docs.filter(search_index__group=query["group"].lower())
     elif by == "area":
         docs = docs.filter(Q(group__type="wg", group__parent=query["area"]) |
-                           Q(group=query["area"])).distinct()
+                           Q(group=query["area"]))
     elif by == "ad":
         docs = docs.filter(ad=query["ad"])
     elif by == "state":
@@ -251,7 +235,7 @@ def retrieve_search_results(form, all_types=False):
     elif by == "irtfstate":
         docs = docs.filter(states=query["irtfstate"])
     elif by == "stream":
-        docs = docs.filter(stream=query["stream"])
+        docs = docs.filter(search_index__stream=query["stream"].slug if query["stream"] else "")
 
     return docs
 
@@ -739,15 +723,20 @@ def drafts_in_iesg_process(request):
     grouped_docs = []
 
     for s in states.order_by("order"):
-        docs = Document.objects.filter(type="draft", states=s).distinct().order_by("time").select_related("ad", "group", "group__parent")
+        docs = Document.objects.filter(type="draft", states=s).distinct().order_by("time").select_related(
+            "ad", "group", "group__parent", "intended_std_level").prefetch_related("states", "documentactionholder_set__person")
         if docs:
             if s.slug == "lc":
+                docs = list(docs)
+                last_calls = dict(
+                    (e.doc_id, e)
+                    for e in LastCallDocEvent.objects.filter(doc__in=docs, type="sent_last_call").order_by("time", "id")
+                )
                 for d in docs:
-                    e = d.latest_event(LastCallDocEvent, type="sent_last_call")
+                    e = last_calls.get(d.pk)
                     # If we don't have an event, use an arbitrary date in the past (but not datetime.datetime.min,
                     # which causes problems with timezone conversions)
                     d.lc_expires = e.expires if e else datetime.datetime(1950, 1, 1)
-                docs = list(docs)
                 docs.sort(key=lambda d: d.lc_expires)
 
             grouped_docs.append((s, docs))
@@ -860,11 +849,12 @@ def ajax_select2_search_docs(request, model_name, doc_type): # TODO - remove mod
             types = ("draft", "rfc", "bcp", "fyi", "std")
         else:
             return HttpResponseBadRequest("Invalid document type")
+        flush_search_index_updates()
         qs = model.objects.filter(type__in=[t.strip() for t in types])
         for t in q:
-            qs = qs.filter(name__icontains=t)
+            qs = qs.filter(search_index__name__contains=t.lower())
 
-        objs = qs.distinct().order_by("name")[:20]
+        objs = qs.order_by("name")[:20]
 
     return HttpResponse(select2_id_doc_name_json(model, objs), content_type='application/json')
 
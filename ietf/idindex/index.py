@@ -5,94 +5,266 @@
 # code to generate plain-text index files that are placed on
 # www.ietf.org in the same directory as the I-Ds
 
+import copy
 import datetime
+import itertools
 import os
+import re
+
+from collections import defaultdict
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
 from django.template.loader import render_to_string
+from django.utils.functional import cached_property
 from django.utils import timezone
 
 import debug    # pyflakes:ignore
 
-from ietf.doc.models import Document, DocEvent, DocumentAuthor, RelatedDocument, State
+from ietf.doc.models import Document, DocEvent, DocumentAuthor, RelatedDocument, State, DOCUMENT_LINKS_DELETED_CACHE_KEY
 from ietf.doc.models import LastCallDocEvent, NewRevisionDocEvent
 from ietf.doc.models import IESG_SUBSTATE_TAGS
 from ietf.doc.templatetags.ietf_filters import clean_whitespace
 from ietf.group.models import Group
-from ietf.person.models import Person, Email
-
-def all_id_txt():
+from ietf.person.models import Email, Person
+
+class IndexSnapshot:
+    """The data the I-D index files are generated from
+
+    The data kept per draft (states, tags, revision times, ...) is loaded
+    in bulk, with a fixed number of queries, the first time it is used, so
+    all the index files can be generated from a single snapshot without
+    going back to the database for each draft.  The drafts themselves and
+    their authors are streamed by iter_drafts(), so the memory used doesn't
+    grow with the size of the draft records.  With active_only, only the
+    active drafts are included.
+    """
+    chunk_size = 2000
+
+    def __init__(self, active_only=False):
+        self.active_state = State.objects.get(type="draft", slug="active")
+        self.draft_qs = Document.objects.filter(type="draft")
+        if active_only:
+            self.draft_qs = self.draft_qs.filter(states=self.active_state)
+
+    @cached_property
+    def states(self):
+        return dict((s.pk, s) for s in State.objects.filter(type__in=["draft", "draft-iesg", "draft-stream-ietf"]))
+
+    @cached_property
+    def draft_states(self):
+        """Draft and IESG states by document id, in the form of Document.state_cache"""
+        draft_states = defaultdict(dict)
+        self.wg_candidates = set()
+        for doc_id, state_id in Document.states.through.objects.filter(
+                document__in=self.draft_qs, state__in=self.states.keys()).values_list("document_id", "state_id"):
+            state = self.states[state_id]
+            if state.type_id == "draft-stream-ietf":
+                if state.slug in ("wg-cand", "c-adopt"):
+                    self.wg_candidates.add(doc_id)
+            else:
+                draft_states[doc_id][state.type_id] = state
+        return draft_states
+
+    @cached_property
+    def iesg_tags(self):
+        iesg_tags = defaultdict(list)
+        for doc_id, tag in Document.tags.through.objects.filter(
+                document__in=self.draft_qs, doctagname__in=IESG_SUBSTATE_TAGS).order_by(
+                "doctagname__order", "doctagname__name").values_list("document_id", "doctagname__name"):
+            iesg_tags[doc_id].append(tag)
+        return iesg_tags
+
+    def iter_drafts(self, with_authors=False, with_abstracts=False, **filters):
+        """Yield the drafts matching filters in name order, streamed from the database
+
+        The drafts have their states in state_cache, and IESG substate tags
+        and whether they are WG candidates in the iesg_tags and wg_candidate
+        attributes.  With with_authors, the DocumentAuthors are in the
+        index_authors attribute; they are streamed along with the drafts.
+        """
+        # filters on multi-valued relations, like states__type, would
+        # otherwise yield a draft once per matching row
+        qs = self.draft_qs.filter(**filters).distinct()
+        drafts = qs.order_by("name").select_related("ad", "intended_std_level")
+        if not with_abstracts:
+            drafts = drafts.defer("abstract")
+        if with_authors:
+            authors = itertools.groupby(
+                DocumentAuthor.objects.filter(document__in=qs).order_by("document__name", "order").select_related(
+                    "email", "person").iterator(chunk_size=self.chunk_size),
+                key=lambda a: a.document_id,
+            )
+            doc_authors = next(authors, None)
+        for d in drafts.iterator(chunk_size=self.chunk_size):
+            d.state_cache = self.draft_states.get(d.pk, {})
+            d.iesg_tags = self.iesg_tags.get(d.pk, [])
+            d.wg_candidate = d.pk in self.wg_candidates
+            if with_authors:
+                # both are ordered by name, so the authors of d are next if it has any
+                d.index_authors = []
+                if doc_authors is not None and doc_authors[0] == d.pk:
+                    d.index_authors = list(doc_authors[1])
+                    doc_authors = next(authors, None)
+            yield d
+
+    @cached_property
+    def rfcs(self):
+        return dict(RelatedDocument.objects.filter(relationship="became_rfc", source__in=self.draft_qs).values_list("source__name", "target__name"))
+
+    @cached_property
+    def replacements(self):
+        return dict(RelatedDocument.objects.filter(target__states=State.objects.get(type="draft", slug="repl"),
+                                                   relationship="replaces").values_list("target__name", "source__name"))
+
+    @cached_property
+    def revision_times(self):
+        """First and latest revision time of each draft"""
+        initial, latest = {}, {}
+        for name, time in NewRevisionDocEvent.objects.filter(type="new_revision", doc__in=self.draft_qs).order_by("time").values_list("doc__name", "time").iterator(chunk_size=self.chunk_size):
+            latest[name] = time
+            initial.setdefault(name, time)
+        return initial, latest
+
+    @property
+    def revision_time(self):
+        return self.revision_times[1]
+
+    @property
+    def initial_revision_time(self):
+        return self.revision_times[0]
+
+    @cached_property
+    def last_call_expires(self):
+        return dict(
+            LastCallDocEvent.objects.filter(
+                type="sent_last_call", doc__in=self.draft_qs, doc__states__type="draft-iesg", doc__states__slug="lc",
+            ).order_by("time", "id").values_list("doc_id", "expires")
+        )
+
+    @cached_property
+    def shepherds(self):
+        return dict((e.pk, e.formatted_ascii_email().replace('"', ''))
+                    for e in Email.objects.filter(shepherd_document_set__in=self.draft_qs).select_related("person").distinct())
+
+    @cached_property
+    def ads(self):
+        # the same address as Person.formatted_ascii_email(), for all ADs at once
+        emails = defaultdict(list)
+        for e in Email.objects.filter(person__ad_document_set__in=self.draft_qs).select_related("person").distinct():
+            emails[e.person_id].append(e)
+        ads = {}
+        for person_id, person_emails in emails.items():
+            e = next((e for e in person_emails if e.primary), None)
+            if not e or not e.active:
+                e = max(person_emails, key=lambda e: (e.active, e.time))
+            ads[person_id] = e.formatted_ascii_email().replace('"', '')
+        return ads
+
+    @cached_property
+    def groups(self):
+        return dict((g.id, g) for g in Group.objects.all())
+
+    @cached_property
+    def individual(self):
+        return next(g for g in self.groups.values() if g.acronym == "none")
+
+    @cached_property
+    def file_types(self):
+        return file_types_for_drafts()
+
+
+def index_data_fingerprint():
+    """Return a value that changes whenever the data shown in the I-D indexes may have changed
+
+    This takes a handful of maximum lookups, so it is much cheaper than
+    generating the indexes.  It covers document events and changes to
+    documents, relations, authors, persons, email addresses and groups,
+    and files added to or removed from the draft directory.  Deleted
+    persons and email addresses show up as new history rows, and deleted
+    relations and authors as a new version in the cache (see
+    ietf.doc.models.document_link_deleted), so no rows need to be counted.
+    """
+    def latest(qs, field):
+        return qs.aggregate(latest=Max(field))["latest"]
+    return (
+        latest(DocEvent.objects.all(), "id"),
+        latest(Document.objects.filter(type="draft"), "time"),
+        latest(RelatedDocument.objects.all(), "id"),
+        latest(DocumentAuthor.objects.all(), "id"),
+        cache.get(DOCUMENT_LINKS_DELETED_CACHE_KEY),
+        latest(Person.history.all(), "history_id"),
+        latest(Email.history.all(), "history_id"),
+        latest(Group.objects.all(), "time"),
+        os.stat(settings.INTERNET_DRAFT_PATH).st_mtime_ns,
+    )
+
+def without_timestamps(content):
+    """Return index file content with the time of generation removed, for comparisons"""
+    return re.sub(r"(?i)generated:? \d{4}-\d\d-\d\d \d\d:\d\d:\d\d \w+", "", content)
+
+def all_id_txt(snapshot=None):
+    return "".join(iter_all_id_txt(snapshot))
+
+def iter_all_id_txt(snapshot=None):
+    """Yield the content of all_id.txt, a line at a time"""
     # this returns a lot of data so try to be efficient
-
-    # precalculations
-    revision_time = dict(NewRevisionDocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-").order_by('time').values_list("doc__name", "time"))
+    if snapshot is None:
+        snapshot = IndexSnapshot()
 
     def formatted_rev_date(name):
-        t = revision_time.get(name)
+        t = snapshot.revision_time.get(name)
         return t.strftime("%Y-%m-%d") if t else ""
 
-    rfcs = dict()
-    for rfc in Document.objects.filter(type_id="rfc"):
-        draft = rfc.came_from_draft()
-        if draft is not None:
-            rfcs[draft.name] = rfc.name
-
-    replacements = dict(RelatedDocument.objects.filter(target__states=State.objects.get(type="draft", slug="repl"),
-                                                       relationship="replaces").values_list("target__name", "source__name"))
-
-
-    # we need a distinct to prevent the queries below from multiplying the result
-    all_ids = Document.objects.filter(type="draft").order_by('name').distinct()
+    yield "\nInternet-Drafts Status Summary\n\n"
 
-    res = ["\nInternet-Drafts Status Summary\n"]
-
-    def add_line(f1, f2, f3, f4):
+    def line(f1, f2, f3, f4):
         # each line must have exactly 4 tab-separated fields
-        res.append(f1 + "\t" + f2 + "\t" + f3 + "\t" + f4)
+        return f1 + "\t" + f2 + "\t" + f3 + "\t" + f4 + "\n"
 
 
     inactive_states = ["idexists", "pub", "watching", "dead"]
 
-    excludes = list(State.objects.filter(type="draft", slug__in=["rfc","repl"]))
-    includes = list(State.objects.filter(type="draft-iesg").exclude(slug__in=inactive_states))
-    in_iesg_process = all_ids.exclude(states__in=excludes).filter(states__in=includes).only("name", "rev")
+    def in_iesg_process(d):
+        iesg_state = d.get_state("draft-iesg")
+        return (d.get_state_slug() not in ("rfc", "repl")
+                and iesg_state is not None and iesg_state.slug not in inactive_states)
 
     # handle those actively in the IESG process
-    for d in in_iesg_process:
-        state = d.get_state("draft-iesg").name
-        tags = d.tags.filter(slug__in=IESG_SUBSTATE_TAGS).values_list("name", flat=True)
-        if tags:
-            state += "::" + "::".join(tags)
-        add_line(d.name + "-" + d.rev,
-                 formatted_rev_date(d.name),
-                 "In IESG processing - I-D Tracker state <" + state + ">",
-                 "",
-                 )
+    for d in snapshot.iter_drafts(states__type="draft-iesg"):
+        if in_iesg_process(d):
+            state = d.get_state("draft-iesg").name
+            if d.iesg_tags:
+                state += "::" + "::".join(d.iesg_tags)
+            yield line(d.name + "-" + d.rev,
+                       formatted_rev_date(d.name),
+                       "In IESG processing - I-D Tracker state <" + state + ">",
+                       "",
+                       )
 
 
     # handle the rest
 
-    not_in_process = all_ids.exclude(pk__in=[d.pk for d in in_iesg_process])
-
-    for s in State.objects.filter(type="draft").order_by("order"):
-        for name, rev in not_in_process.filter(states=s).values_list("name", "rev"):
+    for s in sorted((s for s in snapshot.states.values() if s.type_id == "draft"), key=lambda s: s.order):
+        for d in snapshot.iter_drafts(states=s):
+            if in_iesg_process(d):
+                continue
             state = s.name
             last_field = ""
 
             if s.slug == "rfc":
-                rfc = rfcs.get(name)
+                rfc = snapshot.rfcs.get(d.name)
                 if rfc:
                     last_field = rfc[3:] # Rework this to take advantage of having the number at hand already.
             elif s.slug == "repl":
-                state += " replaced by " + replacements.get(name, "0")
+                state += " replaced by " + snapshot.replacements.get(d.name, "0")
 
-            add_line(name + "-" + rev,
-                     formatted_rev_date(name),
-                     state,
-                     last_field,
-                    )
-
-    return "\n".join(res) + "\n"
+            yield line(d.name + "-" + d.rev,
+                       formatted_rev_date(d.name),
+                       state,
+                       last_field,
+                      )
 
 def file_types_for_drafts():
     """Look in the draft directory and return file types found as dict (name + rev -> [t1, t2, ...])."""
@@ -108,46 +280,34 @@ def file_types_for_drafts():
 
     return file_types
 
-def all_id2_txt():
-    # this returns a lot of data so try to be efficient
+def all_id2_txt(snapshot=None):
+    return "".join(iter_all_id2_txt(snapshot))
 
-    drafts = Document.objects.filter(type="draft").order_by('name')
-    drafts = drafts.select_related('group', 'group__parent', 'ad', 'intended_std_level', 'shepherd', )
-    drafts = drafts.prefetch_related("states")
-
-    rfcs = dict()
-    for rfc in Document.objects.filter(type_id="rfc"):
-        draft = rfc.came_from_draft()
-        if draft is not None:
-            rfcs[draft.name] = rfc.name
-
-    replacements = dict(RelatedDocument.objects.filter(target__states=State.objects.get(type="draft", slug="repl"),
-                                                       relationship="replaces").values_list("target__name", "source__name"))
-
-    revision_time = dict(DocEvent.objects.filter(type="new_revision", doc__name__startswith="draft-").order_by('time').values_list("doc__name", "time"))
-
-    file_types = file_types_for_drafts()
-
-    authors = {}
-    for a in DocumentAuthor.objects.filter(document__name__startswith="draft-").order_by("order").select_related("email", "person").iterator():
-        if a.document.name not in authors:
-            l = authors[a.document.name] = []
-        else:
-            l = authors[a.document.name]
-        if a.email:
-            l.append('%s <%s>' % (a.person.plain_name().replace("@", ""), a.email.address.replace(",", "")))
-        else:
-            l.append(a.person.plain_name())
-
-    shepherds = dict((e.pk, e.formatted_ascii_email().replace('"', ''))
-                     for e in Email.objects.filter(shepherd_document_set__type="draft").select_related("person").distinct())
-    ads = dict((p.pk, p.formatted_ascii_email().replace('"', ''))
-               for p in Person.objects.filter(ad_document_set__type="draft").distinct())
-
-    res = []
-    for d in drafts:
+def iter_all_id2_txt(snapshot=None):
+    """Yield the content of all_id2.txt, a line at a time"""
+    # this returns a lot of data so try to be efficient
+    if snapshot is None:
+        snapshot = IndexSnapshot()
+
+    # the lines go where the data is in the template
+    marker = "\0data\0"
+    head, tail = render_to_string("idindex/all_id2.txt", {'data': marker}).split(marker)
+    yield head
+
+    def author_names(d):
+        names = []
+        for a in d.index_authors:
+            if a.email:
+                names.append('%s <%s>' % (a.person.plain_name().replace("@", ""), a.email.address.replace(",", "")))
+            else:
+                names.append(a.person.plain_name())
+        return names
+
+    separator = ""
+    for d in snapshot.iter_drafts(with_authors=True):
         state = d.get_state_slug()
         iesg_state = d.get_state("draft-iesg")
+        group = snapshot.groups.get(d.group_id)
 
         fields = []
         # 0
@@ -161,39 +321,39 @@ def all_id2_txt():
             s = "I-D Exists"
             if iesg_state:
                 s = iesg_state.name
-                tags = d.tags.filter(slug__in=IESG_SUBSTATE_TAGS).values_list("name", flat=True)
-                if tags:
-                    s += "::" + "::".join(tags)
+                if d.iesg_tags:
+                    s += "::" + "::".join(d.iesg_tags)
             fields.append(s)
         else:
             fields.append("")
         # 4
         rfc_number = ""
         if state == "rfc":
-            rfc = rfcs.get(d.name)
+            rfc = snapshot.rfcs.get(d.name)
             if rfc:
                 rfc_number = rfc[3:]
         fields.append(rfc_number)
         # 5
         repl = ""
         if state == "repl":
-            repl = replacements.get(d.name, "")
+            repl = snapshot.replacements.get(d.name, "")
         fields.append(repl)
         # 6
-        t = revision_time.get(d.name)
+        t = snapshot.revision_time.get(d.name)
         fields.append(t.strftime("%Y-%m-%d") if t else "")
         # 7
         group_acronym = ""
-        if d.group and d.group.type_id != "area" and d.group.acronym != "none":
-            group_acronym = d.group.acronym
+        if group and group.type_id != "area" and group.acronym != "none":
+            group_acronym = group.acronym
         fields.append(group_acronym)
         # 8
         area = ""
-        if d.group:
-            if d.group.type_id == "area":
-                area = d.group.acronym
-            elif d.group.type_id == "wg" and d.group.parent and d.group.parent.type_id == "area":
-                area = d.group.parent.acronym
+        if group:
+            parent = snapshot.groups.get(group.parent_id)
+            if group.type_id == "area":
+                area = group.acronym
+            elif group.type_id == "wg" and parent and parent.type_id == "area":
+                area = parent.acronym
         fields.append(area)
         # 9 responsible AD name
         fields.append(str(d.ad) if d.ad else "")
@@ -202,78 +362,59 @@ def all_id2_txt():
         # 11
         lc_expires = ""
         if iesg_state and iesg_state.slug == "lc":
-            e = d.latest_event(LastCallDocEvent, type="sent_last_call")
-            if e:
-                lc_expires = e.expires.strftime("%Y-%m-%d")
+            expires = snapshot.last_call_expires.get(d.pk)
+            if expires:
+                lc_expires = expires.strftime("%Y-%m-%d")
         fields.append(lc_expires)
         # 12
-        doc_file_types = file_types.get(d.name + "-" + d.rev, [])
-        doc_file_types.sort()           # make the order consistent (and the result testable)
+        doc_file_types = sorted(snapshot.file_types.get(d.name + "-" + d.rev, []))  # make the order consistent (and the result testable)
         fields.append(",".join(doc_file_types) if state == "active" else "")
         # 13
         fields.append(clean_whitespace(d.title)) # FIXME: we should make sure this is okay in the database and in submit
         # 14
-        fields.append(", ".join(authors.get(d.name, [])))
+        fields.append(", ".join(author_names(d)))
         # 15
-        fields.append(shepherds.get(d.shepherd_id, ""))
+        fields.append(snapshot.shepherds.get(d.shepherd_id, ""))
         # 16 Responsible AD name and email
-        fields.append(ads.get(d.ad_id, ""))
+        fields.append(snapshot.ads.get(d.ad_id, ""))
 
         #
-        res.append("\t".join(fields))
+        yield separator + "\t".join(fields)
+        separator = "\n"
 
-    return render_to_string("idindex/all_id2.txt", {'data': "\n".join(res) })
+    yield tail
 
-def active_drafts_index_by_group(extra_values=()):
+def active_drafts_index_by_group(with_abstracts=False, snapshot=None):
     """Return active drafts grouped into their corresponding
     associated group, for spitting out draft index."""
 
     # this returns a lot of data so try to be efficient
-
-    active_state = State.objects.get(type="draft", slug="active")
-    wg_cand = State.objects.get(type="draft-stream-ietf", slug="wg-cand")
-    wg_adopt = State.objects.get(type="draft-stream-ietf", slug="c-adopt")
-    individual = Group.objects.get(acronym='none')
-
-    groups_dict = dict((g.id, g) for g in Group.objects.all())
-
-    extracted_values = ("name", "rev", "title", "group_id") + extra_values
-
-    docs_dict = dict((d["name"], d)
-                     for d in Document.objects.filter(states=active_state).values(*extracted_values))
-
-    # Special case for drafts with group set, but in state wg_cand:
-    for d in Document.objects.filter(states=active_state).filter(states__in=[wg_cand, wg_adopt]):
-        docs_dict[d.name]['group_id'] = individual.id
-
-    # add initial and latest revision time
-    for time, doc_name in NewRevisionDocEvent.objects.filter(type="new_revision", doc__states=active_state).order_by('-time').values_list("time", "doc__name"):
-        d = docs_dict.get(doc_name)
-        if d:
-            if "rev_time" not in d:
-                d["rev_time"] = time
-            d["initial_rev_time"] = time
-
-    # add authors
-    for a in DocumentAuthor.objects.filter(document__states=active_state).order_by("order").select_related("person"):
-        d = docs_dict.get(a.document.name)
-        if d:
-            if "authors" not in d:
-                d["authors"] = []
-            d["authors"].append(a.person.plain_ascii()) # This should probably change to .plain_name() when non-ascii names are permitted
-
-    # put docs into groups
-    for d in docs_dict.values():
-        group = groups_dict.get(d["group_id"])
-        if not group:
-            continue
-
-        if not hasattr(group, "active_drafts"):
-            group.active_drafts = []
-
-        group.active_drafts.append(d)
-
-    groups = [g for g in groups_dict.values() if hasattr(g, "active_drafts")]
+    if snapshot is None:
+        snapshot = IndexSnapshot(active_only=True)
+
+    active_drafts = defaultdict(list)
+    for doc in snapshot.iter_drafts(with_authors=True, with_abstracts=with_abstracts, states=snapshot.active_state):
+        d = dict(name=doc.name, rev=doc.rev, title=doc.title)
+        if with_abstracts:
+            d["abstract"] = doc.abstract
+        # add initial and latest revision time
+        if doc.name in snapshot.revision_time:
+            d["rev_time"] = snapshot.revision_time[doc.name]
+            d["initial_rev_time"] = snapshot.initial_revision_time[doc.name]
+        # This should probably change to .plain_name() when non-ascii names are permitted
+        d["authors"] = [a.person.plain_ascii() for a in doc.index_authors]
+        # Special case for drafts with group set, but in state wg_cand:
+        group_id = snapshot.individual.id if doc.wg_candidate else doc.group_id
+        # put docs into groups
+        if group_id in snapshot.groups:
+            active_drafts[group_id].append(d)
+
+    groups = []
+    for group_id, drafts in active_drafts.items():
+        # copied, so that several indexes can be generated from the same snapshot
+        group = copy.copy(snapshot.groups[group_id])
+        group.active_drafts = drafts
+        groups.append(group)
     groups.sort(key=lambda g: g.acronym)
 
     fallback_time = datetime.datetime(1950, 1, 1, tzinfo=datetime.timezone.utc)
@@ -282,13 +423,21 @@ def active_drafts_index_by_group(extra_values=()):
 
     return groups
     
-def id_index_txt(with_abstracts=False):
-    extra_values = ()
-    if with_abstracts:
-        extra_values = ("abstract",)
-    groups = active_drafts_index_by_group(extra_values)
+def id_index_txt(with_abstracts=False, snapshot=None):
+    return "".join(iter_id_index_txt(with_abstracts, snapshot))
+
+def iter_id_index_txt(with_abstracts=False, snapshot=None):
+    """Yield the content of 1id-index.txt or 1id-abstracts.txt, a group at a time"""
+    if snapshot is None:
+        snapshot = IndexSnapshot(active_only=True)
+    groups = active_drafts_index_by_group(with_abstracts, snapshot)
+
+    yield render_to_string("idindex/id_index_header.txt", {
+            'time': timezone.now().astimezone(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z"),
+            'with_abstracts': with_abstracts,
+            })
 
-    file_types = file_types_for_drafts()
+    file_types = snapshot.file_types
     for g in groups:
         for d in g.active_drafts:
             # we need to output a multiple extension thing
@@ -299,9 +448,8 @@ def id_index_txt(with_abstracts=False):
             if ".pdf" in types:
                 exts += ",.pdf"
             d["exts"] = exts
-
-    return render_to_string("idindex/id_index.txt", {
-            'groups': groups,
-            'time': timezone.now().astimezone(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z"),
-            'with_abstracts': with_abstracts,
-            })
+        yield render_to_string("idindex/id_index_group.txt", {
+                'group': g,
+                'with_abstracts': with_abstracts,
+                })
+    yield "\n"
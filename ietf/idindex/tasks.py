@@ -2,16 +2,21 @@
 #
 # Celery task definitions
 #
+import hashlib
 import shutil
 
 import debug    # pyflakes:ignore
 
 from celery import shared_task
+from django.core.cache import cache
 from contextlib import AbstractContextManager
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
-from .index import all_id_txt, all_id2_txt, id_index_txt
+from ietf.utils import log
+
+from .index import (iter_all_id_txt, iter_all_id2_txt, iter_id_index_txt, index_data_fingerprint, without_timestamps,
+                    IndexSnapshot)
 
 
 class TempFileManager(AbstractContextManager):
@@ -20,10 +25,26 @@ class TempFileManager(AbstractContextManager):
         self.dir = tmpdir
 
     def make_temp_file(self, content):
+        """Write content, a string or an iterable of strings, to a new temp file"""
+        if isinstance(content, str):
+            content = [content]
         with NamedTemporaryFile(mode="wt", delete=False, dir=self.dir) as tf:
             tf_path = Path(tf.name)
             self.cleanup_list.add(tf_path)
-            tf.write(content)
+            for chunk in content:
+                tf.write(chunk)
+        return tf_path
+
+    def make_temp_copy(self, src_path: Path):
+        """Make another temp file with the content of src_path, as a hard link if possible"""
+        with NamedTemporaryFile(delete=False, dir=self.dir) as tf:
+            tf_path = Path(tf.name)
+            self.cleanup_list.add(tf_path)
+        try:
+            tf_path.unlink()
+            tf_path.hardlink_to(src_path)
+        except OSError:
+            shutil.copyfile(src_path, tf_path)
         return tf_path
 
     def move_into_place(self, src_path: Path, dest_path: Path):
@@ -40,46 +61,76 @@ class TempFileManager(AbstractContextManager):
         return False  # False: do not suppress the exception
 
 
+# The indexes are regenerated at least this often (seconds), even when
+# index_data_fingerprint() doesn't see any changes
+INDEX_DATA_FINGERPRINT_TIMEOUT = 24 * 60 * 60
+INDEX_DATA_FINGERPRINT_CACHE_KEY = "idindex:data_fingerprint"
+
+
+def index_digest(chunks):
+    """Digest of index content, ignoring the time of generation"""
+    digest = hashlib.sha256()
+    for _ in digested(chunks, digest):
+        pass
+    return digest.hexdigest()
+
+
+def index_file_digest(path: Path):
+    try:
+        with path.open() as f:
+            return index_digest(f)
+    except FileNotFoundError:
+        return None
+
+
+def digested(chunks, digest):
+    """Pass chunks through, adding them to digest like index_digest() does"""
+    for chunk in chunks:
+        digest.update(without_timestamps(chunk).encode())
+        yield chunk
+
+
 @shared_task
-def idindex_update_task():
-    """Update I-D indexes"""
+def idindex_update_task(force=False):
+    """Update I-D indexes
+
+    Does nothing if the index data hasn't changed since the last run, unless
+    force is set, and only replaces index files whose content has changed.
+    Each index is streamed to a single temp file, which is linked or copied
+    to each of its destinations.
+    """
     id_path = Path("/a/ietfdata/doc/draft/repository")
     derived_path = Path("/a/ietfdata/derived")
     download_path = Path("/a/www/www6s/download")
 
-    with TempFileManager("/a/tmp") as tmp_mgr:
-        # Generate copies of new contents
-        all_id_content = all_id_txt()
-        all_id_tmpfile = tmp_mgr.make_temp_file(all_id_content)
-        derived_all_id_tmpfile = tmp_mgr.make_temp_file(all_id_content)
-        download_all_id_tmpfile = tmp_mgr.make_temp_file(all_id_content)
-
-        id_index_content = id_index_txt()
-        id_index_tmpfile = tmp_mgr.make_temp_file(id_index_content)
-        derived_id_index_tmpfile = tmp_mgr.make_temp_file(id_index_content)
-        download_id_index_tmpfile = tmp_mgr.make_temp_file(id_index_content)
-
-        id_abstracts_content = id_index_txt(with_abstracts=True)
-        id_abstracts_tmpfile = tmp_mgr.make_temp_file(id_abstracts_content)
-        derived_id_abstracts_tmpfile = tmp_mgr.make_temp_file(id_abstracts_content)
-        download_id_abstracts_tmpfile = tmp_mgr.make_temp_file(id_abstracts_content)
-
-        all_id2_content = all_id2_txt()
-        all_id2_tmpfile = tmp_mgr.make_temp_file(all_id2_content)
-        derived_all_id2_tmpfile = tmp_mgr.make_temp_file(all_id2_content)
+    fingerprint = index_data_fingerprint()
+    if not force and cache.get(INDEX_DATA_FINGERPRINT_CACHE_KEY) == fingerprint:
+        log.log("I-D index data unchanged, not updating the indexes")
+        return
 
-        # Move temp files as-atomically-as-possible into place
-        tmp_mgr.move_into_place(all_id_tmpfile, id_path / "all_id.txt")
-        tmp_mgr.move_into_place(derived_all_id_tmpfile, derived_path / "all_id.txt")
-        tmp_mgr.move_into_place(download_all_id_tmpfile, download_path / "id-all.txt")
+    # all the indexes are generated from the same data, loaded once
+    snapshot = IndexSnapshot()
 
-        tmp_mgr.move_into_place(id_index_tmpfile, id_path / "1id-index.txt")
-        tmp_mgr.move_into_place(derived_id_index_tmpfile, derived_path / "1id-index.txt")
-        tmp_mgr.move_into_place(download_id_index_tmpfile, download_path / "id-index.txt")
+    with TempFileManager("/a/tmp") as tmp_mgr:
+        # Generate new contents
+        updates = []
+        for chunks, dest_paths in (
+            (iter_all_id_txt(snapshot), [id_path / "all_id.txt", derived_path / "all_id.txt", download_path / "id-all.txt"]),
+            (iter_id_index_txt(snapshot=snapshot), [id_path / "1id-index.txt", derived_path / "1id-index.txt", download_path / "id-index.txt"]),
+            (iter_id_index_txt(with_abstracts=True, snapshot=snapshot), [id_path / "1id-abstracts.txt", derived_path / "1id-abstracts.txt", download_path / "id-abstract.txt"]),
+            (iter_all_id2_txt(snapshot), [id_path / "all_id2.txt", derived_path / "all_id2.txt"]),
+        ):
+            digest = hashlib.sha256()
+            tmpfile = tmp_mgr.make_temp_file(digested(chunks, digest))
+            changed = [dest_path for dest_path in dest_paths
+                       if force or index_file_digest(dest_path) != digest.hexdigest()]
+            for dest_path in changed:
+                updates.append((tmpfile if dest_path == changed[-1] else tmp_mgr.make_temp_copy(tmpfile), dest_path))
 
-        tmp_mgr.move_into_place(id_abstracts_tmpfile, id_path / "1id-abstracts.txt")
-        tmp_mgr.move_into_place(derived_id_abstracts_tmpfile, derived_path / "1id-abstracts.txt")
-        tmp_mgr.move_into_place(download_id_abstracts_tmpfile, download_path / "id-abstract.txt")
+        # Move temp files as-atomically-as-possible into place
+        for tmpfile, dest_path in updates:
+            tmp_mgr.move_into_place(tmpfile, dest_path)
 
-        tmp_mgr.move_into_place(all_id2_tmpfile, id_path / "all_id2.txt")
-        tmp_mgr.move_into_place(derived_all_id2_tmpfile, derived_path / "all_id2.txt")
+    # the fingerprint was taken before the snapshot, so changes made while
+    # the indexes were generated will be picked up by the next run
+    cache.set(INDEX_DATA_FINGERPRINT_CACHE_KEY, fingerprint, INDEX_DATA_FINGERPRINT_TIMEOUT)
@@ -9,6 +9,9 @@ from pathlib import Path
 from tempfile import TemporaryDirectory
 
 from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 import debug    # pyflakes:ignore
@@ -17,8 +20,9 @@ from ietf.doc.factories import WgDraftFactory, RfcFactory
 from ietf.doc.models import Document, RelatedDocument, State, LastCallDocEvent, NewRevisionDocEvent
 from ietf.group.factories import GroupFactory
 from ietf.name.models import DocRelationshipName
-from ietf.idindex.index import all_id_txt, all_id2_txt, id_index_txt
-from ietf.idindex.tasks import idindex_update_task, TempFileManager
+from ietf.idindex.index import all_id_txt, all_id2_txt, id_index_txt, index_data_fingerprint, IndexSnapshot
+from ietf.idindex.tasks import (idindex_update_task, index_digest, index_file_digest, TempFileManager,
+                                INDEX_DATA_FINGERPRINT_CACHE_KEY)
 from ietf.person.factories import PersonFactory, EmailFactory
 from ietf.utils.test_utils import TestCase
 
@@ -35,6 +39,12 @@ class IndexTests(TestCase):
         self.assertTrue(draft.name + "-" + draft.rev in txt)
         self.assertTrue(draft.get_state("draft-iesg").name in txt)
 
+        # a draft with more than one IESG state is listed once
+        draft.states.add(State.objects.get(type_id="draft-iesg", slug="iesg-eva"))
+        txt = all_id_txt()
+        self.assertEqual(txt.count(draft.name + "-" + draft.rev), 1)
+        draft.states.remove(State.objects.get(type_id="draft-iesg", slug="iesg-eva"))
+
         # not active in IESG process
         draft.set_state(State.objects.get(type_id="draft-iesg", slug="idexists"))
 
@@ -155,11 +165,65 @@ class IndexTests(TestCase):
 
         self.assertTrue(draft.abstract[:20] in txt)
 
+    def test_index_snapshot_query_count(self):
+        def make_drafts(n):
+            for _ in range(n):
+                draft = WgDraftFactory(states=[('draft','active'),('draft-iesg','lc')], authors=[EmailFactory().person],
+                                       ad=PersonFactory(), shepherd=EmailFactory())
+                NewRevisionDocEvent.objects.create(doc=draft, rev=draft.rev, type="new_revision", by=draft.ad)
+                LastCallDocEvent.objects.create(doc=draft, rev=draft.rev, type="sent_last_call", expires=timezone.now(), by=draft.ad)
+                rfc = RfcFactory()
+                WgDraftFactory(states=[('draft','rfc')]).relateddocument_set.create(relationship_id="became_rfc", target=rfc)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                snapshot = IndexSnapshot()
+                all_id_txt(snapshot)
+                id_index_txt(snapshot=snapshot)
+                id_index_txt(with_abstracts=True, snapshot=snapshot)
+                all_id2_txt(snapshot)
+            return len(context.captured_queries)
+
+        make_drafts(2)
+        small_count = count_queries()
+        make_drafts(10)
+        self.assertEqual(count_queries(), small_count)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_index_data_fingerprint(self):
+        draft = WgDraftFactory(authors=[PersonFactory()])
+        with CaptureQueriesContext(connection) as context:
+            fingerprint = index_data_fingerprint()
+        # only maximums, which come from indexes, not row counts
+        self.assertFalse([q for q in context.captured_queries if "COUNT(" in q["sql"].upper()])
+        self.assertEqual(index_data_fingerprint(), fingerprint)
+        draft.set_state(State.objects.get(type="draft-iesg", slug="lc"))
+        draft.save_with_history([NewRevisionDocEvent.objects.create(doc=draft, rev=draft.rev, type="new_revision", by=PersonFactory())])
+        self.assertNotEqual(index_data_fingerprint(), fingerprint)
+        fingerprint = index_data_fingerprint()
+        self.write_draft_file("%s-%s.txt" % (draft.name, draft.rev), 5000)
+        self.assertNotEqual(index_data_fingerprint(), fingerprint)
+
+        # deleting an author or relation doesn't change any maximum
+        rfc = RfcFactory()
+        relation = draft.relateddocument_set.create(relationship_id="became_rfc", target=rfc)
+        fingerprint = index_data_fingerprint()
+        with self.captureOnCommitCallbacks(execute=True):
+            relation.delete()
+        self.assertNotEqual(index_data_fingerprint(), fingerprint)
+        fingerprint = index_data_fingerprint()
+        with self.captureOnCommitCallbacks(execute=True):
+            draft.documentauthor_set.first().delete()
+        self.assertNotEqual(index_data_fingerprint(), fingerprint)
+
 
 class TaskTests(TestCase):
-    @mock.patch("ietf.idindex.tasks.all_id_txt")
-    @mock.patch("ietf.idindex.tasks.all_id2_txt")
-    @mock.patch("ietf.idindex.tasks.id_index_txt")
+    @mock.patch("ietf.idindex.tasks.cache")
+    @mock.patch("ietf.idindex.tasks.index_data_fingerprint")
+    @mock.patch("ietf.idindex.tasks.IndexSnapshot")
+    @mock.patch("ietf.idindex.tasks.iter_all_id_txt")
+    @mock.patch("ietf.idindex.tasks.iter_all_id2_txt")
+    @mock.patch("ietf.idindex.tasks.iter_id_index_txt")
     @mock.patch.object(TempFileManager, "__enter__")
     def test_idindex_update_task(
         self,
@@ -167,7 +231,15 @@ class TaskTests(TestCase):
         id_index_mock,
         all_id2_mock,
         all_id_mock,
+        snapshot_mock,
+        fingerprint_mock,
+        cache_mock,
     ):
+        all_id_mock.return_value = ["all_id"]
+        all_id2_mock.return_value = ["all_id2"]
+        id_index_mock.return_value = ["id_index"]
+        fingerprint_mock.return_value = "fingerprint"
+        cache_mock.get.return_value = None
         # Replace TempFileManager's __enter__() method with one that returns a mock.
         # Pass a spec to the mock so we validate that only actual methods are called.
         mgr_mock = mock.Mock(spec=TempFileManager)
@@ -175,16 +247,44 @@ class TaskTests(TestCase):
         
         idindex_update_task()
 
+        # all indexes are generated from a single snapshot
+        snapshot = snapshot_mock.return_value
+        self.assertEqual(snapshot_mock.call_count, 1)
         self.assertEqual(all_id_mock.call_count, 1)
+        self.assertEqual(all_id_mock.call_args, ((snapshot, ), dict()))
         self.assertEqual(all_id2_mock.call_count, 1)
+        self.assertEqual(all_id2_mock.call_args, ((snapshot, ), dict()))
         self.assertEqual(id_index_mock.call_count, 2)
-        self.assertEqual(id_index_mock.call_args_list[0], (tuple(), dict()))
+        self.assertEqual(id_index_mock.call_args_list[0], (tuple(), {"snapshot": snapshot}))
         self.assertEqual(
             id_index_mock.call_args_list[1], 
-            (tuple(), {"with_abstracts": True}),
+            (tuple(), {"with_abstracts": True, "snapshot": snapshot}),
         )
-        self.assertEqual(mgr_mock.make_temp_file.call_count, 11)
+        # one temp file per index, linked to each destination
+        self.assertEqual(mgr_mock.make_temp_file.call_count, 4)
+        self.assertEqual(mgr_mock.make_temp_copy.call_count, 7)
         self.assertEqual(mgr_mock.move_into_place.call_count, 11)
+        self.assertEqual(cache_mock.set.call_args[0][:2], (INDEX_DATA_FINGERPRINT_CACHE_KEY, "fingerprint"))
+
+        # nothing is done if the data hasn't changed since the last run
+        cache_mock.get.return_value = "fingerprint"
+        snapshot_mock.reset_mock()
+        mgr_mock.reset_mock()
+        idindex_update_task()
+        self.assertFalse(snapshot_mock.called)
+        self.assertFalse(mgr_mock.make_temp_file.called)
+
+        # ... unless forced
+        idindex_update_task(force=True)
+        self.assertEqual(mgr_mock.move_into_place.call_count, 11)
+
+    def test_index_digest(self):
+        with TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "1id-index.txt"
+            self.assertIsNone(index_file_digest(path))
+            path.write_text("Index Generated 2024-03-01 10:00:00 UTC.\ndraft-foo-00\n")
+            self.assertEqual(index_file_digest(path), index_digest(["Index Generated 2024-03-01 11:00:00 UTC.\n", "draft-foo-00\n"]))
+            self.assertNotEqual(index_file_digest(path), index_digest(["Index Generated 2024-03-01 11:00:00 UTC.\n", "draft-foo-01\n"]))
 
     def test_temp_file_manager(self):
         with TemporaryDirectory() as temp_dir:
@@ -192,13 +292,20 @@ class TaskTests(TestCase):
             with TempFileManager(temp_path) as tfm:
                 path1 = tfm.make_temp_file("yay")
                 path2 = tfm.make_temp_file("boo")  # do not keep this one
+                path3 = tfm.make_temp_file(["y", "a", "y"])
+                path4 = tfm.make_temp_copy(path3)
                 self.assertTrue(path1.exists())
                 self.assertTrue(path2.exists())
                 dest = temp_path / "yay.txt"
                 tfm.move_into_place(path1, dest)
+                dest3 = temp_path / "yay3.txt"
+                tfm.move_into_place(path3, dest3)
+                dest4 = temp_path / "yay4.txt"
+                tfm.move_into_place(path4, dest4)
             # make sure things were cleaned up...
             self.assertFalse(path1.exists())  # moved to dest
             self.assertFalse(path2.exists())  # left behind
             # check destination contents and permissions
-            self.assertEqual(dest.read_text(), "yay")
-            self.assertEqual(dest.stat().st_mode & 0o777, 0o644)
+            for path in (dest, dest3, dest4):
+                self.assertEqual(path.read_text(), "yay")
+                self.assertEqual(path.stat().st_mode & 0o777, 0o644)
@@ -89,11 +89,16 @@ class IprDisclosureBase(models.Model):
     @property
     def updates(self):
         """Shortcut for disclosures this disclosure updates"""
+        if 'relatedipr_source_set' in getattr(self, '_prefetched_objects_cache', {}):
+            # prefetched for disclosure lists, see ietf.ipr.utils.prefetch_ipr_relations()
+            return [r for r in self.relatedipr_source_set.all() if r.relationship_id == 'updates']
         return self.relatedipr_source_set.filter(relationship__slug='updates')
     
     @property
     def updated_by(self):
         """Shortcut for disclosures this disclosure is updated by"""
+        if 'relatedipr_target_set' in getattr(self, '_prefetched_objects_cache', {}):
+            return [r for r in self.relatedipr_target_set.all() if r.relationship_id == 'updates']
         return self.relatedipr_target_set.filter(relationship__slug='updates')
 
     @property
@@ -3,6 +3,7 @@
 
 
 import datetime
+import mock
 
 
 from pyquery import PyQuery
@@ -22,7 +23,7 @@ from ietf.doc.factories import (
     RfcFactory,
     NewRevisionDocEventFactory
 )
-from ietf.group.factories import RoleFactory
+from ietf.group.factories import GroupFactory, RoleFactory
 from ietf.ipr.factories import (
     HolderIprDisclosureFactory,
     GenericIprDisclosureFactory,
@@ -34,7 +35,8 @@ from ietf.ipr.mail import (process_response_email, get_reply_to, get_update_subm
 from ietf.ipr.models import (IprDisclosureBase,GenericIprDisclosure,HolderIprDisclosure,
     ThirdPartyIprDisclosure)
 from ietf.ipr.templatetags.ipr_filters import no_revisions_message
-from ietf.ipr.utils import get_genitive, get_ipr_summary
+from ietf.ipr.utils import (get_genitive, get_ipr_summary, generate_draft_recursive_txt,
+    iprs_from_docs, related_iprs_by_document)
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.message.models import Message
 from ietf.utils.mail import outbox, empty_outbox, get_payload_text
@@ -210,6 +212,55 @@ class IprTests(TestCase):
         r = self.client.get(url + "?submit=iprtitle&iprtitle=%s" % quote(ipr.title))
         self.assertContains(r, ipr.title)
 
+    def test_search_query_count(self):
+        def make_docs(count):
+            group = GroupFactory()
+            word = f"word{group.pk}x"
+            for _ in range(count):
+                draft = WgDraftFactory(group=group, title=f"A {word} draft")
+                replaced = WgDraftFactory(title=f"A replaced {word} draft")
+                draft.relateddocument_set.create(relationship_id="replaces", target=replaced)
+                ipr = HolderIprDisclosureFactory(docs=[replaced])
+                HolderIprDisclosureFactory(docs=[draft], updates=[ipr])
+            return group, word
+
+        url = urlreverse("ietf.ipr.views.search")
+
+        def search_group(group_and_word):
+            r = self.client.get(url + "?submit=group&group=%s" % group_and_word[0].pk)
+            self.assertEqual(r.status_code, 200)
+
+        def search_doctitle(group_and_word):
+            r = self.client.get(url + "?submit=doctitle&doctitle=%s" % group_and_word[1])
+            self.assertEqual(r.status_code, 200)
+
+        small, large = make_docs(2), make_docs(10)
+        self.assertQueryCountIndependentOfSize(search_group, small, large)
+        self.assertQueryCountIndependentOfSize(search_doctitle, small, large)
+
+        r = self.client.get(url + "?submit=group&group=%s" % large[0].pk)
+        self.assertContains(r, "Total number of %s WG IPR disclosures found: <b>20</b>" % large[0].acronym)
+
+    def test_related_iprs_by_document(self):
+        draft = WgDraftFactory()
+        replaced = WgDraftFactory()
+        obsoleted = WgDraftFactory()
+        draft.relateddocument_set.create(relationship_id="replaces", target=replaced)
+        replaced.relateddocument_set.create(relationship_id="obs", target=obsoleted)
+        other = WgDraftFactory()
+        iprs = [HolderIprDisclosureFactory(docs=[d]) for d in (draft, replaced, obsoleted)]
+        HolderIprDisclosureFactory(docs=[other], state_id="pending")
+
+        with self.assertNumQueries(4):
+            related = related_iprs_by_document([draft, replaced, other])
+        self.assertEqual([rel.disclosure_id for rel in related[draft.pk]], [i.pk for i in iprs])
+        self.assertEqual([rel.disclosure_id for rel in related[replaced.pk]], [i.pk for i in iprs[1:]])
+        self.assertEqual(related[other.pk], [])
+        self.assertEqual([d.related_ipr() for d in (draft, replaced, other)],
+                         [[i.pk for i in iprs], [i.pk for i in iprs[1:]], []])
+        with self.assertNumQueries(1):
+            self.assertCountEqual([i.pk for i in iprs_from_docs([draft, replaced, other])], [i.pk for i in iprs[:2]])
+
     def test_search_null_characters(self):
         """IPR search gracefully rejects null characters in parameters"""
         # Not a combinatorially exhaustive set, but tries to exercise all the parameters
@@ -902,3 +953,25 @@ Subject: test
             no_revisions_message(iprdocrel),
             "No revisions for this Internet-Draft were specified in this disclosure. However, there is only one revision of this Internet-Draft."
         )
+
+    def test_generate_draft_recursive_txt(self):
+        draft1, draft2 = WgDraftFactory.create_batch(2)
+        draft2.relateddocument_set.create(relationship_id="replaces", target=draft1)
+        rfc1, rfc2 = WgRfcFactory.create_batch(2)
+        rfc2.relateddocument_set.create(relationship_id="obs", target=rfc1)
+        ipr1 = HolderIprDisclosureFactory(docs=[draft2])
+        ipr2 = HolderIprDisclosureFactory(docs=[rfc2, draft1])
+        HolderIprDisclosureFactory(docs=[draft1], state_id="pending")
+
+        with mock.patch("ietf.ipr.utils.open", mock.mock_open(), create=True) as mock_open:
+            with self.assertNumQueries(3):
+                generate_draft_recursive_txt()
+        data = mock_open().write.call_args[0][0]
+        lines = data.split("\n")
+        self.assertEqual(lines[0], "# Machine-readable list of IPR disclosures by Internet-Draft name")
+        self.assertCountEqual(lines[1:], [
+            f"{draft1.name}\t{min(ipr1.pk, ipr2.pk)}\t{max(ipr1.pk, ipr2.pk)}",
+            f"{draft2.name}\t{ipr1.pk}",
+            f"{rfc1.name.upper()}\t{ipr2.pk}",
+            f"{rfc2.name.upper()}\t{ipr2.pk}",
+        ])
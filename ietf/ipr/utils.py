@@ -1,6 +1,13 @@
 # Copyright The IETF Trust 2014-2020, All Rights Reserved
 # -*- coding: utf-8 -*-
 
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+
+from ietf.doc.models import Document, RelatedDocument, transitive_relations
+from ietf.doc.relationship_graph import RelationshipGraph
 from ietf.ipr.models import IprDocRel
 
 import debug                            # pyflakes:ignore
@@ -32,14 +39,67 @@ def get_ipr_summary(disclosure):
     return summary if len(summary) <= 128 else summary[:125]+'...'
 
 
-def iprs_from_docs(docs,**kwargs):
+def iprs_from_docs(docs, states=settings.PUBLISH_IPR_STATES):
     """Returns a list of IPRs related to docs"""
-    iprdocrels = []
-    for document in docs:
-        if document.ipr(**kwargs):
-            iprdocrels += document.ipr(**kwargs)
-    return list(set([i.disclosure for i in iprdocrels]))
-    
+    return list(set(
+        rel.disclosure for rel in IprDocRel.objects.filter(
+            document__in=list(docs), disclosure__state__in=states).select_related('disclosure')
+    ))
+
+def iprs_by_document(docs, states=settings.PUBLISH_IPR_STATES):
+    """Return a dict from the pk of each of docs to the list of its IprDocRels, with their
+    disclosures, for the disclosures in the given states. Uses one query for all documents."""
+    doc_ids = [d if isinstance(d, int) else d.pk for d in docs]
+    result = dict((pk, []) for pk in doc_ids)
+    for rel in IprDocRel.objects.filter(
+            document_id__in=doc_ids, disclosure__state__in=states).select_related('disclosure').order_by('pk'):
+        result[rel.document_id].append(rel)
+    return result
+
+def related_doc_ids_by_document(doc_ids, relationship=('obs', 'replaces')):
+    """Return a dict from each of doc_ids to the set of it and the ids of the documents it
+    directly or indirectly relates to, by default those it obsoletes or replaces
+
+    The relations are fetched a level at a time for all of the documents, so
+    the number of queries is the length of the longest chain of relations.
+    """
+    reached = dict((pk, set([pk])) for pk in doc_ids)
+    origins = defaultdict(set)
+    for pk in doc_ids:
+        origins[pk].add(pk)
+    front = set(doc_ids)
+    while front:
+        next_front = set()
+        for source_id, target_id in RelatedDocument.objects.filter(
+                source_id__in=front, relationship_id__in=relationship).values_list('source_id', 'target_id'):
+            for origin in list(origins[source_id]):
+                if target_id not in reached[origin]:
+                    reached[origin].add(target_id)
+                    origins[target_id].add(origin)
+                    next_front.add(target_id)
+        front = next_front
+    return reached
+
+def related_iprs_by_document(docs, states=settings.PUBLISH_IPR_STATES):
+    """Return a dict from the pk of each of docs to the list of IprDocRels, with their
+    disclosures, against it or a document it directly or indirectly obsoletes or replaces"""
+    reached = related_doc_ids_by_document([d.pk for d in docs])
+    rels = iprs_by_document(set().union(*reached.values()), states=states)
+    return dict((pk, [rel for other in sorted(doc_ids) for rel in rels[other]]) for pk, doc_ids in reached.items())
+
+def prefetch_ipr_relations(disclosures):
+    """Prefetch the documents of each of disclosures, and the disclosures they update
+    or are updated by, for listing them"""
+    prefetch_related_objects(list(disclosures), 'iprdocrel_set__document',
+                             'relatedipr_source_set__target', 'relatedipr_target_set__source')
+
+def fill_in_ipr(docs):
+    """Fill in the cache used by Document.ipr() for docs, with a single query"""
+    rels = iprs_by_document(docs)
+    for d in docs:
+        d._cached_ipr = rels[d.pk]
+
+
 def related_docs(doc, relationship=('replaces', 'obs'), reverse_relationship=("became_rfc",)):
     """Returns list of related documents"""
 
@@ -60,24 +120,33 @@ def related_docs(doc, relationship=('replaces', 'obs'), reverse_relationship=("b
 
     return list(set(results))
 
+def all_related_docs(docs, relationship=('replaces', 'obs'), reverse_relationship=("became_rfc",)):
+    """Returns the documents related_docs() returns for any of docs, without the
+    related and relation annotations, in a few queries for all of them"""
+    results = set(docs)
+    results.update(rel.target for rel in transitive_relations(docs, that_doc=relationship))
+    results.update(rel.source for rel in transitive_relations(docs, that=reverse_relationship))
+    return list(results)
+
 
 def generate_draft_recursive_txt():
+    # all the obsoletes and replaces relations are loaded at once, so this takes
+    # the same few queries however many disclosures there are
+    graph = RelationshipGraph(('obs', 'replaces'))
     docipr = {}
 
-    for o in IprDocRel.objects.filter(disclosure__state='posted').select_related('document'):
-        doc = o.document
-        name = doc.name
-        related_set = set(doc) | set(doc.all_related_that_doc(('obs', 'replaces')))
-        for related in related_set:
-            name = related.name
-            if name.startswith("rfc"):
-                name = name.upper()
-            if not name in docipr:
-                docipr[name] = []
-            docipr[name].append(o.disclosure_id)
+    for document_id, disclosure_id in IprDocRel.objects.filter(disclosure__state='posted').values_list('document_id', 'disclosure_id'):
+        for related in graph.closure_that_doc(document_id) | {document_id}:
+            if not related in docipr:
+                docipr[related] = []
+            docipr[related].append(disclosure_id)
 
+    names = dict(Document.objects.filter(pk__in=list(docipr)).values_list('pk', 'name'))
     lines = [ "# Machine-readable list of IPR disclosures by Internet-Draft name" ]
-    for name, iprs in docipr.items():
+    for doc_id, iprs in docipr.items():
+        name = names[doc_id]
+        if name.startswith("rfc"):
+            name = name.upper()
         lines.append(name + "\t" + "\t".join(str(ipr_id) for ipr_id in sorted(iprs)))
 
     data = '\n'.join(lines)
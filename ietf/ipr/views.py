@@ -7,7 +7,7 @@ import itertools
 
 from django.conf import settings
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Q, prefetch_related_objects
 from django.forms.models import inlineformset_factory, model_to_dict
 from django.forms.formsets import formset_factory
 from django.http import HttpResponse, Http404, HttpResponseRedirect, HttpResponseBadRequest
@@ -32,7 +32,7 @@ from ietf.ipr.models import (IprDisclosureStateName, IprDisclosureBase,
     NonDocSpecificIprDisclosure, IprDocRel,
     RelatedIpr,IprEvent)
 from ietf.ipr.utils import (get_genitive, get_ipr_summary,
-    iprs_from_docs, related_docs)
+    iprs_from_docs, related_docs, all_related_docs, fill_in_ipr, prefetch_ipr_relations)
 from ietf.mailtrigger.utils import gather_address_lists
 from ietf.message.models import Message
 from ietf.message.utils import infer_message
@@ -690,6 +690,7 @@ def search(request):
                     first = start[0]
                     doc = first
                     docs = related_docs(first)
+                    prefetch_related_objects(docs, 'iprdocrel_set__disclosure__relatedipr_source_set')
                     iprs = iprs_from_docs(docs,states=states)
                     template = "ipr/search_doc_result.html"
                     updated_docs = related_docs(first, ('updates',))
@@ -721,13 +722,13 @@ def search(request):
             # Document list with IPRs
             elif search_type == "group":
                 docs = list(Document.objects.filter(group=q))
-                related = []
                 for doc in docs:
                     doc.product_of_this_wg = True
-                    related += related_docs(doc)
-                iprs = iprs_from_docs(list(set(docs+related)),states=states)
+                iprs = iprs_from_docs(all_related_docs(docs),states=states)
+                fill_in_ipr(docs)
                 docs = [ doc for doc in docs if doc.ipr() ]
                 docs = sorted(docs, key=lambda x: max([ipr.disclosure.time for ipr in x.ipr()]), reverse=True)
+                prefetch_ipr_relations([rel.disclosure for doc in docs for rel in doc.ipr()])
                 template = "ipr/search_wg_result.html"
                 q = Group.objects.get(id=q).acronym     # make acronym for use in template
 
@@ -735,12 +736,11 @@ def search(request):
             # Document list with IPRs
             elif search_type == "doctitle":
                 docs = list(Document.objects.filter(title__icontains=q))
-                related = []
-                for doc in docs:
-                    related += related_docs(doc)
-                iprs = iprs_from_docs(list(set(docs+related)),states=states)
+                iprs = iprs_from_docs(all_related_docs(docs),states=states)
+                fill_in_ipr(docs)
                 docs = [ doc for doc in docs if doc.ipr() ]
                 docs = sorted(docs, key=lambda x: max([ipr.disclosure.time for ipr in x.ipr()]), reverse=True)
+                prefetch_ipr_relations([rel.disclosure for doc in docs for rel in doc.ipr()])
                 template = "ipr/search_doctitle_result.html"
 
             # Search by title of IPR disclosure
@@ -763,6 +763,7 @@ def search(request):
                 iprs = sorted(iprs, key=lambda x: x.state.order)
             else:
                 iprs = sorted(iprs, key=lambda x: (x.time, x.id), reverse=True)
+            prefetch_ipr_relations(list(iprs) + list(related_iprs))
 
             return render(request, template, {
                 "q": q,
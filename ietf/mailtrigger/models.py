@@ -2,14 +2,22 @@
 # -*- coding: utf-8 -*-
 
 
-from django.db import models
+import threading
+import uuid
+
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import signals
 from django.template import Template, Context
 
 from email.utils import parseaddr
 
 from ietf.doc.utils_bofreq import bofreq_editors, bofreq_responsible
 from ietf.utils.mail import formataddr, get_email_addresses_from_text
-from ietf.group.models import Group, Role
+from ietf.group.models import Group, GroupFeatures, Role
 from ietf.person.models import Email, Alias
 from ietf.review.models import ReviewTeamSettings
 
@@ -45,6 +53,51 @@ class MailTrigger(models.Model):
     def __str__(self):
         return self.slug
 
+class _GatherLookups(threading.local):
+    # lookups shared by the recipients gathered inside gathering()
+    memo = None
+
+_gather_lookups = _GatherLookups()
+
+@contextmanager
+def gathering():
+    """Share the per-document lookups of the gather_* methods inside this block
+
+    The recipients of a trigger often look at the same documents related to
+    the one the mail is about; inside this block those are fetched once.
+    """
+    if _gather_lookups.memo is not None:
+        yield
+        return
+    _gather_lookups.memo = {}
+    try:
+        yield
+    finally:
+        _gather_lookups.memo = None
+
+AFFECTED_DOC_RELATIONSHIPS = ('conflrev','tohist','tois','tops')
+
+def affected_docs(doc, relationships=AFFECTED_DOC_RELATIONSHIPS):
+    """The documents which doc, a conflict review or status change, is about"""
+    memo = _gather_lookups.memo
+    relations = memo.get(doc) if memo is not None else None
+    if relations is None:
+        relations = list(doc.relations_that_doc(AFFECTED_DOC_RELATIONSHIPS).select_related('target__group__type__features'))
+        for rel in relations:
+            group = rel.target.group
+            if group:
+                try:
+                    group.features_cache = group.type.features
+                except GroupFeatures.DoesNotExist:
+                    pass
+        if memo is not None:
+            memo[doc] = relations
+    docs = []
+    for rel in relations:
+        if rel.relationship_id in relationships and rel.target not in docs:
+            docs.append(rel.target)
+    return docs
+
 class Recipient(models.Model):
     slug = models.CharField(max_length=32, primary_key=True)
     desc = models.TextField(blank=True)
@@ -56,12 +109,19 @@ class Recipient(models.Model):
     def __str__(self):
         return self.slug
 
+    def compiled_template(self):
+        if not hasattr(self, '_compiled_template'):
+            self._compiled_template = Template('{%% autoescape off %%}%s{%% endautoescape %%}'%self.template) if self.template else None
+        return self._compiled_template
+
     def gather(self, **kwargs):
         retval = []
-        if hasattr(self,'gather_%s'%self.slug):
-            retval.extend(eval('self.gather_%s(**kwargs)'%self.slug))
-        if self.template:
-            rendering = Template('{%% autoescape off %%}%s{%% endautoescape %%}'%self.template).render(Context(kwargs))
+        gather_method = getattr(self, 'gather_%s'%self.slug, None)
+        if gather_method:
+            retval.extend(gather_method(**kwargs))
+        template = self.compiled_template()
+        if template:
+            rendering = template.render(Context(kwargs))
             if rendering:
                 retval.extend( get_email_addresses_from_text(rendering) )
 
@@ -95,35 +155,35 @@ class Recipient(models.Model):
     def gather_doc_affecteddoc_authors(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev','tohist','tois','tops')):
-                addrs.extend(Recipient.objects.get(slug='doc_authors').gather(**{'doc':reldoc}))
+            for reldoc in affected_docs(kwargs['doc']):
+                addrs.extend(get_recipient('doc_authors').gather(**{'doc':reldoc}))
         return addrs
 
     def gather_doc_affecteddoc_group_chairs(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev','tohist','tois','tops')):
-                addrs.extend(Recipient.objects.get(slug='doc_group_chairs').gather(**{'doc':reldoc}))
+            for reldoc in affected_docs(kwargs['doc']):
+                addrs.extend(get_recipient('doc_group_chairs').gather(**{'doc':reldoc}))
         return addrs
 
     def gather_doc_affecteddoc_notify(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev','tohist','tois','tops')):
-                addrs.extend(Recipient.objects.get(slug='doc_notify').gather(**{'doc':reldoc}))
+            for reldoc in affected_docs(kwargs['doc']):
+                addrs.extend(get_recipient('doc_notify').gather(**{'doc':reldoc}))
         return addrs
 
     def gather_conflict_review_stream_manager(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev',)):
-                addrs.extend(Recipient.objects.get(slug='doc_stream_manager').gather(**{'doc':reldoc}))
+            for reldoc in affected_docs(kwargs['doc'], ('conflrev',)):
+                addrs.extend(get_recipient('doc_stream_manager').gather(**{'doc':reldoc}))
         return addrs
 
     def gather_conflict_review_steering_group(self,**kwargs):
         addrs = []
         if 'doc' in kwargs:
-            for reldoc in kwargs['doc'].related_that_doc(('conflrev',)):
+            for reldoc in affected_docs(kwargs['doc'], ('conflrev',)):
                 if reldoc.stream_id=='irtf':
                     addrs.append('"Internet Research Steering Group" <irsg@irtf.org>')
         return addrs
@@ -142,18 +202,20 @@ class Recipient(models.Model):
             irtf = '<irtf-chair@irtf.org>',
             ietf = '<iesg@ietf.org>',
             iab  = '<iab-chair@iab.org>',
-            editorial = Role.objects.filter(group__acronym="rsab",name_id="chair").values_list("email__address", flat=True),
         )
         if 'streams' in kwargs:
             for stream in kwargs['streams']:
                 if stream in manager_map:
                     addrs.append(manager_map[stream])
+                elif stream == 'editorial':
+                    # only looked up when needed
+                    addrs.extend(Role.objects.filter(group__acronym="rsab",name_id="chair").values_list("email__address", flat=True))
         return addrs
 
     def gather_doc_stream_manager(self, **kwargs):
         addrs = []
         if 'doc' in kwargs:
-            addrs.extend(Recipient.objects.get(slug='stream_managers').gather(**{'streams':[kwargs['doc'].stream_id]}))
+            addrs.extend(get_recipient('stream_managers').gather(**{'streams':[kwargs['doc'].stream_id]}))
         return addrs
 
     def gather_doc_non_ietf_stream_manager(self, **kwargs):
@@ -161,7 +223,7 @@ class Recipient(models.Model):
         if 'doc' in kwargs:
             doc = kwargs['doc']
             if doc.stream_id and doc.stream_id != 'ietf':
-                addrs.extend(Recipient.objects.get(slug='stream_managers').gather(**{'streams':[doc.stream_id,]}))
+                addrs.extend(get_recipient('stream_managers').gather(**{'streams':[doc.stream_id,]}))
         return addrs
 
     def gather_group_responsible_directors(self, **kwargs):
@@ -171,9 +233,9 @@ class Recipient(models.Model):
             if not group.acronym=='none':
                 addrs.extend(group.role_set.filter(name='ad').values_list('email__address',flat=True))
             if group.type_id=='rg':
-                addrs.extend(Recipient.objects.get(slug='stream_managers').gather(**{'streams':['irtf']}))
+                addrs.extend(get_recipient('stream_managers').gather(**{'streams':['irtf']}))
             elif group.type_id=='program':
-                addrs.extend(Recipient.objects.get(slug='iab').gather(**{}))
+                addrs.extend(get_recipient('iab').gather(**{}))
         return addrs
 
     def gather_group_secretaries(self, **kwargs):
@@ -207,7 +269,7 @@ class Recipient(models.Model):
         if 'doc' in kwargs:
             group = kwargs['doc'].group
             if group and not group.acronym=='none':
-                addrs.extend(Recipient.objects.get(slug='group_responsible_directors').gather(**{'group':group}))
+                addrs.extend(get_recipient('group_responsible_directors').gather(**{'group':group}))
         return addrs
 
     def gather_submission_authors(self, **kwargs):
@@ -244,7 +306,7 @@ class Recipient(models.Model):
         if 'submission' in kwargs: 
             submission = kwargs['submission']
             if submission.group: 
-                addrs.extend(Recipient.objects.get(slug='group_chairs').gather(**{'group':submission.group}))
+                addrs.extend(get_recipient('group_chairs').gather(**{'group':submission.group}))
         return addrs
 
     def gather_sub_group_parent_directors(self, **kwargs):
@@ -253,8 +315,7 @@ class Recipient(models.Model):
             submission = kwargs['submission']
             if submission.group and submission.group.parent:
                 addrs.extend(
-                    Recipient.objects.get(
-                        slug='group_responsible_directors').gather(group=submission.group.parent)
+                    get_recipient('group_responsible_directors').gather(group=submission.group.parent)
                 )
         return addrs
 
@@ -263,8 +324,7 @@ class Recipient(models.Model):
         doc = kwargs.get('doc')
         if doc and doc.group and doc.group.parent:
             addrs.extend(
-                Recipient.objects.get(
-                    slug='group_responsible_directors').gather(group=doc.group.parent)
+                get_recipient('group_responsible_directors').gather(group=doc.group.parent)
             )
         return addrs
 
@@ -288,13 +348,13 @@ class Recipient(models.Model):
 
                 if doc.group and old_author_email_set != new_author_email_set:
                     if doc.group.features.acts_like_wg:
-                        addrs.extend(Recipient.objects.get(slug='group_chairs').gather(**{'group':doc.group}))
+                        addrs.extend(get_recipient('group_chairs').gather(**{'group':doc.group}))
                     elif doc.group.type_id in ['area']:
-                        addrs.extend(Recipient.objects.get(slug='group_responsible_directors').gather(**{'group':doc.group}))
+                        addrs.extend(get_recipient('group_responsible_directors').gather(**{'group':doc.group}))
                     else:
                         pass
                     if doc.stream_id and doc.stream_id not in ['ietf']:
-                        addrs.extend(Recipient.objects.get(slug='stream_managers').gather(**{'streams':[doc.stream_id]}))
+                        addrs.extend(get_recipient('stream_managers').gather(**{'streams':[doc.stream_id]}))
             else:
                 # This is a bit roundabout, but we do it to get consistent and unicode-compliant
                 # email names for known persons, without relying on the name parsed from the
@@ -311,7 +371,7 @@ class Recipient(models.Model):
         if 'submission' in kwargs:
             submission = kwargs['submission']
             if submission.group:  
-                addrs.extend(Recipient.objects.get(slug='group_mail_list').gather(**{'group':submission.group}))
+                addrs.extend(get_recipient('group_mail_list').gather(**{'group':submission.group}))
         return addrs
 
     def gather_rfc_editor_if_doc_in_queue(self, **kwargs):
@@ -319,7 +379,7 @@ class Recipient(models.Model):
         if 'doc' in kwargs:
             doc = kwargs['doc']
             if doc.get_state_slug("draft-rfceditor") is not None:
-                addrs.extend(Recipient.objects.get(slug='rfc_editor').gather(**{}))
+                addrs.extend(get_recipient('rfc_editor').gather(**{}))
         return addrs
 
     def gather_doc_discussing_ads(self, **kwargs):
@@ -362,11 +422,11 @@ class Recipient(models.Model):
             doc=kwargs['doc']
             if doc.group and doc.group.acronym == 'none':
                 if doc.ad and doc.get_state_slug('draft')=='active':
-                    addrs.extend(Recipient.objects.get(slug='doc_ad').gather(**kwargs))
+                    addrs.extend(get_recipient('doc_ad').gather(**kwargs))
                 else:
                     pass
             else:
-                addrs.extend(Recipient.objects.get(slug='doc_group_mail_list').gather(**kwargs)) 
+                addrs.extend(get_recipient('doc_group_mail_list').gather(**kwargs)) 
         return addrs
 
     def gather_liaison_manager(self, **kwargs):
@@ -415,8 +475,8 @@ class Recipient(models.Model):
                 if responsible:
                     addrs.extend([leader.email_address() for leader in responsible])
                 else:
-                    addrs.extend(Recipient.objects.get(slug='iab').gather(**{}))
-                    addrs.extend(Recipient.objects.get(slug='iesg').gather(**{}))
+                    addrs.extend(get_recipient('iab').gather(**{}))
+                    addrs.extend(get_recipient('iesg').gather(**{}))
         return addrs
 
     def gather_bofreq_previous_responsible(self, **kwargs):
@@ -427,7 +487,97 @@ class Recipient(models.Model):
         if previous_responsible:
             addrs = [p.email_address() for p in previous_responsible]
         else:
-            addrs.extend(Recipient.objects.get(slug='iab').gather(**{}))
-            addrs.extend(Recipient.objects.get(slug='iesg').gather(**{}))
-        return addrs
-
+            addrs.extend(get_recipient('iab').gather(**{}))
+            addrs.extend(get_recipient('iesg').gather(**{}))
+        return addrs
+
+
+MAILTRIGGER_WIRING_VERSION_CACHE_KEY = "mailtrigger:wiring_version"
+
+_mailtrigger_wiring = None
+
+class _MailTriggerWiringChanges(threading.local):
+    # True while this thread's transaction has changes that may still be
+    # rolled back
+    pending = False
+
+_mailtrigger_wiring_changes = _MailTriggerWiringChanges()
+
+class MailTriggerWiring:
+    """The recipients of all mail triggers, loaded with a fixed number of queries
+
+    The Recipient objects are shared by all triggers, so each recipient
+    template is compiled once, and the recipients used inside the gather_*
+    methods are looked up here rather than in the database.
+    """
+    def __init__(self, version):
+        self.version = version
+        self.recipients = dict((r.slug, r) for r in Recipient.objects.all())
+        self.triggers = set(MailTrigger.objects.values_list('slug', flat=True))
+        self.to = defaultdict(list)
+        for trigger_slug, recipient_slug in MailTrigger.to.through.objects.order_by('recipient_id').values_list('mailtrigger_id', 'recipient_id'):
+            self.to[trigger_slug].append(self.recipients[recipient_slug])
+        self.cc = defaultdict(list)
+        for trigger_slug, recipient_slug in MailTrigger.cc.through.objects.order_by('recipient_id').values_list('mailtrigger_id', 'recipient_id'):
+            self.cc[trigger_slug].append(self.recipients[recipient_slug])
+
+def invalidate_mailtrigger_wiring():
+    """Reload the mail trigger wiring after a change to the triggers or recipients
+
+    Other processes are told through a new version in the cache, once the
+    transaction making the change has committed. Until the transaction
+    ends, this thread reloads the wiring on each use rather than sharing one
+    built from changes that may still be rolled back.
+    """
+    global _mailtrigger_wiring
+    _mailtrigger_wiring = None
+    _mailtrigger_wiring_changes.pending = True
+    transaction.on_commit(_mailtrigger_wiring_committed)
+
+def _mailtrigger_wiring_committed():
+    global _mailtrigger_wiring
+    _mailtrigger_wiring = None
+    _mailtrigger_wiring_changes.pending = False
+    cache.set(MAILTRIGGER_WIRING_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+def mailtrigger_wiring():
+    """Return the MailTriggerWiring for the current mail triggers and recipients.
+
+    The wiring is kept between calls, and reloaded when the version stored
+    in the cache changes, which happens whenever a mail trigger or recipient
+    is saved or deleted, or the recipients of a trigger change (see the
+    signal hooks below), so all processes see the changes. Without a
+    version in the cache, as with the DummyCache used in development, the
+    wiring is kept until it is invalidated in this process.
+    """
+    global _mailtrigger_wiring
+    if _mailtrigger_wiring_changes.pending and not transaction.get_connection().in_atomic_block:
+        # the changes were committed or rolled back
+        _mailtrigger_wiring_changes.pending = False
+    pending = _mailtrigger_wiring_changes.pending
+    version = cache.get(MAILTRIGGER_WIRING_VERSION_CACHE_KEY)
+    if not pending and _mailtrigger_wiring is not None and version in (None, _mailtrigger_wiring.version):
+        return _mailtrigger_wiring
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(MAILTRIGGER_WIRING_VERSION_CACHE_KEY, version, None)
+    wiring = MailTriggerWiring(version)
+    if not pending:
+        _mailtrigger_wiring = wiring
+    return wiring
+
+def get_recipient(slug):
+    try:
+        return mailtrigger_wiring().recipients[slug]
+    except KeyError:
+        raise Recipient.DoesNotExist("Recipient matching query does not exist: %s" % slug)
+
+
+def mailtrigger_wiring_changed(sender, **kwargs):
+    invalidate_mailtrigger_wiring()
+
+for model in (MailTrigger, Recipient):
+    signals.post_save.connect(mailtrigger_wiring_changed, sender=model)
+    signals.post_delete.connect(mailtrigger_wiring_changed, sender=model)
+for through in (MailTrigger.to.through, MailTrigger.cc.through):
+    signals.m2m_changed.connect(mailtrigger_wiring_changed, sender=through)
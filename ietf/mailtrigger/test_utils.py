@@ -2,9 +2,16 @@
 # -*- coding: utf-8 -*-
 
 
-from ietf.doc.factories import WgDraftFactory
-from ietf.mailtrigger.models import MailTrigger
-from .utils import gather_address_lists
+import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ietf.doc.factories import StatusChangeFactory, WgDraftFactory, WgRfcFactory
+from ietf.mailtrigger.models import MailTrigger, Recipient, invalidate_mailtrigger_wiring, MAILTRIGGER_WIRING_VERSION_CACHE_KEY
+from .utils import gather_address_lists, gather_relevant_expansions
 from ietf.utils.test_utils import TestCase
 
 
@@ -42,3 +49,124 @@ class GatherAddressListsTests(TestCase):
                                         'mars-chairs@ietf.org', 'iesg-secretary@ietf.org'])
         new_trigger = MailTrigger.objects.get(slug=new_slug)
         self.assertEqual(new_trigger.desc, new_desc)
+
+    def test_affected_docs_fetched_once(self):
+        def last_call_issued(doc):
+            with CaptureQueriesContext(connection) as context:
+                to, cc = gather_address_lists('last_call_issued', doc=doc)
+            return cc, [q['sql'] for q in context.captured_queries]
+
+        one = StatusChangeFactory(changes_status_of=[('tois', WgRfcFactory())])
+        rfcs = [WgRfcFactory() for i in range(3)]
+        three = StatusChangeFactory(changes_status_of=[('tois', rfcs[0]), ('tops', rfcs[1]), ('tohist', rfcs[2])])
+        gather_address_lists('last_call_issued', doc=self.doc)
+
+        _, queries_one = last_call_issued(one)
+        cc, queries_three = last_call_issued(three)
+        # the affected documents and their groups come with a single query
+        self.assertEqual(len(queries_three), len(queries_one))
+        self.assertEqual(len([q for q in queries_three if '"doc_relateddocument"' in q]), 1)
+        for rfc in rfcs:
+            self.assertIn(rfc.name + '@ietf.org', cc)
+            self.assertIn('%s-chairs@ietf.org' % rfc.group.acronym, cc)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class MailTriggerWiringTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_mailtrigger_wiring()
+        self.doc = WgDraftFactory(group__acronym='mars', rev='01')
+
+    def tearDown(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_mailtrigger_wiring()
+        super().tearDown()
+
+    def mailtrigger_queries(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        return result, [q['sql'] for q in context.captured_queries if '"mailtrigger_' in q['sql']]
+
+    def test_wiring_is_cached(self):
+        first, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertTrue(queries)
+        second, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertEqual(queries, [])
+        self.assertEqual(first, second)
+
+        # recipients used inside the gather methods come from the cache too
+        _, queries = self.mailtrigger_queries(gather_relevant_expansions, doc=self.doc)
+        self.assertEqual([q for q in queries if '"mailtrigger_recipient"' in q], [])
+
+    def test_wiring_changes_are_seen(self):
+        gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+        recipient = Recipient.objects.create(slug='test_recipient', template='test@example.com')
+        MailTrigger.objects.get(slug='doc_pulled_from_rfc_queue').to.add(recipient)
+        to, _ = gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertIn('test@example.com', to)
+
+        recipient.template = 'changed@example.com'
+        recipient.save()
+        to, _ = gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertIn('changed@example.com', to)
+        self.assertNotIn('test@example.com', to)
+
+        MailTrigger.objects.get(slug='doc_pulled_from_rfc_queue').to.remove(recipient)
+        to, _ = gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertNotIn('changed@example.com', to)
+
+        with self.assertRaises(MailTrigger.DoesNotExist):
+            gather_address_lists('this-does-not-exist______', doc=self.doc)
+
+    def test_rolled_back_change(self):
+        gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Recipient.objects.create(slug='test_recipient', template='test@example.com')
+                raise RuntimeError
+        # still inside the test's transaction, the wiring isn't kept
+        _, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertTrue(queries)
+        _, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertTrue(queries)
+        # once outside any transaction it is kept again, although the on_commit callback never ran
+        with mock.patch.object(transaction.get_connection(), 'in_atomic_block', False):
+            _, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+            self.assertTrue(queries)
+            _, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+            self.assertEqual(queries, [])
+
+    def test_version_changes_on_commit(self):
+        gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+        version = cache.get(MAILTRIGGER_WIRING_VERSION_CACHE_KEY)
+        self.assertIsNotNone(version)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipient.objects.create(slug='test_recipient', template='test@example.com')
+            # other processes must not reload the wiring before the change is committed
+            self.assertEqual(cache.get(MAILTRIGGER_WIRING_VERSION_CACHE_KEY), version)
+        self.assertNotEqual(cache.get(MAILTRIGGER_WIRING_VERSION_CACHE_KEY), version)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+    def test_wiring_is_cached_without_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_mailtrigger_wiring()
+        first, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertTrue(queries)
+        second, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertEqual(queries, [])
+        self.assertEqual(first, second)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipient = Recipient.objects.create(slug='test_recipient', template='test@example.com')
+            MailTrigger.objects.get(slug='doc_pulled_from_rfc_queue').to.add(recipient)
+            # a wiring built from uncommitted changes isn't kept
+            to, _ = gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+            self.assertIn('test@example.com', to)
+            _, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+            self.assertTrue(queries)
+        to, _ = gather_address_lists('doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertIn('test@example.com', to)
+        _, queries = self.mailtrigger_queries(gather_address_lists, 'doc_pulled_from_rfc_queue', doc=self.doc)
+        self.assertEqual(queries, [])
@@ -4,7 +4,7 @@ from collections import namedtuple
 
 import debug  # pyflakes:ignore
 
-from ietf.mailtrigger.models import MailTrigger, Recipient
+from ietf.mailtrigger.models import MailTrigger, gathering, get_recipient, invalidate_mailtrigger_wiring, mailtrigger_wiring
 from ietf.submit.models import Submission
 from ietf.utils.mail import excludeaddrs
 
@@ -29,20 +29,38 @@ def gather_address_lists(
     desc_if_not_exists=None,
     **kwargs
 ):
-    mailtrigger = get_mailtrigger(
-        slug, create_from_slug_if_not_exists, desc_if_not_exists
-    )
+    wiring = mailtrigger_wiring()
+    if slug not in wiring.triggers:
+        # create it, or raise MailTrigger.DoesNotExist
+        get_mailtrigger(slug, create_from_slug_if_not_exists, desc_if_not_exists)
+        invalidate_mailtrigger_wiring()
+        wiring = mailtrigger_wiring()
+    return _gather_address_lists(wiring, slug, skipped_recipients, kwargs)
+
+
+def _gather_address_lists(wiring, slug, skipped_recipients, kwargs, gathered=None):
+    # gathered, if given, keeps the addresses of each recipient, for callers
+    # that gather several triggers with the same arguments
+    if gathered is None:
+        gathered = {}
+
+    def gather(recipient):
+        if recipient.slug not in gathered:
+            gathered[recipient.slug] = recipient.gather(**kwargs)
+        return gathered[recipient.slug]
+
+    with gathering():
+        to = set()
+        for recipient in wiring.to[slug]:
+            to.update(gather(recipient))
+        cc = set()
+        for recipient in wiring.cc[slug]:
+            cc.update(gather(recipient))
 
-    to = set()
-    for recipient in mailtrigger.to.all():
-        to.update(recipient.gather(**kwargs))
     to.discard("")
     if skipped_recipients:
         to = excludeaddrs(to, skipped_recipients)
 
-    cc = set()
-    for recipient in mailtrigger.cc.all():
-        cc.update(recipient.gather(**kwargs))
     cc.discard("")
     if skipped_recipients:
         cc = excludeaddrs(cc, skipped_recipients)
@@ -142,16 +160,19 @@ def gather_relevant_expansions(**kwargs):
         relevant.update(starts_with("sub_"))
 
     rule_list = []
-    for mailtrigger in MailTrigger.objects.filter(slug__in=relevant):
-        addrs = gather_address_lists(mailtrigger.slug, **kwargs)
-        if addrs.to or addrs.cc:
-            rule_list.append((mailtrigger.slug, mailtrigger.desc, addrs.to, addrs.cc))
+    wiring = mailtrigger_wiring()
+    gathered = {}
+    with gathering():
+        for mailtrigger in MailTrigger.objects.filter(slug__in=relevant):
+            addrs = _gather_address_lists(wiring, mailtrigger.slug, None, kwargs, gathered)
+            if addrs.to or addrs.cc:
+                rule_list.append((mailtrigger.slug, mailtrigger.desc, addrs.to, addrs.cc))
     return sorted(rule_list)
 
 
 def get_base_submission_message_address():
-    return Recipient.objects.get(slug="submission_manualpost_handling").gather()[0]
+    return get_recipient("submission_manualpost_handling").gather()[0]
 
 
 def get_base_ipr_request_address():
-    return Recipient.objects.get(slug="ipr_requests").gather()[0]
+    return get_recipient("ipr_requests").gather()[0]
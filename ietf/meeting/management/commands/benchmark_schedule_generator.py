@@ -0,0 +1,251 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+# This command measures the performance of the automatic schedule generator
+# (see generate_schedule.py). It creates a synthetic meeting of a configurable
+# size, with rooms, timeslots, sessions, constraints, joint sessions and groups
+# that trigger the business constraints, using the meeting factories. It then
+# runs the optimiser for a number of fixed seeds and reports, as JSON, the wall
+# time, number of optimiser runs, cost after each run and memory use of each.
+# The cost of an infeasible schedule is infinite, which is reported as null.
+#
+# The synthetic meeting is created in a transaction that is rolled back at the
+# end, unless --keep is given.
+
+import datetime
+import json
+import math
+import random
+import resource
+import socket
+import sys
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+import debug                            # pyflakes:ignore
+
+from ietf.group.factories import GroupFactory, RoleFactory
+from ietf.meeting.factories import MeetingFactory, RoomFactory, TimeSlotFactory, SessionFactory
+from ietf.meeting.management.commands.generate_schedule import ScheduleHandler, OPTIMISER_MAX_CYCLES
+from ietf.meeting.models import Constraint
+from ietf.name.models import TimerangeName
+from ietf.person.factories import PersonFactory
+
+
+# Start and duration of the timeslots on each meeting day, one of each time_group
+TIMESLOT_TIMES = [
+    (datetime.time(9, 30), datetime.timedelta(hours=2)),
+    (datetime.time(13, 0), datetime.timedelta(minutes=90)),
+    (datetime.time(16, 0), datetime.timedelta(hours=1)),
+]
+ROOM_CAPACITIES = [50, 100, 100, 200, 300, 500]
+GROUP_CONFLICT_TYPES = ['chair_conflict', 'tech_overlap', 'key_participant']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the schedule generator on a synthetic meeting'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=100,
+                            help='number of sessions to schedule (default 100)')
+        parser.add_argument('--rooms', type=int, default=8,
+                            help='number of rooms (default 8)')
+        parser.add_argument('--days', type=int, default=5,
+                            help='number of meeting days, excluding sunday (default 5)')
+        parser.add_argument('--constraint-density', type=float, default=2.0,
+                            help='average number of constraints per group (default 2.0)')
+        parser.add_argument('--joint-fraction', type=float, default=0.05,
+                            help='fraction of sessions that are joint sessions (default 0.05)')
+        parser.add_argument('--bof-fraction', type=float, default=0.05,
+                            help='fraction of groups that are BOFs (default 0.05)')
+        parser.add_argument('--seed', dest='seeds', type=int, action='append', default=None,
+                            help='random seed for an optimiser run (use multiple times for more runs; default 1, 2 and 3)')
+        parser.add_argument('--meeting-seed', type=int, default=0,
+                            help='random seed for the creation of the synthetic meeting (default 0)')
+        parser.add_argument('-r', '--max-runs', type=int, dest='max_cycles', default=OPTIMISER_MAX_CYCLES,
+                            help='maximum optimiser runs')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='report peak memory allocated by Python for each run (slows down the optimiser)')
+        parser.add_argument('-o', '--output', default=None,
+                            help='file to write the JSON report to (default stdout)')
+        parser.add_argument('--keep', action='store_true',
+                            help='keep the synthetic meeting in the database')
+
+    def handle(self, *args, **options):
+        if socket.gethostname().split('.')[0] in ['core3', 'ietfa', 'ietfb', 'ietfc', ]:
+            raise EnvironmentError("Refusing to create a benchmark meeting on a production server")
+
+        if options['sessions'] < 2 * max(2, options['sessions'] // 40):
+            raise CommandError('Too few sessions for a meeting with area meetings and working groups')
+        if options['sessions'] > options['rooms'] * options['days'] * len(TIMESLOT_TIMES):
+            raise CommandError('More sessions ({}) than timeslots ({})'.format(
+                options['sessions'], options['rooms'] * options['days'] * len(TIMESLOT_TIMES)))
+        seeds = options['seeds'] or [1, 2, 3]
+
+        with transaction.atomic():
+            beg_time = time.time()
+            meeting = create_synthetic_meeting(
+                sessions=options['sessions'],
+                rooms=options['rooms'],
+                days=options['days'],
+                constraint_density=options['constraint_density'],
+                joint_fraction=options['joint_fraction'],
+                bof_fraction=options['bof_fraction'],
+                rng=random.Random(options['meeting_seed']),
+            )
+            create_time = time.time() - beg_time
+
+            beg_time = time.time()
+            handler = ScheduleHandler(self.stdout, meeting.number, max_cycles=options['max_cycles'], verbosity=0)
+            load_time = time.time() - beg_time
+
+            report = {
+                'parameters': {
+                    key: options[key] for key in [
+                        'sessions', 'rooms', 'days', 'constraint_density', 'joint_fraction', 'bof_fraction',
+                        'meeting_seed', 'max_cycles',
+                    ]
+                },
+                'meeting': {
+                    'number': meeting.number,
+                    'sessions': len(handler.schedule.sessions),
+                    'timeslots': len(handler.schedule.timeslots),
+                    'constraints': meeting.constraint_set.count(),
+                    'create_time': create_time,
+                    'load_time': load_time,
+                },
+                'runs': [
+                    benchmark_run(handler.schedule, seed, options['trace_memory'])
+                    for seed in seeds
+                ],
+            }
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=2, allow_nan=False)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+
+def create_synthetic_meeting(sessions, rooms, days, constraint_density, joint_fraction, bof_fraction, rng):
+    """Create a meeting with rooms, timeslots and sessions to schedule
+
+    Groups are spread over areas, each with an area meeting and two ADs, and
+    some groups are BOFs or proposed research groups. A fifth of the groups
+    request two sessions.
+    """
+    meeting = MeetingFactory(
+        type_id='ietf',
+        date=datetime.date(2030, 3, 17),  # a sunday, which the generator skips
+        days=days + 1,
+        time_zone='UTC',
+        populate_schedule=False,
+    )
+    for _ in range(rooms):
+        room = RoomFactory(meeting=meeting, capacity=rng.choice(ROOM_CAPACITIES))
+        for day in range(1, days + 1):
+            for start, duration in TIMESLOT_TIMES:
+                TimeSlotFactory(
+                    meeting=meeting,
+                    location=room,
+                    time=meeting.tz().localize(
+                        datetime.datetime.combine(meeting.date + datetime.timedelta(days=day), start)
+                    ),
+                    duration=duration,
+                )
+
+    area_count = max(2, sessions // 40)
+    areas = [GroupFactory(type_id='area') for _ in range(area_count)]
+    area_ads = {area: [PersonFactory(), PersonFactory()] for area in areas}
+    irtf = GroupFactory(acronym='irtf', type_id='irtf')
+    groups = [GroupFactory(type_id='ag', parent=area) for area in areas]
+    key_people = [PersonFactory() for _ in range(max(1, sessions // 10))]
+
+    group_count = min(sessions, max(len(groups), round(sessions / 1.2)))
+    while len(groups) < group_count:
+        if rng.random() < 0.05:
+            group = GroupFactory(type_id='rg', state_id='proposed', parent=irtf)
+        else:
+            area = rng.choice(areas)
+            group = GroupFactory(type_id='wg', parent=area, state_id='bof' if rng.random() < bof_fraction else 'active')
+            RoleFactory(group=group, name_id='ad', person=rng.choice(area_ads[area]))
+        groups.append(group)
+
+    group_sessions = {group: 1 for group in groups}
+    for group in rng.sample(groups, sessions - len(groups)):
+        group_sessions[group] += 1
+
+    for group, count in group_sessions.items():
+        for _ in range(count):
+            session = SessionFactory(
+                meeting=meeting,
+                group=group,
+                add_to_schedule=False,
+                status_id='schedw',
+                attendees=rng.choice([20, 40, 60, 80, 120, 150, 250]),
+                requested_duration=rng.choice([duration for _, duration in TIMESLOT_TIMES]),
+            )
+            if rng.random() < joint_fraction:
+                session.joint_with_groups.add(rng.choice([g for g in groups if g != group]))
+
+        for _ in range(round(rng.expovariate(1 / constraint_density)) if constraint_density > 0 else 0):
+            kind = rng.choice(GROUP_CONFLICT_TYPES * 4 + ['bethere', 'bethere', 'timerange', 'wg_adjacent'])
+            if kind in GROUP_CONFLICT_TYPES:
+                Constraint.objects.create(meeting=meeting, source=group, name_id=kind,
+                                          target=rng.choice([g for g in groups if g != group]))
+            elif kind == 'bethere':
+                Constraint.objects.create(meeting=meeting, source=group, name_id=kind, person=rng.choice(key_people))
+            elif kind == 'timerange' and not group.constraint_source_set.filter(name_id=kind).exists():
+                constraint = Constraint.objects.create(meeting=meeting, source=group, name_id=kind)
+                constraint.timeranges.set(rng.sample(list(TimerangeName.objects.all()), 2))
+            elif kind == 'wg_adjacent' and not group.constraint_source_set.filter(name_id=kind).exists():
+                Constraint.objects.create(meeting=meeting, source=group, name_id=kind,
+                                          target=rng.choice([g for g in groups if g != group]))
+        if count == 2 and rng.random() < 0.5:
+            Constraint.objects.create(meeting=meeting, source=group, name_id='time_relation',
+                                      time_relation=rng.choice(['subsequent-days', 'one-day-seperation']))
+    return meeting
+
+
+def finite_or_none(cost):
+    """JSON has no infinity, so the cost of an infeasible schedule is given as None"""
+    return cost if math.isfinite(cost) else None
+
+
+def benchmark_run(schedule, seed, trace_memory=False):
+    """Generate a schedule from scratch with the given seed and measure the optimiser"""
+    schedule.clear()
+    random.seed(seed)
+    if trace_memory:
+        tracemalloc.start()
+    beg_time = time.time()
+    schedule.fill_initial_schedule()
+    initial_cost = schedule.calculate_dynamic_cost()[1]
+    initial_time = time.time() - beg_time
+
+    beg_time = time.time()
+    runs = schedule.optimise_schedule()
+    optimise_time = time.time() - beg_time
+    violations, cost = schedule.total_schedule_cost()
+    result = {
+        'seed': seed,
+        'initial_time': initial_time,
+        'initial_cost': finite_or_none(initial_cost),
+        'optimise_time': optimise_time,
+        'runs': runs,
+        'cost_trajectory': [finite_or_none(c) for c in schedule.run_costs],
+        'cost': finite_or_none(cost),
+        'dynamic_cost': finite_or_none(schedule.calculate_dynamic_cost()[1]),
+        'violations': len(violations),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1),
+    }
+    if trace_memory:
+        result['peak_traced_memory_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result
@@ -6,12 +6,16 @@ from __future__ import absolute_import, print_function, unicode_literals
 import calendar
 import datetime
 import math
+import multiprocessing
 import random
+import statistics
 import string
 import sys
 import time
 
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
 from typing import NamedTuple, Optional
 from warnings import warn
@@ -36,6 +40,10 @@ from ietf.name.models import SessionPurposeName
 
 OPTIMISER_MAX_CYCLES = 160
 
+# Schedule shared with the optimiser restarts, see ScheduleHandler._run_restarts().
+# Worker processes are forked after it is set, and inherit it read-only.
+_restart_schedule = None
+
 
 class ScheduleId(NamedTuple):
     """Represents a schedule id as name and owner"""
@@ -86,19 +94,56 @@ class Command(BaseCommand):
                                 'Limit scheduling to specified purpose '
                                 '(use option multiple times to specify more than one purpose; default is all purposes)'
                             ))
-
-    def handle(self, meeting, name, max_cycles, verbosity, base_id, purposes, *args, **kwargs):
-        ScheduleHandler(self.stdout, meeting, name, max_cycles, verbosity, base_id, purposes).run()
+        parser.add_argument('-k', '--restarts', type=int, default=1,
+                            help='number of independent optimiser runs; the best resulting schedule is saved')
+        parser.add_argument('-w', '--workers', type=int, default=1,
+                            help='number of worker processes to run optimiser restarts in')
+        parser.add_argument('-s', '--seed', type=int, default=None,
+                            help='random seed, restarts use consecutive seeds starting from this one')
+
+    def handle(self, meeting, name, max_cycles, verbosity, base_id, purposes, restarts, workers, seed,
+               *args, **kwargs):
+        if restarts < 1:
+            raise CommandError('Number of restarts must be at least 1')
+        if workers < 1:
+            raise CommandError('Number of workers must be at least 1')
+        ScheduleHandler(self.stdout, meeting, name, max_cycles, verbosity, base_id, purposes,
+                        restarts, workers, seed).run()
+
+
+class RestartResult(NamedTuple):
+    """Outcome of a single optimiser restart"""
+    seed: int
+    cost: int
+    runs: int
+    assignments: tuple  # see Schedule.export_assignments()
+
+
+def _optimise_restart(seed):
+    """Generate a schedule from scratch using the shared schedule
+
+    Runs in a worker process, or in the main process if there is only one worker.
+    Does not access the database.
+    """
+    schedule = _restart_schedule
+    schedule.clear()
+    random.seed(seed)
+    schedule.fill_initial_schedule()
+    runs = schedule.optimise_schedule()
+    return RestartResult(seed, schedule.total_schedule_cost()[1], runs, schedule.export_assignments())
 
 
 class ScheduleHandler(object):
     def __init__(self, stdout, meeting_number, name=None, max_cycles=OPTIMISER_MAX_CYCLES,
-                 verbosity=1, base_id=None, session_purposes=None):
+                 verbosity=1, base_id=None, session_purposes=None, restarts=1, workers=1, seed=None):
         self.stdout = stdout
         self.verbosity = verbosity
         self.name = name
         self.max_cycles = max_cycles
         self.session_purposes = session_purposes
+        self.restarts = restarts
+        self.workers = workers
+        self.seed = seed
         if meeting_number:
             try:
                 self.meeting = models.Meeting.objects.get(type="ietf", number=meeting_number)
@@ -136,6 +181,24 @@ class ScheduleHandler(object):
 
     def run(self):
         """Schedule all sessions"""
+        if self.restarts > 1:
+            violations, cost = self._run_restarts()
+        else:
+            if self.seed is not None:
+                random.seed(self.seed)
+            violations, cost = self._run_optimiser()
+        if self.verbosity >= 1 and violations:
+            self.stdout.write('Remaining violations:')
+            for v in violations:
+                self.stdout.write(v)
+                
+        self.schedule.optimise_timeslot_capacity()
+
+        self._save_schedule(cost)
+        return violations, cost
+
+    def _run_optimiser(self):
+        """Fill and optimise the schedule in a single run"""
         beg_time = time.time()
         self.schedule.fill_initial_schedule()
         violations, cost = self.schedule.total_schedule_cost()
@@ -154,14 +217,60 @@ class ScheduleHandler(object):
             vc = len(violations)
             self.stdout.write('Optimisation completed with %s violation%s, cost %s, %s runs in %dm %.2fs'
                                % (vc, '' if vc==1 else 's', intcomma(cost), runs, tot_time//60, tot_time%60))
-        if self.verbosity >= 1 and violations:
-            self.stdout.write('Remaining violations:')
-            for v in violations:
-                self.stdout.write(v)
-                
-        self.schedule.optimise_timeslot_capacity()
+        return violations, cost
 
-        self._save_schedule(cost)
+    def _run_restarts(self):
+        """Run independent optimiser restarts and keep the best resulting schedule
+
+        Each restart generates a schedule from scratch, seeded with a consecutive
+        seed. The restarts run in a pool of forked worker processes, which share the
+        meeting data loaded by this handler.
+        """
+        global _restart_schedule
+        if self.seed is None:
+            self.seed = random.randrange(2**31)
+        if self.verbosity >= 1:
+            self.stdout.write('Running {} optimiser restarts in {} worker{}, seeds {} to {}'.format(
+                self.restarts, self.workers, '' if self.workers == 1 else 's', self.seed, self.seed + self.restarts - 1,
+            ))
+        seeds = range(self.seed, self.seed + self.restarts)
+        verbosity = self.schedule.verbosity
+        beg_time = time.time()
+        self.schedule.compile()  # before forking, so that all workers share it
+        _restart_schedule = self.schedule
+        self.schedule.verbosity = 0  # restarts report their results below
+        try:
+            if self.workers > 1:
+                with ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('fork'),
+                ) as executor:
+                    results = list(executor.map(_optimise_restart, seeds))
+            else:
+                results = [_optimise_restart(seed) for seed in seeds]
+        finally:
+            _restart_schedule = None
+            self.schedule.verbosity = verbosity
+        tot_time = time.time() - beg_time
+
+        best = min(results, key=lambda r: r.cost)  # first one wins a tie, i.e. the lowest seed
+        if self.verbosity >= 2:
+            for result in results:
+                self.stdout.write('Restart with seed {}: cost {}, {} runs'.format(
+                    result.seed, intcomma(result.cost), result.runs,
+                ))
+        self.schedule.import_assignments(best.assignments)
+        violations, cost = self.schedule.total_schedule_cost()
+        if self.verbosity >= 1:
+            costs = [r.cost for r in results]
+            self.stdout.write(
+                'Restarts completed in %dm %.2fs, cost min %s, median %s, max %s, %d of %d restarts at minimum cost'
+                % (tot_time//60, tot_time%60, intcomma(min(costs)), intcomma(statistics.median(costs)),
+                   intcomma(max(costs)), costs.count(min(costs)), len(costs))
+            )
+            vc = len(violations)
+            self.stdout.write('Using schedule from seed %s with %s violation%s, cost %s'
+                              % (best.seed, vc, '' if vc==1 else 's', intcomma(cost)))
         return violations, cost
     
     def _save_schedule(self, cost):
@@ -251,6 +360,10 @@ class ScheduleHandler(object):
         for timeslot in timeslots:
             timeslot.store_relations(timeslots)
 
+        # Use a stable order, so that a run is reproducible given its random seed
+        sessions = sorted(sessions, key=lambda s: s.session_pk)
+        timeslots = sorted(timeslots, key=lambda t: (0, t.timeslot_pk) if t.is_scheduled else (1, 0))
+
         self.schedule = Schedule(
             self.stdout,
             timeslots,
@@ -263,6 +376,27 @@ class ScheduleHandler(object):
         self.schedule.adjust_for_timeslot_availability()  # calculates some fixed costs
 
 
+def overlapping_sessions(schedule, timeslot):
+    """Sessions in schedule that overlap timeslot, ordered by session pk
+
+    The canonical order keeps violation reports stable and makes the per-session
+    cost caches hit regardless of how the schedule dict was built.
+    """
+    return sorted((schedule[t] for t in timeslot.overlaps if t in schedule), key=lambda s: s.session_pk)
+
+
+def group_session_order(item):
+    """Sort key for a (timeslot, session) pair among the sessions of a group
+
+    Sessions are ordered chronologically, with sessions in unscheduled timeslots last.
+    Ties are broken by session pk.
+    """
+    timeslot, session = item
+    if timeslot.is_scheduled:
+        return (0, timeslot.start, session.session_pk)
+    return (1, session.session_pk)
+
+
 class Schedule(object):
     """
     The Schedule object represents the schedule, and contains code to generate/optimise it.
@@ -279,10 +413,50 @@ class Schedule(object):
         self.schedule = dict()
         self.best_cost = math.inf
         self.best_schedule = None
+        self.run_costs = []  # dynamic cost after each optimiser run
         self._fixed_costs = dict()  # key = type of cost
         self._fixed_violations = dict()  # key = type of cost
         self.max_cycles = max_cycles
         self.base_schedule = self._load_base_schedule(base_schedule) if base_schedule else None
+        self.cost_engine = None  # CostEngine tracking self.schedule, if any
+        self.compiled = None  # created by compile()
+
+    def start_cost_engine(self):
+        """Start incremental cost tracking of the current contents of self.schedule
+
+        While the engine is running, self.schedule must only be modified through
+        _schedule_session() and _switch_sessions().
+        """
+        self.cost_engine = CostEngine(self.compile(), self.schedule, self.base_schedule)
+
+    def compile(self):
+        """Create the CompiledMeeting for the sessions and timeslots of this schedule, if not done yet"""
+        if self.compiled is None:
+            self.compiled = CompiledMeeting(self.timeslots, self.sessions)
+        return self.compiled
+
+    def clear(self):
+        """Remove all assignments, to generate a schedule from scratch"""
+        self.schedule = dict()
+        self.best_cost = math.inf
+        self.best_schedule = None
+        self.run_costs = []
+        self.cost_engine = None
+
+    def export_assignments(self):
+        """Assignments in self.schedule as (timeslot index, session index) pairs
+
+        The indexes refer to self.timeslots and self.sessions. Unlike the
+        schedule itself, the result can be passed between processes.
+        """
+        timeslot_index = {t: n for n, t in enumerate(self.timeslots)}
+        session_index = {s: n for n, s in enumerate(self.sessions)}
+        return tuple((timeslot_index[t], session_index[s]) for t, s in self.schedule.items())
+
+    def import_assignments(self, assignments):
+        """Replace self.schedule by assignments created by export_assignments()"""
+        self.clear()
+        self.schedule = {self.timeslots[t]: self.sessions[s] for t, s in assignments}
 
     def __str__(self):
         return 'Schedule ({} timeslots, {} sessions, {} scheduled, {} in base schedule)'.format(
@@ -442,29 +616,38 @@ class Schedule(object):
         that can be affected by scheduling choices.
         Returns a tuple of violations (list of strings) and the total cost (integer). 
         """
+        violations, cost = [], 0
+        for timeslot, session_violations, session_cost in self.calculate_dynamic_cost_by_timeslot(schedule, include_fixed):
+            violations += session_violations
+            cost += session_cost
+
+        return violations, cost
+
+    def calculate_dynamic_cost_by_timeslot(self, schedule=None, include_fixed=False):
+        """
+        Calculate the dynamic cost of the session in each timeslot of the current
+        schedule, or a different provided schedule.
+        Returns a list of (timeslot, violations, cost) tuples.
+        """
         if not schedule:
             schedule = self.schedule
         if self.base_schedule is not None:
             schedule = dict(schedule)  # make a copy
             schedule.update(self.base_schedule)
 
-        violations, cost = [], 0
-        
         # For performance, a few values are pre-calculated in bulk
-        group_sessions = defaultdict(set)
-        overlapping_sessions = defaultdict(set)
+        group_sessions = defaultdict(list)
         for timeslot, session in schedule.items():
-            group_sessions[session.group].add((timeslot, session))  # (timeslot, session), not just session!
-            overlapping_sessions[timeslot].update({schedule[t] for t in timeslot.overlaps if t in schedule})
-            
-        for timeslot, session in schedule.items():
-            session_violations, session_cost = session.calculate_cost(
-                schedule, timeslot, overlapping_sessions[timeslot], group_sessions[session.group], include_fixed
-            )
-            violations += session_violations
-            cost += session_cost
+            group_sessions[session.group].append((timeslot, session))  # (timeslot, session), not just session!
+        for my_sessions in group_sessions.values():
+            my_sessions.sort(key=group_session_order)
 
-        return violations, cost
+        return [
+            (timeslot,) + tuple(session.calculate_cost(
+                schedule, timeslot, overlapping_sessions(schedule, timeslot), group_sessions[session.group], include_fixed
+            ))
+            for timeslot, session in schedule.items()
+        ]
 
     def fill_initial_schedule(self):
         """
@@ -492,15 +675,14 @@ class Schedule(object):
             )
         sessions = sorted(self.free_sessions, key=lambda s: s.complexity, reverse=True)
 
+        self.start_cost_engine()
         for session in sessions:
             possible_slots = [t for t in self.free_timeslots if t not in self.schedule.keys()]
             random.shuffle(possible_slots)
             
             def timeslot_preference(t):
-                proposed_schedule = self.schedule.copy()
-                proposed_schedule[t] = session
                 return (
-                    self.calculate_dynamic_cost(proposed_schedule)[1],
+                    self.cost_engine.cost_for_change({t: session}),
                     t.duration if t.is_scheduled else datetime.timedelta(hours=1000),  # unscheduled slots sort to the end
                     t.capacity if t.is_scheduled else math.inf,  # unscheduled slots sort to the end
                 )
@@ -536,6 +718,7 @@ class Schedule(object):
         last_run_cost = None
         run_count = 0
 
+        self.start_cost_engine()
         for _ in range(self.max_cycles):
             run_count += 1
             items = list(self.schedule.items())
@@ -554,8 +737,9 @@ class Schedule(object):
             for original_timeslot, session in items:
                 if session.is_fixed:
                     continue
-                best_cost = self.calculate_dynamic_cost()[1]
+                best_cost = self.cost_engine.cost
                 if best_cost == 0:
+                    self.run_costs.append(best_cost)
                     if self.verbosity >= 1 and self.stdout.isatty():
                         sys.stderr.write('\n')
                     if self.verbosity >= 2:
@@ -580,6 +764,7 @@ class Schedule(object):
             if last_run_cost == best_cost:
                 shuffle_next_run = True
             last_run_violations, last_run_cost = self.calculate_dynamic_cost()
+            self.run_costs.append(last_run_cost)
             self._save(last_run_cost)
 
             if self.verbosity >= 1 and self.stdout.isatty():
@@ -592,6 +777,7 @@ class Schedule(object):
             self.stdout.write('Optimiser did not find perfect schedule, using best schedule at dynamic cost {:,}'
                               .format(self.best_cost))
         self.schedule = self.best_schedule
+        self.cost_engine = None  # was tracking the discarded schedule
 
         return run_count
 
@@ -631,11 +817,12 @@ class Schedule(object):
         larger rooms. This does not change which sessions overlap, so it
         has no impact on the schedule cost. 
         """
+        self.cost_engine = None  # assignments are modified directly below
         optimised_timeslots = set()
         for timeslot in list(self.schedule.keys()):
             if timeslot in optimised_timeslots or timeslot.is_fixed or not timeslot.is_scheduled:
                 continue
-            timeslot_overlaps = sorted(timeslot.full_overlaps, key=lambda t: t.capacity, reverse=True)
+            timeslot_overlaps = sorted(timeslot.full_overlaps, key=lambda t: (t.capacity, t.timeslot_pk), reverse=True)
             sessions_overlaps = [self.schedule.get(t) for t in timeslot_overlaps]
             sessions_overlaps.sort(key=lambda s: s.attendees if s else 0, reverse=True)
             assert len(timeslot_overlaps) == len(sessions_overlaps)
@@ -654,28 +841,24 @@ class Schedule(object):
 
     def _schedule_session(self, session, timeslot):
         self.schedule[timeslot] = session
+        if self.cost_engine is not None:
+            self.cost_engine.apply_change({timeslot: session})
 
     def _cost_for_switch(self, timeslot1, timeslot2):
         """
-        Calculate the total cost of self.schedule, if the sessions in timeslot1 and timeslot2 
+        Calculate the dynamic cost of self.schedule, if the sessions in timeslot1 and timeslot2
         would be switched. Does not perform the switch, self.schedule remains unchanged.
+
+        Only the cost of sessions affected by the switch is recalculated, so this
+        requires a running cost engine.
         """
-        proposed_schedule = self.schedule.copy()
-        session1 = proposed_schedule.get(timeslot1)
-        session2 = proposed_schedule.get(timeslot2)
+        session1 = self.schedule.get(timeslot1)
+        session2 = self.schedule.get(timeslot2)
         if session1 and not session1.fits_in_timeslot(timeslot2):
             return math.inf
         if session2 and not session2.fits_in_timeslot(timeslot1):
             return math.inf
-        if session1:
-            proposed_schedule[timeslot2] = session1
-        elif session2:
-            del proposed_schedule[timeslot2]
-        if session2:
-            proposed_schedule[timeslot1] = session2
-        elif session1:
-            del proposed_schedule[timeslot1]
-        return self.calculate_dynamic_cost(proposed_schedule)[1]
+        return self.cost_engine.cost_for_change({timeslot1: session2, timeslot2: session1})
 
     def _switch_sessions(self, timeslot1, timeslot2) -> Optional['Session']:
         """
@@ -698,6 +881,8 @@ class Schedule(object):
             self.schedule[timeslot1] = session2
         elif session1:
             del self.schedule[timeslot1]
+        if self.cost_engine is not None:
+            self.cost_engine.apply_change({timeslot1: session2, timeslot2: session1})
         return session2
     
     def _save(self, cost):
@@ -706,6 +891,195 @@ class Schedule(object):
             self.best_schedule = self.schedule.copy()
 
 
+class CompiledMeeting(object):
+    """
+    Integer-indexed representation of the sessions and timeslots of a schedule.
+
+    Sessions and timeslots are numbered by their position in Schedule.sessions and
+    Schedule.timeslots, and groups are numbered in order of appearance. Relations
+    between timeslots are stored as tuples of timeslot numbers.
+
+    The cost to a session of another session in an overlapping timeslot, and the
+    cost of placing a session in a timeslot, do not depend on the rest of the
+    schedule. They are calculated once and stored as matrices with one row per
+    session, so that the cost of a session in a schedule reduces to a few array
+    lookups. Matrix rows are arrays of floats, because the cost of a group overlapping
+    itself is infinite.
+    """
+    def __init__(self, timeslots, sessions):
+        self.timeslots = list(timeslots)
+        self.sessions = list(sessions)
+        self.timeslot_index = {t: n for n, t in enumerate(self.timeslots)}
+        self.session_index = {s: n for n, s in enumerate(self.sessions)}
+        self.timeslot_overlaps = [tuple(self.timeslot_index[o] for o in t.overlaps) for t in self.timeslots]
+        self.timeslot_adjacent = [tuple(self.timeslot_index[a] for a in t.adjacent) for t in self.timeslots]
+
+        group_index = dict()
+        self.session_group = [group_index.setdefault(s.group, len(group_index)) for s in self.sessions]
+        # Group that a session must be adjacent to, ignored for fixed sessions as they cannot be moved
+        self.session_wg_adjacent = [
+            group_index.setdefault(s.wg_adjacent, len(group_index)) if s.wg_adjacent and not s.is_fixed else None
+            for s in self.sessions
+        ]
+        self.group_count = len(group_index)
+
+        no_cost = array('d', bytes(8 * len(self.timeslots)))
+        self.timeslot_cost = [
+            no_cost if s.is_fixed else array('d', (s.calculate_cost_timeslot(t)[1] for t in self.timeslots))
+            for s in self.sessions
+        ]
+        self.overlap_cost = [
+            array('d', (s.calculate_cost_overlap(o)[1] for o in self.sessions))
+            for s in self.sessions
+        ]
+
+
+class CostEngine(object):
+    """
+    Incremental calculation of the dynamic cost of a schedule.
+
+    The engine keeps the cost of every session in the schedule, together with
+    reverse lookups of which timeslots overlap with or are adjacent to each timeslot,
+    and which timeslots hold the sessions of each group. When sessions are moved,
+    only the costs that can be affected by the move are recalculated: those of the
+    sessions in the changed timeslots, in timeslots overlapping or adjacent to
+    them, and of the other sessions of the groups involved. The results are
+    identical to the cost calculated by Schedule.calculate_dynamic_cost().
+
+    Internally, timeslots and sessions are referred to by their numbers in the
+    CompiledMeeting. Changes are expressed as a dict with timeslots as keys and the
+    session that should be in that timeslot as values, None meaning the timeslot
+    becomes empty.
+    """
+    def __init__(self, compiled, schedule, base_schedule=None):
+        self.compiled = compiled
+        timeslot_count = len(compiled.timeslots)
+        self._timeslot_session = [None] * timeslot_count
+        self._group_timeslots = [set() for _ in range(compiled.group_count)]
+        self._overlapped_by = [[] for _ in range(timeslot_count)]
+        self._adjacent_to = [[] for _ in range(timeslot_count)]
+        for t in range(timeslot_count):
+            for other in compiled.timeslot_overlaps[t]:
+                self._overlapped_by[other].append(t)
+            for other in compiled.timeslot_adjacent[t]:
+                self._adjacent_to[other].append(t)
+
+        self._costs = [0] * timeslot_count  # cost of the session in each timeslot
+        self._finite_cost = 0
+        self._infinite_costs = 0
+        assignments = dict(schedule)
+        assignments.update(base_schedule or dict())
+        self.apply_change(assignments)
+
+    @property
+    def cost(self):
+        """Dynamic cost of the current schedule"""
+        return math.inf if self._infinite_costs else self._finite_cost
+
+    def timeslot_costs(self):
+        """Cost of the session in each occupied timeslot, as a dict keyed by timeslot"""
+        return {
+            self.compiled.timeslots[t]: self._costs[t]
+            for t, s in enumerate(self._timeslot_session) if s is not None
+        }
+
+    def cost_for_change(self, changes):
+        """Dynamic cost of the schedule if changes were made. The schedule is not modified."""
+        undo, costs = self._evaluate(changes)
+        self._apply(undo)
+        finite_cost, infinite_costs = self._updated_totals(costs)
+        return math.inf if infinite_costs else finite_cost
+
+    def apply_change(self, changes):
+        """Record changes that were made to the schedule"""
+        costs = self._evaluate(changes)[1]
+        self._finite_cost, self._infinite_costs = self._updated_totals(costs)
+        for t, cost in costs.items():
+            self._costs[t] = cost
+
+    def _updated_totals(self, costs):
+        """Total finite cost and number of infinite costs, if the costs of some timeslots were replaced"""
+        finite_cost, infinite_costs = self._finite_cost, self._infinite_costs
+        for t, new_cost in costs.items():
+            for cost, sign in ((self._costs[t], -1), (new_cost, 1)):
+                if cost == math.inf:
+                    infinite_costs += sign  # inf - inf is nan, so count infinite costs separately
+                else:
+                    finite_cost += sign * cost
+        return finite_cost, infinite_costs
+
+    def _evaluate(self, changes):
+        """
+        Apply changes and recalculate all affected costs. Returns a dict to undo
+        the changes, and the new costs of all affected timeslots.
+        """
+        changes = {
+            self.compiled.timeslot_index[t]: None if s is None else self.compiled.session_index[s]
+            for t, s in changes.items()
+        }
+        groups = {self.compiled.session_group[s] for s in changes.values() if s is not None}
+        groups.update(self.compiled.session_group[s] for s in (self._timeslot_session[t] for t in changes)
+                      if s is not None)
+        undo = self._apply(changes)
+        affected = set(changes)
+        for t in changes:
+            affected.update(self._overlapped_by[t])
+            affected.update(self._adjacent_to[t])
+        for group in groups:
+            affected.update(self._group_timeslots[group])
+        group_costs = dict()
+        return undo, {t: self._calculate(t, group_costs) for t in affected}
+
+    def _apply(self, changes):
+        undo = dict()
+        for t in changes:
+            undo[t] = self._timeslot_session[t]
+            if undo[t] is not None:
+                self._group_timeslots[self.compiled.session_group[undo[t]]].discard(t)
+            self._timeslot_session[t] = None
+        for t, s in changes.items():
+            if s is not None:
+                self._timeslot_session[t] = s
+                self._group_timeslots[self.compiled.session_group[s]].add(t)
+        return undo
+
+    def _calculate(self, t, group_sessions):
+        """Calculate the cost of the session in timeslot t
+
+        group_sessions caches the ordered sessions of each group between calls.
+        """
+        compiled = self.compiled
+        timeslot_session = self._timeslot_session
+        s = timeslot_session[t]
+        if s is None:
+            return 0
+
+        cost = compiled.timeslot_cost[s][t]
+        overlap_cost = compiled.overlap_cost[s]
+        for other in compiled.timeslot_overlaps[t]:
+            if timeslot_session[other] is not None:
+                cost += overlap_cost[timeslot_session[other]]
+
+        session = compiled.sessions[s]
+        group = compiled.session_group[s]
+        if len(self._group_timeslots[group]) >= 2:
+            if group not in group_sessions:
+                group_sessions[group] = tuple(sorted(
+                    ((compiled.timeslots[g], compiled.sessions[timeslot_session[g]])
+                     for g in self._group_timeslots[group]),
+                    key=group_session_order,
+                ))
+            cost += session._calculate_cost_my_other_sessions(group_sessions[group])[1]
+
+        wg_adjacent = compiled.session_wg_adjacent[s]
+        if wg_adjacent is not None and not any(
+                compiled.session_group[timeslot_session[a]] == wg_adjacent
+                for a in compiled.timeslot_adjacent[t] if timeslot_session[a] is not None
+        ):
+            cost += session.wg_adjacent_penalty
+        return cost if cost == math.inf else int(cost)
+
+
 class GeneratorTimeSlot:
     """Representation of a timeslot for the schedule generator"""
     def __init__(self, *, verbosity=0, is_fixed=False):
@@ -913,19 +1287,10 @@ class Session(object):
         )
 
         if include_fixed or (not self.is_fixed):
-            if not my_timeslot.has_space_for(self.attendees):
-                violations.append('{}: scheduled in too small room'.format(self.group))
-                cost += self.business_constraint_costs['session_requires_trim']
-
-            if not my_timeslot.has_time_for(self.requested_duration):
-                violations.append('{}: scheduled in too short timeslot'.format(self.group))
-                cost += self.business_constraint_costs['session_requires_trim']
-
-            if my_timeslot.time_group in self.timeranges_unavailable:
-                violations.append('{}: scheduled in unavailable timerange {}'
-                                  .format(self.group, my_timeslot.time_group))
-                cost += self.timeranges_unavailable_penalty
-            
+            v, c = self.calculate_cost_timeslot(my_timeslot)
+            violations += v
+            cost += c
+
         v, c = self._calculate_cost_overlapping_groups(overlapping_sessions)
         violations += v
         cost += c
@@ -948,70 +1313,116 @@ class Session(object):
         self.last_cost = cost
         return violations, cost
 
+    def calculate_cost_timeslot(self, timeslot):
+        """
+        Calculate the cost of placing this session in timeslot, not taking any
+        other sessions into account.
+        """
+        violations, cost = [], 0
+        if not timeslot.has_space_for(self.attendees):
+            violations.append('{}: scheduled in too small room'.format(self.group))
+            cost += self.business_constraint_costs['session_requires_trim']
+
+        if not timeslot.has_time_for(self.requested_duration):
+            violations.append('{}: scheduled in too short timeslot'.format(self.group))
+            cost += self.business_constraint_costs['session_requires_trim']
+
+        if timeslot.time_group in self.timeranges_unavailable:
+            violations.append('{}: scheduled in unavailable timerange {}'
+                              .format(self.group, timeslot.time_group))
+            cost += self.timeranges_unavailable_penalty
+        return violations, cost
+
+    def calculate_cost_overlap(self, other):
+        """
+        Calculate the cost to this session of another session being scheduled
+        in an overlapping timeslot. The total cost of a set of overlapping sessions
+        is the sum of the costs for each of them.
+        """
+        violations, cost = [], 0
+        for v, c in (self._calculate_cost_overlapping_group(other), self._calculate_cost_business_logic_for(other)):
+            violations += v
+            cost += c
+        return violations, cost
+
     @lru_cache(maxsize=10000)
     def _calculate_cost_overlapping_groups(self, overlapping_sessions):
         violations, cost = [], 0
         for other in overlapping_sessions:
-            if not other:
-                continue
-            if self.is_fixed and other.is_fixed:
-                continue
-            if other.group == self.group:
-                violations.append('{}: scheduled twice in overlapping slots'.format(self.group))
-                cost += math.inf
-            if other.group in self.conflict_groups:
-                violations.append('{}: group conflict with {}'.format(self.group, other.group))
-                cost += self.conflict_groups[other.group]
-    
-            conflict_people = self.conflict_people.intersection(other.conflict_people)
-            for person in conflict_people:
-                violations.append('{}: conflict w/ key person {}, also in {}'
-                                  .format(self.group, person, other.group))
-            cost += len(conflict_people) * self.conflict_people_penalty
+            v, c = self._calculate_cost_overlapping_group(other)
+            violations += v
+            cost += c
+        return violations, cost
+
+    def _calculate_cost_overlapping_group(self, other):
+        violations, cost = [], 0
+        if not other:
+            return violations, cost
+        if self.is_fixed and other.is_fixed:
+            return violations, cost
+        if other.group == self.group:
+            violations.append('{}: scheduled twice in overlapping slots'.format(self.group))
+            cost += math.inf
+        if other.group in self.conflict_groups:
+            violations.append('{}: group conflict with {}'.format(self.group, other.group))
+            cost += self.conflict_groups[other.group]
+
+        conflict_people = self.conflict_people.intersection(other.conflict_people)
+        for person in conflict_people:
+            violations.append('{}: conflict w/ key person {}, also in {}'
+                              .format(self.group, person, other.group))
+        cost += len(conflict_people) * self.conflict_people_penalty
         return violations, cost
 
     @lru_cache(maxsize=10000)
     def _calculate_cost_business_logic(self, overlapping_sessions):
         violations, cost = [], 0
         for other in overlapping_sessions:
-            if not other:
-                continue
-            if self.is_fixed and other.is_fixed:
-                continue
-            # BOFs cannot conflict with PRGs
-            if self.is_bof and other.is_prg:
-                violations.append('{}: BOF overlaps with PRG: {}'
-                                  .format(self.group, other.group))
-                cost += self.business_constraint_costs['bof_overlapping_prg']
-            # BOFs cannot conflict with any other BOFs
-            if self.is_bof and other.is_bof:
-                violations.append('{}: BOF overlaps with other BOF: {}'
-                                  .format(self.group, other.group))
-                cost += self.business_constraint_costs['bof_overlapping_bof']
-            # BOFs cannot conflict with any other WGs in their area
-            if self.is_bof and self.parent == other.parent:
-                violations.append('{}: BOF overlaps with other session from same area: {}'
-                                  .format(self.group, other.group))
-                cost += self.business_constraint_costs['bof_overlapping_area_wg']
-            # BOFs cannot conflict with any area-wide meetings (of any area)
-            if self.is_bof and other.is_area_meeting:
-                violations.append('{}: BOF overlaps with area meeting {}'
-                                  .format(self.group, other.group))
-                cost += self.business_constraint_costs['bof_overlapping_area_meeting']
-            # Area meetings cannot conflict with anything else in their area 
-            if self.is_area_meeting and other.parent == self.group:
-                violations.append('{}: area meeting overlaps with session from same area: {}'
-                                  .format(self.group, other.group))
-                cost += self.business_constraint_costs['area_overlapping_in_area']
-            # Area meetings cannot conflict with other area meetings 
-            if self.is_area_meeting and other.is_area_meeting:
-                violations.append('{}: area meeting overlaps with other area meeting: {}'
-                                  .format(self.group, other.group))
-                cost += self.business_constraint_costs['area_overlapping_other_area']
-            # WGs overseen by the same Area Director should not conflict  
-            if self.ad and self.ad == other.ad:
-                violations.append('{}: has same AD as {}'.format(self.group, other.group))
-                cost += self.business_constraint_costs['session_overlap_ad']
+            v, c = self._calculate_cost_business_logic_for(other)
+            violations += v
+            cost += c
+        return violations, cost
+
+    def _calculate_cost_business_logic_for(self, other):
+        violations, cost = [], 0
+        if not other:
+            return violations, cost
+        if self.is_fixed and other.is_fixed:
+            return violations, cost
+        # BOFs cannot conflict with PRGs
+        if self.is_bof and other.is_prg:
+            violations.append('{}: BOF overlaps with PRG: {}'
+                              .format(self.group, other.group))
+            cost += self.business_constraint_costs['bof_overlapping_prg']
+        # BOFs cannot conflict with any other BOFs
+        if self.is_bof and other.is_bof:
+            violations.append('{}: BOF overlaps with other BOF: {}'
+                              .format(self.group, other.group))
+            cost += self.business_constraint_costs['bof_overlapping_bof']
+        # BOFs cannot conflict with any other WGs in their area
+        if self.is_bof and self.parent == other.parent:
+            violations.append('{}: BOF overlaps with other session from same area: {}'
+                              .format(self.group, other.group))
+            cost += self.business_constraint_costs['bof_overlapping_area_wg']
+        # BOFs cannot conflict with any area-wide meetings (of any area)
+        if self.is_bof and other.is_area_meeting:
+            violations.append('{}: BOF overlaps with area meeting {}'
+                              .format(self.group, other.group))
+            cost += self.business_constraint_costs['bof_overlapping_area_meeting']
+        # Area meetings cannot conflict with anything else in their area 
+        if self.is_area_meeting and other.parent == self.group:
+            violations.append('{}: area meeting overlaps with session from same area: {}'
+                              .format(self.group, other.group))
+            cost += self.business_constraint_costs['area_overlapping_in_area']
+        # Area meetings cannot conflict with other area meetings 
+        if self.is_area_meeting and other.is_area_meeting:
+            violations.append('{}: area meeting overlaps with other area meeting: {}'
+                              .format(self.group, other.group))
+            cost += self.business_constraint_costs['area_overlapping_other_area']
+        # WGs overseen by the same Area Director should not conflict  
+        if self.ad and self.ad == other.ad:
+            violations.append('{}: has same AD as {}'.format(self.group, other.group))
+            cost += self.business_constraint_costs['session_overlap_ad']
         return violations, cost
     
     @lru_cache(maxsize=10000)
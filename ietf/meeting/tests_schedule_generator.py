@@ -1,19 +1,23 @@
 # Copyright The IETF Trust 2020, All Rights Reserved
 import calendar
 import datetime
+import json
+import math
 import pytz
+import random
 from io import StringIO
 from warnings import filterwarnings
 
 
+from django.core.management import call_command
 from django.core.management.base import CommandError
 
 from ietf.utils.test_utils import TestCase
 from ietf.group.factories import GroupFactory, RoleFactory
 from ietf.person.factories import PersonFactory
-from ietf.meeting.models import Constraint, TimerangeName, BusinessConstraint, SchedTimeSessAssignment, Schedule
+from ietf.meeting.models import Constraint, TimerangeName, BusinessConstraint, SchedTimeSessAssignment, Schedule, Meeting
 from ietf.meeting.factories import MeetingFactory, RoomFactory, TimeSlotFactory, SessionFactory, ScheduleFactory
-from ietf.meeting.management.commands import generate_schedule
+from ietf.meeting.management.commands import benchmark_schedule_generator, generate_schedule
 from ietf.name.models import ConstraintName
 
 import debug                            # pyflakes:ignore
@@ -116,6 +120,26 @@ class ScheduleGeneratorTest(TestCase):
         self.stdout.seek(0)
         self.assertIn('Some sessions will not be scheduled', self.stdout.read())
 
+    def test_restarts(self):
+        self._create_basic_sessions()
+        assignments = []
+        for name in ['restarts-1', 'restarts-2']:
+            generator = generate_schedule.ScheduleHandler(self.stdout, self.meeting.number, name=name, verbosity=2,
+                                                          restarts=3, seed=42)
+            violations, cost = generator.run()
+            self.assertEqual(violations, self.fixed_violations)
+            self.assertEqual(cost, self.fixed_cost)
+            schedule = self.meeting.schedule_set.get(name=name)
+            self.assertEqual(schedule.assignments.count(), 13)
+            assignments.append(set(schedule.assignments.values_list('timeslot', 'session')))
+        self.assertEqual(assignments[0], assignments[1], 'Restarts with the same seed should give the same schedule')
+
+        self.stdout.seek(0)
+        output = self.stdout.read()
+        self.assertIn('Running 3 optimiser restarts in 1 worker, seeds 42 to 44', output)
+        self.assertIn('Restart with seed 44: cost', output)
+        self.assertIn('3 of 3 restarts at minimum cost', output)
+
     def test_invalid_meeting_number(self):
         with self.assertRaises(CommandError):
             generator = generate_schedule.ScheduleHandler(self.stdout, 'not-valid-meeting-number-aaaa', verbosity=0)
@@ -264,6 +288,68 @@ class ScheduleGeneratorTest(TestCase):
             ]),
         )
 
+    def test_cost_engine_matches_full_calculation(self):
+        """Incremental cost calculation should give the same results as a full recalculation"""
+        self._create_basic_sessions()
+        base_schedule = self._create_base_schedule()
+        for base_id in [None, generate_schedule.ScheduleId.from_schedule(base_schedule)]:
+            handler = generate_schedule.ScheduleHandler(self.stdout, self.meeting.number, verbosity=0, base_id=base_id)
+            schedule = handler.schedule
+            schedule.fill_initial_schedule()
+            self.assertCostEngineMatchesFullCalculation(schedule)
+
+            rng = random.Random(1234)
+            timeslots = sorted(schedule.free_timeslots, key=lambda t: getattr(t, 'timeslot_pk', 0))
+            for _ in range(250):
+                timeslot1, timeslot2 = rng.sample(timeslots, 2)
+                session1 = schedule.schedule.get(timeslot1)
+                session2 = schedule.schedule.get(timeslot2)
+                if (
+                        (session1 and not session1.fits_in_timeslot(timeslot2))
+                        or (session2 and not session2.fits_in_timeslot(timeslot1))
+                ):
+                    expected_cost = math.inf
+                else:
+                    proposed_schedule = {t: s for t, s in schedule.schedule.items() if t not in (timeslot1, timeslot2)}
+                    if session1:
+                        proposed_schedule[timeslot2] = session1
+                    if session2:
+                        proposed_schedule[timeslot1] = session2
+                    expected_cost = schedule.calculate_dynamic_cost(proposed_schedule)[1]
+                self.assertEqual(schedule._cost_for_switch(timeslot1, timeslot2), expected_cost)
+
+                schedule._switch_sessions(timeslot1, timeslot2)
+                self.assertCostEngineMatchesFullCalculation(schedule)
+
+    def assertCostEngineMatchesFullCalculation(self, schedule):
+        full_calculation = schedule.calculate_dynamic_cost_by_timeslot()
+        self.assertEqual(
+            schedule.cost_engine.timeslot_costs(),
+            {timeslot: cost if cost == math.inf else int(cost) for timeslot, _, cost in full_calculation},
+        )
+        self.assertEqual(schedule.cost_engine.cost, schedule.calculate_dynamic_cost()[1])
+
+    def test_benchmark_command(self):
+        meeting_count = Meeting.objects.count()
+        output = StringIO()
+        call_command('benchmark_schedule_generator', sessions=20, rooms=3, days=3, seeds=[1, 2], max_cycles=5,
+                     trace_memory=True, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['meeting']['sessions'], 20)
+        self.assertEqual(report['meeting']['timeslots'], 27)
+        self.assertEqual([run['seed'] for run in report['runs']], [1, 2])
+        for run in report['runs']:
+            self.assertLessEqual(run['runs'], 5)
+            self.assertEqual(len(run['cost_trajectory']), run['runs'])
+            self.assertIn('peak_traced_memory_kb', run)
+        self.assertEqual(Meeting.objects.count(), meeting_count, 'Benchmark meeting should be removed')
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_schedule_generator', sessions=100, rooms=3, days=3, stdout=output)
+
+        # the cost of an infeasible schedule is reported as null, JSON has no infinity
+        self.assertIsNone(benchmark_schedule_generator.finite_or_none(math.inf))
+        self.assertEqual(benchmark_schedule_generator.finite_or_none(12), 12)
 
     def _create_basic_sessions(self):
         for group in self.all_groups:
@@ -6,7 +6,7 @@ from django.contrib import admin
 
 from ietf.nomcom.models import ( ReminderDates, NomCom, Nomination, Nominee, NomineePosition, 
                                Position, Feedback, FeedbackLastSeen, TopicFeedbackLastSeen,
-                               Volunteer, )
+                               Volunteer, EligibilitySnapshot, EligibilitySnapshotEntry, )
 
 
 class ReminderDatesAdmin(admin.ModelAdmin):
@@ -76,4 +76,15 @@ class VolunteerAdmin(admin.ModelAdmin):
     raw_id_fields = ['person']
 admin.site.register(Volunteer, VolunteerAdmin)
 
+class EligibilitySnapshotAdmin(admin.ModelAdmin):
+    list_display = ['id', 'date', 'time']
+admin.site.register(EligibilitySnapshot, EligibilitySnapshotAdmin)
+
+class EligibilitySnapshotEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'snapshot', 'person', 'three_of_five', 'officer', 'author']
+    list_filter = ['snapshot', 'three_of_five', 'officer', 'author']
+    search_fields = ['person__name']
+    raw_id_fields = ['person']
+admin.site.register(EligibilitySnapshotEntry, EligibilitySnapshotEntryAdmin)
+
 
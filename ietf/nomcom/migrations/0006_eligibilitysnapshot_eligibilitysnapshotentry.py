@@ -0,0 +1,94 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import ietf.utils.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("person", "0001_initial"),
+        ("nomcom", "0005_user_to_person"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EligibilitySnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "date",
+                    models.DateField(help_text="The eligibility date", unique=True),
+                ),
+                (
+                    "time",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="When the snapshot was last computed",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="EligibilitySnapshotEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "three_of_five",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Attended three of the previous five meetings",
+                    ),
+                ),
+                (
+                    "officer",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Was a working group chair or secretary",
+                    ),
+                ),
+                (
+                    "author",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Authored or edited two or more RFCs or approved drafts",
+                    ),
+                ),
+                (
+                    "person",
+                    ietf.utils.models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="person.person",
+                    ),
+                ),
+                (
+                    "snapshot",
+                    ietf.utils.models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="entries",
+                        to="nomcom.eligibilitysnapshot",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("snapshot", "person")},
+            },
+        ),
+    ]
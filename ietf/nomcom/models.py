@@ -9,6 +9,7 @@ from django.db.models.signals import post_delete
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.template.defaultfilters import linebreaks # type: ignore
+from django.utils import timezone
 
 import debug                            # pyflakes:ignore
 
@@ -333,3 +334,26 @@ class Volunteer(models.Model):
     def __str__(self):
         return f'{self.person} for {self.nomcom}'
     
+
+
+class EligibilitySnapshot(models.Model):
+    """The people meeting each NomCom eligibility path at a date, see
+    ietf.nomcom.utils.compute_eligibility_snapshot()"""
+    date = models.DateField(unique=True, help_text="The eligibility date")
+    time = models.DateTimeField(default=timezone.now, help_text="When the snapshot was last computed")
+
+    def __str__(self):
+        return f'Eligibility at {self.date}'
+
+class EligibilitySnapshotEntry(models.Model):
+    snapshot = ForeignKey(EligibilitySnapshot, related_name='entries')
+    person = ForeignKey(Person)
+    three_of_five = models.BooleanField(default=False, help_text="Attended three of the previous five meetings")
+    officer = models.BooleanField(default=False, help_text="Was a working group chair or secretary")
+    author = models.BooleanField(default=False, help_text="Authored or edited two or more RFCs or approved drafts")
+
+    class Meta:
+        unique_together = [('snapshot', 'person')]
+
+    def __str__(self):
+        return f'{self.person} at {self.snapshot.date}'
@@ -12,7 +12,8 @@ from tastypie.cache import SimpleCache
 from ietf import api
 
 from ietf.nomcom.models import (NomCom, Position, Nominee, ReminderDates, NomineePosition,
-    Feedback, Nomination, FeedbackLastSeen, Topic, TopicFeedbackLastSeen, Volunteer, )
+    Feedback, Nomination, FeedbackLastSeen, Topic, TopicFeedbackLastSeen, Volunteer,
+    EligibilitySnapshot, EligibilitySnapshotEntry, )
 
 from ietf.group.resources import GroupResource
 class NomComResource(ModelResource):
@@ -245,3 +246,38 @@ class VolunteerResource(ModelResource):
             "person": ALL_WITH_RELATIONS,
         }
 api.nomcom.register(VolunteerResource())
+
+
+class EligibilitySnapshotResource(ModelResource):
+    class Meta:
+        queryset = EligibilitySnapshot.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'eligibilitysnapshot'
+        ordering = ['id', ]
+        filtering = { 
+            "id": ALL,
+            "date": ALL,
+            "time": ALL,
+        }
+api.nomcom.register(EligibilitySnapshotResource())
+
+
+class EligibilitySnapshotEntryResource(ModelResource):
+    snapshot         = ToOneField(EligibilitySnapshotResource, 'snapshot')
+    person           = ToOneField(PersonResource, 'person')
+    class Meta:
+        queryset = EligibilitySnapshotEntry.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'eligibilitysnapshotentry'
+        ordering = ['id', ]
+        filtering = { 
+            "id": ALL,
+            "three_of_five": ALL,
+            "officer": ALL,
+            "author": ALL,
+            "snapshot": ALL_WITH_RELATIONS,
+            "person": ALL_WITH_RELATIONS,
+        }
+api.nomcom.register(EligibilitySnapshotEntryResource())
@@ -0,0 +1,29 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+#
+# Celery task definitions
+#
+import datetime
+
+from celery import shared_task
+
+from ietf.nomcom.utils import compute_eligibility_snapshot, get_eligibility_date, get_eligibility_snapshot
+from ietf.utils.log import log
+from ietf.utils.timezone import date_today
+
+
+@shared_task
+def eligibility_snapshot_task(date=None, recompute=False):
+    """Compute the NomCom eligibility snapshot for a date
+
+    The date is an ISO 8601 string, by default the eligibility date of the
+    upcoming NomCom. Dates that have not yet passed are skipped, since the
+    data they depend on can still change, as is a date that already has a
+    snapshot, unless recompute is True.
+    """
+    date = datetime.date.fromisoformat(date) if date else get_eligibility_date()
+    if date > date_today():
+        return
+    if get_eligibility_snapshot(date) and not recompute:
+        return
+    snapshot = compute_eligibility_snapshot(date)
+    log(f"Computed NomCom eligibility snapshot for {date}: {snapshot.entries.count()} entries")
@@ -37,15 +37,18 @@ from ietf.nomcom.test_data import nomcom_test_data, generate_cert, check_comment
                                   MEMBER_USER, SECRETARIAT_USER, EMAIL_DOMAIN, NOMCOM_YEAR
 from ietf.nomcom.models import NomineePosition, Position, Nominee, \
                                NomineePositionStateName, Feedback, FeedbackTypeName, \
-                               Nomination, FeedbackLastSeen, TopicFeedbackLastSeen, ReminderDates
+                               Nomination, FeedbackLastSeen, TopicFeedbackLastSeen, ReminderDates, \
+                               EligibilitySnapshot
 from ietf.nomcom.management.commands.send_reminders import Command, is_time_to_send
+from ietf.nomcom.tasks import eligibility_snapshot_task
 from ietf.nomcom.factories import NomComFactory, FeedbackFactory, TopicFactory, \
                                   nomcom_kwargs_for_year, provide_private_key_to_test_client, \
                                   key
 from ietf.nomcom.utils import get_nomcom_by_year, make_nomineeposition, \
                               get_hash_nominee_position, is_eligible, list_eligible, \
                               get_eligibility_date, suggest_affiliation, \
-                              decorate_volunteers_with_qualifications
+                              decorate_volunteers_with_qualifications, compute_eligibility_snapshot, \
+                              update_eligibility_snapshots_for_meetings
 from ietf.person.factories import PersonFactory, EmailFactory
 from ietf.person.models import Email, Person
 from ietf.stats.models import MeetingRegistration
@@ -2896,6 +2899,113 @@ class VolunteerDecoratorUnitTests(TestCase):
             if v.person == author_person:
                 self.assertEqual(v.qualifications,'path_3')
 
+class EligibilitySnapshotTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.nomcom = NomComFactory(group__acronym='nomcom2021', populate_personnel=False, first_call_for_volunteers=datetime.date(2021,5,15))
+        self.elig_date = get_eligibility_date(self.nomcom)
+        # make_immutable_test_data makes things this test does not want
+        Role.objects.filter(name_id__in=('chair','secr')).delete()
+        self.meetings = [MeetingFactory(number=number, date=date, type_id='ietf') for number,date in [
+            ('110', datetime.date(2021, 3, 6)),
+            ('109', datetime.date(2020, 11, 14)),
+            ('108', datetime.date(2020, 7, 25)),
+            ('107', datetime.date(2020, 3, 21)),
+            ('106', datetime.date(2019, 11, 16)),
+        ]]
+        self.attendee = PersonFactory()
+        for m in self.meetings[:3]:
+            MeetingRegistrationFactory(meeting=m, person=self.attendee, attended=True)
+        self.officer = RoleFactory(
+            name_id='chair',
+            group__time=datetime_from_date(self.elig_date, DEADLINE_TZINFO) - datetime.timedelta(days=5),
+        ).person
+        self.newcomer = PersonFactory()
+
+    def test_snapshot_matches_live_computation(self):
+        live = set(list_eligible(self.nomcom))
+        self.assertEqual(live, {self.attendee, self.officer})
+        volunteers = [self.nomcom.volunteer_set.create(person=p) for p in (self.attendee, self.officer, self.newcomer)]
+        decorate_volunteers_with_qualifications(volunteers, nomcom=self.nomcom)
+        live_qualifications = [v.qualifications for v in volunteers]
+        self.assertEqual(live_qualifications, ['path_1', 'path_2', ''])
+
+        snapshot = compute_eligibility_snapshot(self.elig_date)
+        self.assertEqual(
+            set(snapshot.entries.values_list('person', 'three_of_five', 'officer', 'author')),
+            {(self.attendee.pk, True, False, False), (self.officer.pk, False, True, False)},
+        )
+        with self.assertNumQueries(2):
+            self.assertEqual(set(list_eligible(self.nomcom)), live)
+        self.assertTrue(is_eligible(self.attendee, self.nomcom))
+        self.assertFalse(is_eligible(self.newcomer, self.nomcom))
+        for v in volunteers:
+            v.qualifications = None
+        with self.assertNumQueries(2):
+            decorate_volunteers_with_qualifications(volunteers, nomcom=self.nomcom)
+        self.assertEqual([v.qualifications for v in volunteers], live_qualifications)
+
+        # disqualification is not part of the snapshot
+        RoleFactory(person=self.attendee, name_id='ad', group__type_id='area')
+        self.assertEqual(set(list_eligible(self.nomcom)), {self.officer})
+
+        # recomputing replaces the entries
+        MeetingRegistration.objects.filter(person=self.attendee).delete()
+        compute_eligibility_snapshot(self.elig_date)
+        self.assertEqual(list(snapshot.entries.values_list('person', flat=True)), [self.officer.pk])
+
+    def test_update_eligibility_snapshots_for_meetings(self):
+        snapshot = compute_eligibility_snapshot(self.elig_date)
+        other = compute_eligibility_snapshot(datetime.date(2020, 1, 1))
+        other_time = other.time
+
+        MeetingRegistration.objects.filter(person=self.attendee, meeting=self.meetings[0]).delete()
+        for m in self.meetings[1:4]:
+            MeetingRegistrationFactory(meeting=m, person=self.newcomer, attended=True)
+        self.assertEqual(update_eligibility_snapshots_for_meetings(self.meetings[:2]), [snapshot])
+        self.assertEqual(
+            set(snapshot.entries.values_list('person', 'three_of_five', 'officer', 'author')),
+            {(self.newcomer.pk, True, False, False), (self.officer.pk, False, True, False)},
+        )
+        self.assertEqual(set(list_eligible(self.nomcom)), {self.newcomer, self.officer})
+        other.refresh_from_db()
+        self.assertEqual(other.time, other_time)
+
+
+class EligibilitySnapshotTaskTests(TestCase):
+    @mock.patch("ietf.nomcom.tasks.compute_eligibility_snapshot")
+    def test_eligibility_snapshot_task(self, mock_compute):
+        past = date_today() - datetime.timedelta(days=10)
+
+        # dates that have not passed are skipped
+        eligibility_snapshot_task((date_today() + datetime.timedelta(days=1)).isoformat())
+        self.assertFalse(mock_compute.called)
+
+        eligibility_snapshot_task(past.isoformat())
+        self.assertEqual(mock_compute.call_count, 1)
+        self.assertEqual(mock_compute.call_args, mock.call(past))
+
+        # an existing snapshot is only replaced when asked to
+        EligibilitySnapshot.objects.create(date=past)
+        mock_compute.reset_mock()
+        eligibility_snapshot_task(past.isoformat())
+        self.assertFalse(mock_compute.called)
+        eligibility_snapshot_task(past.isoformat(), recompute=True)
+        self.assertEqual(mock_compute.call_count, 1)
+        self.assertEqual(mock_compute.call_args, mock.call(past))
+
+    @mock.patch("ietf.nomcom.tasks.get_eligibility_date")
+    @mock.patch("ietf.nomcom.tasks.compute_eligibility_snapshot")
+    def test_eligibility_snapshot_task_default_date(self, mock_compute, mock_get_date):
+        mock_get_date.return_value = date_today() + datetime.timedelta(days=30)
+        eligibility_snapshot_task()
+        self.assertFalse(mock_compute.called)
+
+        mock_get_date.return_value = date_today()
+        eligibility_snapshot_task()
+        self.assertEqual(mock_compute.call_args, mock.call(date_today()))
+
+
 class ReclassifyFeedbackTests(TestCase):
     """Tests for feedback reclassification"""
 
@@ -17,6 +17,7 @@ from email.header import decode_header
 from email.iterators import typed_subpart_iterator
 from email.utils import parseaddr
 
+from django.db import transaction
 from django.db.models import Q, Count
 from django.conf import settings
 from django.contrib.sites.models import Site
@@ -24,6 +25,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.urls import reverse
 from django.template.loader import render_to_string
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from ietf.dbtemplate.models import DBTemplate
 from ietf.doc.models import DocEvent, NewRevisionDocEvent
@@ -527,6 +529,10 @@ def list_eligible(nomcom=None, date=None, base_qs=None):
     if not base_qs:
         base_qs = Person.objects.all()
     eligibility_date = get_eligibility_date(nomcom, date)
+    snapshot = get_eligibility_snapshot(eligibility_date)
+    if snapshot:
+        # Disqualification depends on the roles held now, so it is not part of the snapshot
+        return remove_disqualified(base_qs.filter(pk__in=snapshot.entries.values('person')))
     if eligibility_date.year in range(2008,2020):
         return list_eligible_8713(date=eligibility_date, base_qs=base_qs)
     elif eligibility_date.year == 2020:
@@ -543,16 +549,18 @@ def decorate_volunteers_with_qualifications(volunteers, nomcom=None, date=None,
         base_qs = Person.objects.all()
     eligibility_date = get_eligibility_date(nomcom, date)
     if eligibility_date.year in (2021,2022):
-        three_of_five_qs, officer_qs, author_qs = get_8989_eligibility_querysets(eligibility_date, base_qs)
+        snapshot = get_eligibility_snapshot(eligibility_date)
+        if snapshot:
+            entries = snapshot.entries.filter(person__in=base_qs.filter(pk__in=[v.person_id for v in volunteers]))
+            paths = dict((e.person_id, (e.three_of_five, e.officer, e.author)) for e in entries)
+        else:
+            three_of_five_qs, officer_qs, author_qs = get_8989_eligibility_querysets(eligibility_date, base_qs)
         for v in volunteers:
-            qualifications = []
-            if v.person in three_of_five_qs:
-                qualifications.append('path_1')
-            if v.person in officer_qs:
-                qualifications.append('path_2')
-            if v.person in author_qs:
-                qualifications.append('path_3')
-            v.qualifications = "+".join(qualifications)
+            if snapshot:
+                met = paths.get(v.person_id, (False, False, False))
+            else:
+                met = (v.person in three_of_five_qs, v.person in officer_qs, v.person in author_qs)
+            v.qualifications = "+".join(path for path, path_met in zip(('path_1', 'path_2', 'path_3'), met) if path_met)
     else:
         for v in volunteers:
             v.qualifications = ''
@@ -635,6 +643,96 @@ def list_eligible_9389(date, base_qs=None):
     author_pks = author_qs.values_list('pk',flat=True)
     return remove_disqualified(Person.objects.filter(pk__in=set(three_of_five_pks).union(set(officer_pks)).union(set(author_pks))))
 
+def three_of_five_meetings(date):
+    """The meetings the three-of-five attendance path looks at for the given eligibility date"""
+    if date.year == 2020:
+        return Meeting.objects.filter(number__in=['102','103','104','105','106'])
+    return previous_five_meetings(date)
+
+def get_eligibility_path_querysets(date, base_qs=None):
+    """Return the (three_of_five, officer, author) querysets of the rules in force at date
+
+    A path that the rules of that year don't have is None. Nobody is
+    disqualified here, see remove_disqualified().
+    """
+    if not base_qs:
+        base_qs = Person.objects.all()
+    if date.year in range(2008,2021):
+        return three_of_five_eligible_8713(previous_five=three_of_five_meetings(date), queryset=base_qs), None, None
+    elif date.year in (2021,2022):
+        return get_8989_eligibility_querysets(date, base_qs)
+    elif date.year > 2022:
+        return get_9389_eligibility_querysets(date, base_qs)
+    else:
+        return None, None, None
+
+def get_eligibility_snapshot(date):
+    from ietf.nomcom.models import EligibilitySnapshot
+    return EligibilitySnapshot.objects.filter(date=date).first()
+
+def compute_eligibility_snapshot(date):
+    """Compute who meets each eligibility path at date, and store it as the snapshot for date
+
+    Replaces the entries of an existing snapshot for that date.
+    """
+    from ietf.nomcom.models import EligibilitySnapshot, EligibilitySnapshotEntry
+    paths = [set(qs.values_list('pk', flat=True)) if qs is not None else set()
+             for qs in get_eligibility_path_querysets(date)]
+    three_of_five, officer, author = paths
+    with transaction.atomic():
+        snapshot, _ = EligibilitySnapshot.objects.update_or_create(date=date, defaults=dict(time=timezone.now()))
+        snapshot.entries.all().delete()
+        EligibilitySnapshotEntry.objects.bulk_create(
+            [
+                EligibilitySnapshotEntry(
+                    snapshot=snapshot,
+                    person_id=pk,
+                    three_of_five=pk in three_of_five,
+                    officer=pk in officer,
+                    author=pk in author,
+                )
+                for pk in sorted(three_of_five | officer | author)
+            ],
+            batch_size=1000,
+        )
+    return snapshot
+
+def update_eligibility_snapshots_for_meetings(meetings):
+    """Refresh the attendance path of the snapshots whose meetings include any of the given ones
+
+    Meant to be called when attendance data for the meetings has changed.
+    Only the three-of-five flags are recomputed; people left without any
+    path are removed from the snapshot. Returns the updated snapshots.
+    """
+    from ietf.nomcom.models import EligibilitySnapshot, EligibilitySnapshotEntry
+    meeting_pks = set(m.pk for m in meetings)
+    if not meeting_pks:
+        return []
+    updated = []
+    earliest = min(m.date for m in meetings)
+    for snapshot in EligibilitySnapshot.objects.filter(date__gte=earliest):
+        if not meeting_pks & set(three_of_five_meetings(snapshot.date).values_list('pk', flat=True)):
+            continue
+        three_of_five_qs = get_eligibility_path_querysets(snapshot.date)[0]
+        three_of_five = set(three_of_five_qs.values_list('pk', flat=True)) if three_of_five_qs is not None else set()
+        with transaction.atomic():
+            entries = snapshot.entries.all()
+            entries.filter(three_of_five=True).exclude(person__in=three_of_five).update(three_of_five=False)
+            entries.filter(three_of_five=False, person__in=three_of_five).update(three_of_five=True)
+            existing = set(entries.values_list('person_id', flat=True))
+            EligibilitySnapshotEntry.objects.bulk_create(
+                [
+                    EligibilitySnapshotEntry(snapshot=snapshot, person_id=pk, three_of_five=True)
+                    for pk in sorted(three_of_five - existing)
+                ],
+                batch_size=1000,
+            )
+            entries.filter(three_of_five=False, officer=False, author=False).delete()
+            snapshot.time = timezone.now()
+            snapshot.save()
+        updated.append(snapshot)
+    return updated
+
 def get_eligibility_date(nomcom=None, date=None):
     if date:
         return date
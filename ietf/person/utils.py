@@ -53,6 +53,10 @@ def merge_persons(request, source, target, file=sys.stdout, verbose=False):
     merge_nominees(source, target)
     move_related_objects(source, target, file=file, verbose=verbose)
     dedupe_aliases(target)
+    # the authors, aliases and emails were moved with queryset update(),
+    # which the document search index doesn't see
+    from ietf.doc.models import DocumentAuthor, schedule_search_index_update
+    schedule_search_index_update(DocumentAuthor.objects.filter(person=target).values_list('document_id', flat=True))
 
     # copy other attributes
     for field in ('ascii','ascii_short', 'biography', 'photo', 'photo_thumb', 'name_from_draft'):
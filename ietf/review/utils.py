@@ -627,6 +627,7 @@ def extract_revision_ordered_review_assignments_for_documents_and_replaced(
         review_assignment_queryset.filter(
             review_request__doc__name__in=replacement_name_set
         )
+        .select_related("review_request__doc", "review_request__team", "review_request__type", "review")
         .order_by("-reviewed_rev", "-assigned_on", "-id")
         .iterator(chunk_size=2000)  # chunk_size not tested, using pre-Django 5 default value
     ):
@@ -724,10 +724,15 @@ CACHE_MIDDLEWARE_KEY_PREFIX = ''
 
 HTMLIZER_VERSION = 1
 HTMLIZER_URL_PREFIX = "/doc/html"
-HTMLIZER_CACHE_TIME = 60*60*24*14       # 14 days
-PDFIZER_CACHE_TIME = HTMLIZER_CACHE_TIME
 PDFIZER_URL_PREFIX = IDTRACKER_BASE_URL+"/doc/pdf"
 
+# Htmlized and pdfized documents are kept in a file cache keyed by their
+# source, see ietf/utils/artifact_cache.py.  The least recently used entries
+# are removed when the cache grows beyond ARTIFACT_CACHE_MAX_BYTES.  Set
+# ARTIFACT_CACHE_DIR in settings_local.py; it defaults to None, meaning no
+# caching, outside production.
+ARTIFACT_CACHE_MAX_BYTES = 20 * 1024**3
+
 # Email settings
 IPR_EMAIL_FROM = 'ietf-ipr@ietf.org'
 AUDIO_IMPORT_EMAIL = ['ietf@meetecho.com']
@@ -813,6 +818,13 @@ IDSUBMIT_CHECKER_CLASSES = (
 #    "ietf.submit.checkers.DraftYangvalidatorChecker",    
 )
 
+# The submission checkers are run concurrently, in at most this many threads
+IDSUBMIT_CHECKER_WORKERS = 4
+# Seconds a checker may run before its result is recorded as timed out
+IDSUBMIT_CHECKER_TIMEOUT = 300
+# Seconds to keep checker results in the cache, for resubmissions of the same file
+IDSUBMIT_CHECKER_CACHE_TIMEOUT = 24 * 60 * 60
+
 # Max time to allow for validation before a submission is subject to cancellation
 IDSUBMIT_MAX_VALIDATION_TIME = datetime.timedelta(minutes=20)
 
@@ -1212,20 +1224,6 @@ if 'CACHES' not in locals():
                 # No release-specific VERSION setting.
                 'KEY_PREFIX': 'ietf:dt',
             },
-            'htmlized': {
-                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-                'LOCATION': '/a/cache/datatracker/htmlized',
-                'OPTIONS': {
-                    'MAX_ENTRIES': 100000,      # 100,000
-                },
-            },
-            'pdfized': {
-                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-                'LOCATION': '/a/cache/datatracker/pdfized',
-                'OPTIONS': {
-                    'MAX_ENTRIES': 100000,      # 100,000
-                },
-            },
             'slowpages': {
                 'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
                 'LOCATION': '/a/cache/datatracker/slowpages',
@@ -1247,22 +1245,6 @@ if 'CACHES' not in locals():
             'sessions': {
                 'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
             },
-            'htmlized': {
-                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-                #'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-                'LOCATION': '/var/cache/datatracker/htmlized',
-                'OPTIONS': {
-                    'MAX_ENTRIES': 1000,
-                },
-            },
-            'pdfized': {
-                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-                #'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-                'LOCATION': '/var/cache/datatracker/pdfized',
-                'OPTIONS': {
-                    'MAX_ENTRIES': 1000,
-                },
-            },
             'slowpages': {
                 'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
                 #'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
@@ -1273,6 +1255,9 @@ if 'CACHES' not in locals():
             },
         }
 
+if 'ARTIFACT_CACHE_DIR' not in locals():
+    ARTIFACT_CACHE_DIR = '/a/cache/datatracker/artifacts' if SERVER_MODE == 'production' else None
+
 PUBLISH_IPR_STATES = ['posted', 'removed', 'removed_objfalse']
 
 # We provide a secret key only for test and development modes.  It's
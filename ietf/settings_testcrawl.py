@@ -31,22 +31,6 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         # No version-specific VERSION setting.
     },
-    'htmlized': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-        #'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': '/var/cache/datatracker/htmlized',
-        'OPTIONS': {
-            'MAX_ENTRIES': 100000,
-        },
-    },
-    'pdfized': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-        #'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': '/var/cache/datatracker/pdfized',
-        'OPTIONS': {
-            'MAX_ENTRIES': 100000,
-        },
-    },
     'slowpages': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
         #'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
@@ -6,6 +6,7 @@ from celery import shared_task
 from django.utils import timezone
 
 from ietf.meeting.models import Meeting
+from ietf.nomcom.utils import update_eligibility_snapshots_for_meetings
 from ietf.stats.utils import fetch_attendance_from_meetings
 from ietf.utils import log
 
@@ -25,3 +26,6 @@ def fetch_meeting_attendance_task():
                     meeting.number, meeting_stats.processed, meeting_stats.added, meeting_stats.total
                 )
             )
+        # check-ins and removed registrations are not counted in the stats, so refresh regardless
+        for snapshot in update_eligibility_snapshots_for_meetings(meetings):
+            log.log(f"Updated attendance in NomCom eligibility snapshot for {snapshot.date}")
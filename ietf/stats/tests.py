@@ -27,6 +27,7 @@ from ietf.person.factories import PersonFactory
 from ietf.person.models import Person, Email
 from ietf.name.models import FormalLanguageName, DocRelationshipName, CountryName
 from ietf.review.factories import ReviewRequestFactory, ReviewerSettingsFactory, ReviewAssignmentFactory
+from ietf.nomcom.models import EligibilitySnapshot
 from ietf.stats.models import MeetingRegistration, CountryAlias
 from ietf.stats.factories import MeetingRegistrationFactory
 from ietf.stats.tasks import fetch_meeting_attendance_task
@@ -326,8 +327,9 @@ class StatisticsTests(TestCase):
 
 
 class TaskTests(TestCase):
+    @patch("ietf.stats.tasks.update_eligibility_snapshots_for_meetings")
     @patch("ietf.stats.tasks.fetch_attendance_from_meetings")
-    def test_fetch_meeting_attendance_task(self, mock_fetch_attendance):
+    def test_fetch_meeting_attendance_task(self, mock_fetch_attendance, mock_update_snapshots):
         today = date_today()
         meetings = [
             MeetingFactory(type_id="ietf", date=today - datetime.timedelta(days=1)),
@@ -336,13 +338,20 @@ class TaskTests(TestCase):
         ]
         mock_fetch_attendance.return_value = [FetchStats(1,2,3), FetchStats(1,2,3)]
 
+        mock_update_snapshots.return_value = [EligibilitySnapshot(date=today)]
+
         fetch_meeting_attendance_task()
         self.assertEqual(mock_fetch_attendance.call_count, 1)
         self.assertCountEqual(mock_fetch_attendance.call_args[0][0], meetings[0:2])
+        # the eligibility snapshots are refreshed for the same meetings
+        self.assertEqual(mock_update_snapshots.call_count, 1)
+        self.assertCountEqual(mock_update_snapshots.call_args[0][0], meetings[0:2])
 
         # test handling of RuntimeError
         mock_fetch_attendance.reset_mock()
+        mock_update_snapshots.reset_mock()
         mock_fetch_attendance.side_effect = RuntimeError
         fetch_meeting_attendance_task()
         self.assertTrue(mock_fetch_attendance.called)
+        self.assertFalse(mock_update_snapshots.called)
         # Good enough that we got here without raising an exception
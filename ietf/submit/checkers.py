@@ -2,22 +2,92 @@
 # -*- coding: utf-8 -*-
 
 
+import functools
+import hashlib
 import io
+import json
 import os
 import re
+import shlex
 import shutil
 import sys
 import tempfile
+import threading
+import time
 
-from xym import xym
+from contextlib import contextmanager
 from django.conf import settings
+from django.core.cache import cache
 
 import debug                            # pyflakes:ignore
 
 from ietf.utils.log import log, assertion
 from ietf.utils.models import VersionInfo
 from ietf.utils.pipe import pipe
-from ietf.utils.test_runner import set_coverage_checking
+from ietf.utils.timezone import date_today
+
+
+def tool_versions(*commands):
+    """Return the recorded versions of the given commands, see update_external_command_info"""
+    versions = dict(VersionInfo.objects.filter(command__in=commands).values_list('command', 'version'))
+    return [ versions.get(c, '') for c in commands ]
+
+class _CheckerDeadline(threading.local):
+    # time.time() by which the checker running in this thread must finish
+    deadline = None
+
+_checker_deadline = _CheckerDeadline()
+
+@contextmanager
+def checker_deadline(timeout):
+    """Give the checker run inside this block timeout seconds for all its commands"""
+    saved = _checker_deadline.deadline
+    _checker_deadline.deadline = time.time() + timeout
+    try:
+        yield
+    finally:
+        _checker_deadline.deadline = saved
+
+def checker_time_left():
+    """The timeout for the next command the running checker passes to pipe()
+
+    Within checker_deadline() this is what is left of the checker's time,
+    so a checker running several commands is stopped once its time is up.
+    """
+    if _checker_deadline.deadline is None:
+        return settings.IDSUBMIT_CHECKER_TIMEOUT
+    return max(0, _checker_deadline.deadline - time.time())
+
+def cached_check(cache_result=lambda result: True):
+    """Cache the results of a checker method by the content of the checked file
+
+    Resubmissions of the same files, and retries of a submission, then don't
+    run the external tools again.  The key includes the file name, which
+    appears in the messages, the versions of the tools from the checker's
+    cache_version(), and today's date, since some checks depend on it.
+    Results for which cache_result(result) is false are not cached.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, path):
+            try:
+                with open(path, 'rb') as file:
+                    digest = hashlib.sha256(file.read()).hexdigest()
+            except OSError:
+                return method(self, path)
+            parts = [ self.__class__.__name__, method.__name__, os.path.basename(path), digest,
+                      date_today().isoformat() ] + [ str(p) for p in self.cache_version() ]
+            key = 'submit:check:%s' % hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+            result = cache.get(key)
+            if result is None:
+                result = method(self, path)
+                if cache_result(result):
+                    cache.set(key, result, settings.IDSUBMIT_CHECKER_CACHE_TIMEOUT)
+            else:
+                log("Using cached %s result for %s" % (self.name, os.path.basename(path)))
+            return result
+        return wrapper
+    return decorator
 
 class DraftSubmissionChecker(object):
     name = ""
@@ -64,6 +134,16 @@ class DraftIdnitsChecker(object):
             options.append("--nitcount")
         self.options = ' '.join(options)
 
+    def cache_version(self):
+        try:
+            stat = os.stat(settings.IDSUBMIT_IDNITS_BINARY)
+            binary = (stat.st_mtime, stat.st_size)
+        except OSError:
+            binary = None
+        return tool_versions("idnits") + [ settings.IDSUBMIT_IDNITS_BINARY, binary, self.options ]
+
+    # don't remember failures to run idnits
+    @cached_check(cache_result=lambda result: not result[1].startswith("idnits error: "))
     def check_file_txt(self, path):
         """
         Run an idnits check, and return a passed/failed indication, a message,
@@ -80,7 +160,7 @@ class DraftIdnitsChecker(object):
         
 
         cmd = "%s %s %s" % (settings.IDSUBMIT_IDNITS_BINARY, self.options, path)
-        code, out, err = pipe(cmd)
+        code, out, err = pipe(cmd, timeout=checker_time_left())
         out = out.decode('utf-8')
         err = err.decode('utf-8')
         if code != 0 or out == "":
@@ -117,11 +197,29 @@ class DraftIdnitsChecker(object):
 
         return passed, message, errors, warnings, info
 
+# Runs xym in a process of its own, as it writes its messages to sys.stdout
+# and sys.stderr, and prints the extracted models and messages as JSON
+XYM_EXTRACT_SCRIPT = """
+import contextlib, io, json, sys
+from xym import xym
+path, workdir = sys.argv[1:]
+out, err = io.StringIO(), io.StringIO()
+extractor = xym.YangModuleExtractor(path, workdir, strict=True, strict_examples=False, debug_level=1)
+with open(path) as file, contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+    extractor.extract_yang_model_text(file.read())
+    models = extractor.get_extracted_models(False, True)
+json.dump({"models": models, "out": out.getvalue(), "err": err.getvalue()}, sys.stdout)
+"""
+
 class DraftYangChecker(object):
 
     name = "yang validation"
     symbol = '<i class="bi bi-yin-yang"></i>'
 
+    def cache_version(self):
+        return tool_versions("xym", "pyang", "yanglint") + [ settings.SUBMIT_PYANG_COMMAND, settings.SUBMIT_YANGLINT_COMMAND ]
+
+    @cached_check()
     def check_file_txt(self, path):
         name = os.path.basename(path)
         workdir = tempfile.mkdtemp()
@@ -134,34 +232,18 @@ class DraftYangChecker(object):
         model_list = []
         info = {'checker': self.name, 'items': [], 'code': {}}
 
-        extractor = xym.YangModuleExtractor(path, workdir, strict=True, strict_examples=False, debug_level=1)
         if not os.path.exists(path):
             return None, "%s: No such file or directory: '%s'"%(name.capitalize(), path), errors, warnings, info
-        with open(path) as file:
-            out = ""
-            err = ""
-            code = 0
-            try:
-                # This places the yang models as files in workdir
-                saved_stdout = sys.stdout
-                saved_stderr = sys.stderr
-                sys.stdout = io.StringIO()
-                sys.stderr = io.StringIO()
-                extractor.extract_yang_model_text(file.read())
-                model_list = extractor.get_extracted_models(False, True)
-                out = sys.stdout.getvalue()
-                err = sys.stderr.getvalue()
-                # signature change in xym:
-            except Exception as exc:
-                sys.stdout = saved_stdout
-                sys.stderr = saved_stderr
-                msg = "Exception when running xym on %s: %s" % (name, exc)
-                log(msg)
-                raise
-                return None, msg, 0, 0, info
-            finally:
-                sys.stdout = saved_stdout
-                sys.stderr = saved_stderr
+        # This places the yang models as files in workdir
+        cmd = ' '.join(shlex.quote(w) for w in [sys.executable, '-c', XYM_EXTRACT_SCRIPT, path, workdir])
+        code, out, err = pipe(cmd, timeout=checker_time_left())
+        if code != 0:
+            err = err.decode('utf-8').strip()
+            msg = "Exception when running xym on %s: %s" % (name, err.splitlines()[-1] if err else "exit code %s" % code)
+            log(msg)
+            raise RuntimeError(msg)
+        extracted = json.loads(out)
+        model_list, out, err = extracted["models"], extracted["out"], extracted["err"]
         if not model_list:
             # Found no yang models, don't deliver any YangChecker result
             return None, "", 0, 0, info
@@ -211,11 +293,12 @@ class DraftYangChecker(object):
                 command = [ w for w in cmd_template.split() if not '=' in w ][0]
                 cmd_version = VersionInfo.objects.get(command=command).version
                 cmd = cmd_template.format(libs=modpath, model=path)
-                venv_path = os.environ.get('VIRTUAL_ENV') or os.path.join(os.getcwd(), 'env')
+                env = dict(os.environ)
+                venv_path = env.get('VIRTUAL_ENV') or os.path.join(os.getcwd(), 'env')
                 venv_bin = os.path.join(venv_path, 'bin')
-                if not venv_bin in os.environ.get('PATH', '').split(':'):
-                    os.environ['PATH'] = os.environ.get('PATH', '') + ":" + venv_bin
-                code, out, err = pipe(cmd)
+                if not venv_bin in env.get('PATH', '').split(':'):
+                    env['PATH'] = env.get('PATH', '') + ":" + venv_bin
+                code, out, err = pipe(cmd, timeout=checker_time_left(), env=env)
                 out = out.decode('utf-8')
                 err = err.decode('utf-8')
                 if code > 0 or len(err.strip()) > 0 :
@@ -241,15 +324,15 @@ class DraftYangChecker(object):
                 message += "%s: %s:\n%s\n" % (cmd_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
 
                 # yanglint
-                set_coverage_checking(False) # we can't count the following as it may or may not be run, depending on setup
-                if settings.SUBMIT_YANGLINT_COMMAND and os.path.exists(settings.YANGLINT_BINARY):
+                # we can't count the following as it may or may not be run, depending on setup
+                if settings.SUBMIT_YANGLINT_COMMAND and os.path.exists(settings.YANGLINT_BINARY): # pragma: no cover
                     cmd_template = settings.SUBMIT_YANGLINT_COMMAND
                     command = [ w for w in cmd_template.split() if not '=' in w ][0]
                     cmd_version = VersionInfo.objects.get(command=command).version
                     cmd = cmd_template.format(model=path, rfclib=settings.SUBMIT_YANG_RFC_MODEL_DIR, tmplib=workdir,
                         draftlib=settings.SUBMIT_YANG_DRAFT_MODEL_DIR, ianalib=settings.SUBMIT_YANG_IANA_MODEL_DIR,
                         cataloglib=settings.SUBMIT_YANG_CATALOG_MODEL_DIR, )
-                    code, out, err = pipe(cmd)
+                    code, out, err = pipe(cmd, timeout=checker_time_left())
                     out = out.decode('utf-8')
                     err = err.decode('utf-8')
                     if code > 0 or len(err.strip()) > 0:
@@ -265,7 +348,6 @@ class DraftYangChecker(object):
                                     pass
                     #passed = passed and code == 0 # For the submission tool.  Yang checks always pass
                     message += "%s: %s:\n%s\n" % (cmd_version, cmd_template, out+"No validation errors\n" if (code == 0 and len(err) == 0) else out+err)
-                set_coverage_checking(True)
             else:
                 errors += 1
                 message += "No such file: %s\nPossible mismatch between extracted xym file name and returned module name?\n" % (path)
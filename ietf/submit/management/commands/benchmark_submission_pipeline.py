@@ -0,0 +1,226 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+# This command measures how many submissions the asynchronous submission
+# processing (process_uploaded_submission_task) can handle. It creates N
+# synthetic text and XML drafts from the ietf/submit/test_submission.*
+# templates, puts them in the staging directory the way the upload view does,
+# and processes them, either in a pool of local processes or by sending them
+# to the running celery workers. It then reports, as JSON, the throughput and
+# the latency percentiles of each stage, from Submission.timings.
+#
+# The submissions, their staging files and their authors are removed at the
+# end, unless --keep is given.
+
+import datetime
+import glob
+import json
+import math
+import multiprocessing
+import os
+import secrets
+import socket
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+from django.test import override_settings
+from django.utils import timezone
+
+import debug                            # pyflakes:ignore
+
+from ietf.person.factories import PersonFactory
+from ietf.submit.models import Submission
+from ietf.submit.tasks import process_uploaded_submission_task
+from ietf.submit.utils import create_submission_event, staging_path, timed_stage
+from ietf.utils.timezone import date_today
+
+
+PERCENTILES = [50, 90, 99]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the processing of uploaded submissions with synthetic drafts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--count', type=int, default=20,
+                            help='number of submissions (default 20)')
+        parser.add_argument('--formats', choices=['txt', 'xml', 'both'], default='both',
+                            help='submit text drafts, xml drafts, or alternately each (default both)')
+        parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help='number of local processes working on the submissions (default 1)')
+        parser.add_argument('--celery', action='store_true',
+                            help='send the submissions to the running celery workers instead of processing them locally')
+        parser.add_argument('--timeout', type=int, default=3600,
+                            help='seconds to wait for the celery workers to finish (default 3600)')
+        parser.add_argument('--skip-checkers', action='store_true',
+                            help="don't run the submission checkers (idnits, yang); only for local processing")
+        parser.add_argument('-o', '--output', default=None,
+                            help='file to write the JSON report to (default stdout)')
+        parser.add_argument('--keep', action='store_true',
+                            help='keep the synthetic submissions, their files and their authors')
+
+    def handle(self, *args, **options):
+        if socket.gethostname().split('.')[0] in ['core3', 'ietfa', 'ietfb', 'ietfc', ]:
+            raise EnvironmentError("Refusing to create benchmark submissions on a production server")
+        if options['count'] < 1 or options['jobs'] < 1:
+            raise CommandError('The number of submissions and jobs must be positive')
+        if options['celery'] and options['skip_checkers']:
+            raise CommandError('--skip-checkers only applies to local processing')
+
+        run = secrets.token_hex(3)
+        formats = {'txt': ['txt'], 'xml': ['xml'], 'both': ['txt', 'xml']}[options['formats']]
+        submissions = []
+        authors = []
+        try:
+            for i in range(options['count']):
+                author = PersonFactory()
+                authors.append(author)
+                submissions.append(create_synthetic_submission(f'draft-benchmark-{run}-{i}', formats[i % len(formats)], author))
+            report = {
+                'parameters': {
+                    key: options[key] for key in ['count', 'formats', 'jobs', 'celery', 'skip_checkers']
+                },
+            }
+            if options['celery']:
+                report.update(self.process_with_celery(submissions, options['timeout']))
+            else:
+                with override_settings(**({'IDSUBMIT_CHECKER_CLASSES': ()} if options['skip_checkers'] else {})):
+                    report.update(self.process_locally(submissions, options['jobs']))
+            report.update(stage_report(submissions, report.pop('queued')))
+        finally:
+            if not options['keep']:
+                remove_synthetic_submissions(submissions, authors)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def process_locally(self, submissions, jobs):
+        pks = [s.pk for s in submissions]
+        queued = timezone.now()
+        beg_time = time.time()
+        if jobs > 1:
+            connections.close_all()  # each worker opens a connection of its own
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork')) as executor:
+                list(executor.map(_process, pks))
+        else:
+            for pk in pks:
+                _process(pk)
+        return {'queued': queued, 'wall_time': time.time() - beg_time}
+
+    def process_with_celery(self, submissions, timeout):
+        pks = [s.pk for s in submissions]
+        queued = timezone.now()
+        beg_time = time.time()
+        for pk in pks:
+            process_uploaded_submission_task.delay(pk)
+        while Submission.objects.filter(pk__in=pks, state_id='validating').exists():
+            if time.time() - beg_time > timeout:
+                raise CommandError(f'The celery workers did not process the submissions within {timeout} seconds')
+            time.sleep(1)
+        return {'queued': queued, 'wall_time': time.time() - beg_time}
+
+
+def _process(pk):
+    # the task itself, run in this process rather than by a celery worker
+    process_uploaded_submission_task(pk)
+
+
+def create_synthetic_submission(name, ext, author):
+    """Create a submission in the validating state, with its draft in the staging directory
+
+    This does what the upload view does for an uploaded draft. The time
+    spent is recorded as the 'upload' timing.
+    """
+    submission = Submission(name=name, rev='00', state_id='validating', file_types=f'.{ext}',
+                            submission_date=date_today(), submitter=author.formatted_email())
+    with timed_stage(submission, 'upload'):
+        submission.save()
+        with staging_path(name, '00', ext).open('w') as f:
+            f.write(synthetic_draft(name, ext, author))
+        create_submission_event(None, submission, desc='Uploaded submission')
+    submission.save()
+    return submission
+
+
+def synthetic_draft(name, ext, author):
+    """Fill in the test_submission.txt or .xml template"""
+    with open(os.path.join(settings.BASE_DIR, 'submit', f'test_submission.{ext}')) as f:
+        template = f.read()
+    today = date_today()
+    surname = author.ascii_parts()[3]
+    return template % dict(
+        date=today.strftime('%d %B %Y'),
+        expiration=(today + datetime.timedelta(days=100)).strftime('%d %B, %Y'),
+        year=today.strftime('%Y'),
+        month=today.strftime('%B'),
+        day=today.strftime('%d'),
+        name=f'{name}-00',
+        group='',
+        author=author.ascii,
+        asciiAuthor=author.ascii,
+        initials=author.initials(),
+        surname=surname,
+        firstpagename=f'{author.initials()} {surname}',
+        asciiSurname=surname,
+        email=author.email().address.lower(),
+        title='Test Document',
+    )
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    result = {f'p{p}': values[max(0, math.ceil(p / 100 * len(values)) - 1)] for p in PERCENTILES}
+    result['max'] = values[-1]
+    result['mean'] = sum(values) / len(values)
+    return result
+
+
+def stage_report(submissions, queued):
+    """Throughput and per-stage latencies of the processed submissions
+
+    The latency of a submission is the time from when it was queued to its
+    last event, which is added when processing has finished.
+    """
+    processed = Submission.objects.filter(
+        pk__in=[s.pk for s in submissions],
+    ).annotate(
+        finished=Max('submissionevent__time'),
+    )
+    stages = {}
+    latencies = []
+    states = {}
+    for submission in processed.filter(finished__isnull=False):
+        states[submission.state_id] = states.get(submission.state_id, 0) + 1
+        for stage, seconds in submission.timings.items():
+            stages.setdefault(stage, []).append(seconds)
+        latencies.append((submission.finished - queued).total_seconds())
+    elapsed = max(latencies) if latencies else 0
+    return {
+        'states': states,
+        'throughput_per_minute': len(latencies) / elapsed * 60 if elapsed > 0 else None,
+        'latency': percentiles(latencies),
+        'stages': {stage: percentiles(seconds) for stage, seconds in sorted(stages.items())},
+    }
+
+
+def remove_synthetic_submissions(submissions, authors):
+    for submission in submissions:
+        for path in glob.glob(str(staging_path(submission.name, submission.rev, '.*'))):
+            os.unlink(path)
+    Submission.objects.filter(pk__in=[s.pk for s in submissions]).delete()
+    for author in authors:
+        user = author.user
+        author.delete()
+        if user:
+            user.delete()
@@ -0,0 +1,22 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+from django.db import migrations
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("submit", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submission",
+            name="timings",
+            field=jsonfield.fields.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Seconds spent in each stage of processing the submission.",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("submit", "0002_submission_timings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submissioncheck",
+            name="timed_out",
+            field=models.BooleanField(
+                default=False,
+                help_text="The checker didn't finish within the time allowed.",
+            ),
+        ),
+    ]
@@ -61,6 +61,8 @@ class Submission(models.Model):
 
     draft = ForeignKey(Document, null=True, blank=True)
 
+    timings = jsonfield.JSONField(default=dict, blank=True, help_text="Seconds spent in each stage of processing the submission.")
+
     def __str__(self):
         return "%s-%s" % (self.name, self.rev)
 
@@ -137,9 +139,10 @@ class SubmissionCheck(models.Model):
     warnings = models.IntegerField(null=True, blank=True, default=None)
     items = jsonfield.JSONField(null=True, blank=True, default='{}')
     symbol = models.CharField(max_length=64, default='')
+    timed_out = models.BooleanField(default=False, help_text="The checker didn't finish within the time allowed.")
     #
     def __str__(self):
-        return "%s submission check: %s: %s" % (self.checker, 'Passed' if self.passed else 'Failed', self.message[:48]+'...')
+        return "%s submission check: %s: %s" % (self.checker, 'Timed out' if self.timed_out else 'Passed' if self.passed else 'Failed', self.message[:48]+'...')
     def has_warnings(self):
         return self.warnings != '[]'
     def has_errors(self):
@@ -64,6 +64,7 @@ class SubmissionResource(ModelResource):
             "submission_date": ALL,
             "submitter": ALL,
             "xml_version": ALL,
+            "timings": ALL,
             "state": ALL_WITH_RELATIONS,
             "group": ALL_WITH_RELATIONS,
             "draft": ALL_WITH_RELATIONS,
@@ -107,6 +108,7 @@ class SubmissionCheckResource(ModelResource):
             "errors": ALL,
             "warnings": ALL,
             "items": ALL,
+            "timed_out": ALL,
             "submission": ALL_WITH_RELATIONS,
         }
 api.submit.register(SubmissionCheckResource())
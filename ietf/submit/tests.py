@@ -5,10 +5,13 @@
 import datetime
 import email
 import io
+import json
 import mock
 import os
 import re
 import sys
+import threading
+import time
 
 from io import StringIO
 from pyquery import PyQuery
@@ -18,6 +21,8 @@ from pathlib import Path
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db import transaction
 from django.forms import ValidationError
 from django.test import override_settings
@@ -31,7 +36,8 @@ from ietf.submit.utils import (expirable_submissions, expire_submission, find_su
                                post_submission, validate_submission_name, validate_submission_rev,
                                process_and_accept_uploaded_submission, SubmissionError, process_submission_text,
                                process_submission_xml, process_uploaded_submission, 
-                               process_and_validate_submission)
+                               process_and_validate_submission, parse_submission_xml, xml_draft_from_tree,
+                               render_missing_formats, apply_checkers)
 from ietf.doc.factories import (DocumentFactory, WgDraftFactory, IndividualDraftFactory,
                                 ReviewFactory, WgRfcFactory)
 from ietf.doc.models import ( Document, DocEvent, State,
@@ -46,6 +52,7 @@ from ietf.message.models import Message
 from ietf.name.models import FormalLanguageName
 from ietf.person.models import Person
 from ietf.person.factories import UserFactory, PersonFactory, EmailFactory
+from ietf.submit.checkers import cached_check, checker_time_left
 from ietf.submit.factories import SubmissionFactory, SubmissionExtResourceFactory
 from ietf.submit.forms import SubmissionBaseUploadForm, SubmissionAutoUploadForm
 from ietf.submit.models import Submission, Preapproval, SubmissionExtResource
@@ -54,6 +61,7 @@ from ietf.submit.tasks import cancel_stale_submissions, process_and_accept_uploa
 from ietf.utils.accesstoken import generate_access_token
 from ietf.utils.mail import outbox, empty_outbox, get_payload_text
 from ietf.utils.models import VersionInfo
+from ietf.utils.pipe import pipe
 from ietf.utils.test_utils import login_testing_unauthorized, TestCase
 from ietf.utils.timezone import date_today
 from ietf.utils.draft import PlaintextDraft
@@ -3381,6 +3389,18 @@ class AsyncSubmissionTests(BaseSubmitTestCase):
         self.assertIsNone(output["formal_languages"])
         self.assertEqual(output["xml_version"], "3")
 
+        # same result from a tree that was parsed once for metadata and rendering
+        submission = SubmissionFactory(name="draft-somebody-test", rev="00")
+        xmltree, xml_version = parse_submission_xml(submission)
+        self.assertIn("parse_xml", submission.timings)
+        self.assertEqual(
+            process_submission_xml("draft-somebody-test", "00", xml_draft_from_tree(xmltree, xml_version)),
+            output,
+        )
+        render_missing_formats(submission, xmltree, xml_version)
+        self.assertTrue((Path(settings.IDSUBMIT_STAGING_PATH) / "draft-somebody-test-00.html").exists())
+        self.assertIn("prep_xml", submission.timings)
+
         # Should behave on missing or partial <date> elements
         xml_path.write_text(re.sub(r"<date.+>", "", xml_contents))  # strip <date...> entirely
         output = process_submission_xml("draft-somebody-test", "00")
@@ -3517,14 +3537,21 @@ class AsyncSubmissionTests(BaseSubmitTestCase):
             state_id="validating",
             file_types=".xml,.txt",
         )
-        with mock.patch("ietf.submit.utils.process_submission_xml", return_value=xml_data):
-            with mock.patch("ietf.submit.utils.process_submission_text", return_value=text_data):
-                with mock.patch("ietf.submit.utils.render_missing_formats") as mock_render:
-                    with mock.patch("ietf.submit.utils.apply_checkers") as mock_checkers:
-                        process_and_validate_submission(submission)
-        self.assertTrue(mock_render.called)
+        with mock.patch("ietf.submit.utils.parse_submission_xml", return_value=(mock.Mock(), "3")) as mock_parse, \
+                mock.patch("ietf.submit.utils.xml_draft_from_tree"), \
+                mock.patch("ietf.submit.utils.process_submission_xml", return_value=xml_data), \
+                mock.patch("ietf.submit.utils.process_submission_text", return_value=text_data), \
+                mock.patch("ietf.submit.utils.render_missing_formats") as mock_render, \
+                mock.patch("ietf.submit.utils.apply_checkers") as mock_checkers:
+            process_and_validate_submission(submission)
+        self.assertEqual(mock_parse.call_count, 1)
+        # the parsed tree is used for rendering
+        self.assertEqual(mock_render.call_args[0][1:], mock_parse.return_value)
         self.assertTrue(mock_checkers.called)
         submission = Submission.objects.get(pk=submission.pk)
+        self.assertIn("process_txt", submission.timings)
+        self.assertIn("checkers", submission.timings)
+        self.assertIn("save_metadata", submission.timings)
         self.assertEqual(submission.title, text_data["title"])
         self.assertEqual(submission.abstract, text_data["abstract"])
         self.assertEqual(submission.authors, xml_data["authors"])
@@ -3565,6 +3592,26 @@ class AsyncSubmissionTests(BaseSubmitTestCase):
         self.assertEqual(stale_submission.state_id, 'cancel')
         self.assertEqual(stale_submission.submissionevent_set.count(), 2)
 
+    def test_benchmark_submission_pipeline(self):
+        output = StringIO()
+        call_command('benchmark_submission_pipeline', count=2, skip_checkers=True, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['parameters']['count'], 2)
+        self.assertEqual(sum(report['states'].values()), 2)
+        self.assertNotIn('validating', report['states'])
+        # one text and one xml draft, so the xml stages are timed too
+        for stage in ['upload', 'parse_xml', 'render_html', 'process_txt', 'save_metadata', 'checkers']:
+            self.assertIn(stage, report['stages'])
+        for timings in [report['latency']] + list(report['stages'].values()):
+            self.assertCountEqual(timings.keys(), ['p50', 'p90', 'p99', 'max', 'mean'])
+        self.assertGreater(report['latency']['max'], 0)
+        # the synthetic submissions and their files are removed
+        self.assertFalse(Submission.objects.filter(name__startswith='draft-benchmark-').exists())
+        self.assertEqual(os.listdir(self.staging_dir), [])
+
+        with self.assertRaises(CommandError):
+            call_command('benchmark_submission_pipeline', celery=True, skip_checkers=True, stdout=output)
+
 
 class ApiSubmitTests(BaseSubmitTestCase):
     def setUp(self):
@@ -3750,6 +3797,131 @@ class PostSubmissionTests(BaseSubmitTestCase):
         self.assertEqual(args[1], mock_find_filenames.return_value)
 
 
+class FakeFastChecker:
+    name = "fast check"
+    symbol = ""
+
+    def check_file_txt(self, path):
+        return True, "fine", 0, 1, {"checker": self.name, "items": [], "code": {}}
+
+
+class FakeSlowChecker:
+    name = "slow check"
+    symbol = ""
+    release = threading.Event()
+
+    def check_file_txt(self, path):
+        self.release.wait(10)
+        return True, "too late", 0, 0, {}
+
+
+class FakeKilledChecker:
+    name = "killed check"
+    symbol = ""
+
+    def check_file_txt(self, path):
+        return pipe("sleep 10", timeout=0.1)
+
+
+class FakeSequentialChecker:
+    name = "sequential check"
+    symbol = ""
+    finished = []
+
+    def check_file_txt(self, path):
+        # each command alone is within the timeout, but not all of them
+        for i in range(4):
+            pipe("sleep 0.3", timeout=checker_time_left())
+            self.finished.append(i)
+        return True, "too late", 0, 0, {}
+
+
+class FakeXmlOnlyChecker:
+    name = "xml check"
+    symbol = ""
+
+    def check_file_xml(self, path):
+        raise AssertionError("there is no xml file to check")
+
+
+class ApplyCheckersTests(BaseSubmitTestCase):
+    @override_settings(
+        IDSUBMIT_CHECKER_CLASSES=(
+            "ietf.submit.tests.FakeSlowChecker",
+            "ietf.submit.tests.FakeFastChecker",
+            "ietf.submit.tests.FakeKilledChecker",
+            "ietf.submit.tests.FakeSequentialChecker",
+            "ietf.submit.tests.FakeXmlOnlyChecker",
+        ),
+        IDSUBMIT_CHECKER_WORKERS=5,
+        IDSUBMIT_CHECKER_TIMEOUT=0.5,
+    )
+    def test_apply_checkers(self):
+        submission = SubmissionFactory()
+        try:
+            apply_checkers(submission, {"txt": "draft.txt"})
+        finally:
+            FakeSlowChecker.release.set()
+        checks = {c.checker: c for c in submission.checks.all()}
+        self.assertCountEqual(checks, ["slow check", "fast check", "killed check", "sequential check"])
+        self.assertTrue(checks["fast check"].passed)
+        self.assertFalse(checks["fast check"].timed_out)
+        self.assertEqual(checks["fast check"].warnings, 1)
+        for name in ["slow check", "killed check", "sequential check"]:
+            self.assertTrue(checks[name].timed_out)
+            self.assertFalse(checks[name].passed)
+            self.assertIn("did not finish", checks[name].message)
+        # the sequential checker's second command was killed when its time was up
+        time.sleep(0.5)
+        self.assertEqual(FakeSequentialChecker.finished, [0])
+
+
+class CountingChecker:
+    name = "counting check"
+    version = "1.0"
+
+    def __init__(self):
+        self.calls = 0
+
+    def cache_version(self):
+        return [self.version]
+
+    @cached_check(cache_result=lambda result: result[0] is not None)
+    def check_file_txt(self, path):
+        self.calls += 1
+        with open(path) as file:
+            text = file.read()
+        return (None if "fail" in text else True), text, 0, 0, {}
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CachedCheckTests(BaseSubmitTestCase):
+    def test_cached_check(self):
+        path = Path(self.staging_dir) / "draft-somebody-test-00.txt"
+        path.write_text("some text")
+        checker = CountingChecker()
+        result = checker.check_file_txt(str(path))
+        self.assertEqual(result[:2], (True, "some text"))
+        self.assertEqual(checker.check_file_txt(str(path)), result)
+        self.assertEqual(checker.calls, 1)
+        # changed content
+        path.write_text("other text")
+        self.assertEqual(checker.check_file_txt(str(path))[1], "other text")
+        self.assertEqual(checker.calls, 2)
+        # new tool version
+        checker.version = "1.1"
+        checker.check_file_txt(str(path))
+        self.assertEqual(checker.calls, 3)
+        # results the checker doesn't want cached
+        path.write_text("fail")
+        checker.check_file_txt(str(path))
+        checker.check_file_txt(str(path))
+        self.assertEqual(checker.calls, 5)
+        # a missing file is passed on to the checker
+        with self.assertRaises(FileNotFoundError):
+            checker.check_file_txt(str(path) + ".missing")
+
+
 class ValidateSubmissionFilenameTests(BaseSubmitTestCase):
     def test_validate_submission_name(self):
         # This test does not need BaseSubmitTestCase, it could use TestCase
@@ -2,15 +2,20 @@
 # Copyright The IETF Trust 2011-2020, All Rights Reserved
 
 
+import copy
 import datetime
 import io
 import os
 import pathlib
 import re
+import subprocess
 import time
 import traceback
 import xml2rfc
 
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from lxml import etree
 from pathlib import Path
 from shutil import move
 from typing import Optional, Union  # pyflakes:ignore
@@ -19,7 +24,7 @@ from unidecode import unidecode
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email 
-from django.db import transaction
+from django.db import connection, transaction
 from django.http import HttpRequest     # pyflakes:ignore
 from django.utils.module_loading import import_string
 from django.contrib.auth.models import AnonymousUser
@@ -41,6 +46,7 @@ from ietf.ietfauth.utils import has_role
 from ietf.name.models import StreamName, FormalLanguageName
 from ietf.person.models import Person, Email
 from ietf.community.utils import update_name_contains_indexes_with_new_doc
+from ietf.submit.checkers import checker_deadline
 from ietf.submit.mail import ( announce_to_lists, announce_new_version, announce_to_authors,
     send_approval_request, send_submission_confirmation, announce_new_wg_00, send_manual_post_request )
 from ietf.submit.models import ( Submission, SubmissionEvent, Preapproval, DraftSubmissionStateName,
@@ -862,31 +868,81 @@ def fill_in_submission(form, submission, authors, abstract, file_size):
         submission.formal_languages.set(FormalLanguageName.objects.filter(slug__in=form.parsed_draft.get_formal_languages()))
     set_extresources_from_existing_draft(submission)
 
-def apply_checker(checker, submission, file_name):
-    def apply_check(submission, checker, method, fn):
-        func = getattr(checker, method)
-        passed, message, errors, warnings, info = func(fn)
-        check = SubmissionCheck(submission=submission, checker=checker.name, passed=passed,
-                                message=message, errors=errors, warnings=warnings, items=info,
-                                symbol=checker.symbol)
-        check.save()
+def run_checker(checker, file_name):
+    """Run checker on the first file it can check and return the result as an unsaved SubmissionCheck
+
+    Returns None if the checker can't check any of the files.
+    """
     # ordered list of methods to try
     for method in ("check_fragment_xml", "check_file_xml", "check_fragment_txt", "check_file_txt", ):
         ext = method[-3:]
         if hasattr(checker, method) and ext in file_name:
-            apply_check(submission, checker, method, file_name[ext])
-            break
+            func = getattr(checker, method)
+            try:
+                with checker_deadline(settings.IDSUBMIT_CHECKER_TIMEOUT):
+                    passed, message, errors, warnings, info = func(file_name[ext])
+            except subprocess.TimeoutExpired:
+                # a command run by the checker was killed, see pipe()
+                return timed_out_check(checker)
+            return SubmissionCheck(checker=checker.name, passed=passed,
+                                   message=message, errors=errors, warnings=warnings, items=info,
+                                   symbol=checker.symbol)
+    return None
+
+def timed_out_check(checker):
+    return SubmissionCheck(checker=checker.name, passed=False, timed_out=True,
+                           message=f"The {checker.name} did not finish within {settings.IDSUBMIT_CHECKER_TIMEOUT} seconds",
+                           items={'checker': checker.name, 'items': [], 'code': {}},
+                           symbol=checker.symbol)
+
+def apply_checker(checker, submission, file_name):
+    check = run_checker(checker, file_name)
+    if check is not None:
+        check.submission = submission
+        check.save()
+    return check
+
+def _run_checker_in_thread(checker, file_name):
+    lap = time.time()
+    try:
+        return run_checker(checker, file_name), time.time() - lap
+    finally:
+        connection.close()  # the thread's own connection, if the checker used the database
 
 def apply_checkers(submission, file_name):
-    # run submission checkers
+    """Run the submission checkers concurrently and save their results
+
+    At most IDSUBMIT_CHECKER_WORKERS checkers run at a time. A checker that
+    hasn't finished IDSUBMIT_CHECKER_TIMEOUT seconds after it started is
+    recorded as timed out, and its thread is left to finish on its own;
+    the commands run by a checker are killed once it has run for
+    IDSUBMIT_CHECKER_TIMEOUT seconds (see checker_deadline()), which stops
+    the checker.
+    """
     mark = time.time()
-    for checker_path in settings.IDSUBMIT_CHECKER_CLASSES:
-        lap = time.time()
-        checker_class = import_string(checker_path)
-        checker = checker_class()
-        apply_checker(checker, submission, file_name)
-        tau = time.time() - lap
-        log.log(f"ran {checker.__class__.__name__} ({tau:.3}s) for {file_name}")
+    checkers = [import_string(checker_path)() for checker_path in settings.IDSUBMIT_CHECKER_CLASSES]
+    workers = max(1, min(settings.IDSUBMIT_CHECKER_WORKERS, len(checkers)))
+    timeout = settings.IDSUBMIT_CHECKER_TIMEOUT
+    checks = []
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(_run_checker_in_thread, checker, file_name) for checker in checkers]
+        for i, (checker, future) in enumerate(zip(checkers, futures)):
+            # checkers queued behind others start when a worker is free
+            deadline = mark + timeout * (i // workers + 1)
+            try:
+                check, tau = future.result(timeout=max(0, deadline - time.time()))
+            except FutureTimeoutError:
+                check, tau = timed_out_check(checker), time.time() - mark
+                log.log(f"{checker.__class__.__name__} timed out ({tau:.3}s) for {file_name}")
+            else:
+                log.log(f"ran {checker.__class__.__name__} ({tau:.3}s) for {file_name}")
+            if check is not None:
+                check.submission = submission
+                checks.append(check)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    SubmissionCheck.objects.bulk_create(checks)
     tau = time.time() - mark
     log.log(f"ran submission checks ({tau:.3}s) for {file_name}")
 
@@ -920,41 +976,75 @@ def staging_path(filename, revision, ext):
     return pathlib.Path(settings.IDSUBMIT_STAGING_PATH) / f'{filename}-{revision}{ext}'
 
 
-def render_missing_formats(submission):
+@contextmanager
+def timed_stage(submission, stage):
+    """Record the seconds spent in a stage of processing in submission.timings
+
+    The timings are saved with the submission.
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        submission.timings[stage] = round(time.monotonic() - start, 3)
+
+
+def parse_submission_xml(submission):
+    """Parse the XML of a submission, converted to the xml2rfc v3 schema
+
+    Returns the XmlRfc tree and the submitted xml version. The tree keeps
+    comments, as needed for rendering, see xml_draft_from_tree().
+    """
+    xml_path = staging_path(submission.name, submission.rev, '.xml')
+    with timed_stage(submission, 'parse_xml'):
+        return XMLDraft.parse_xml(str(xml_path), remove_comments=False)
+
+
+def xml_draft_from_tree(xmltree, xml_version):
+    """Make an XMLDraft from a tree from parse_submission_xml(), for metadata extraction
+
+    The XMLDraft gets a copy of the tree without comments, as if it had
+    parsed the file itself, so the tree can still be prepped and rendered.
+    """
+    draft_tree = copy.copy(xmltree)
+    draft_tree.tree = copy.deepcopy(xmltree.tree)
+    etree.strip_tags(draft_tree.tree, etree.Comment)
+    return XMLDraft(xmltree=draft_tree, xml_version=xml_version)
+
+
+def render_missing_formats(submission, xmltree=None, xml_version=None):
     """Generate txt and html formats from xml draft
 
     If a txt file already exists, leaves it in place. Overwrites an existing html file
-    if there is one.
+    if there is one. If xmltree is given, it must come from parse_submission_xml(); it
+    is prepped in place, so can't be used for anything else afterwards.
     """
     xml2rfc.log.write_out = io.StringIO()   # open(os.devnull, "w")
     xml2rfc.log.write_err = io.StringIO()   # open(os.devnull, "w")
     xml_path = staging_path(submission.name, submission.rev, '.xml')
-    parser = xml2rfc.XmlRfcParser(str(xml_path), quiet=True)
-    # --- Parse the xml ---
-    xmltree = parser.parse(remove_comments=False)
-    # If we have v2, run it through v2v3. Keep track of the submitted version, though.
-    xmlroot = xmltree.getroot()
-    xml_version = xmlroot.get('version', '2')
-    if xml_version == '2':
-        v2v3 = xml2rfc.V2v3XmlWriter(xmltree)
-        xmltree.tree = v2v3.convert2to3()
+    if xmltree is None:
+        # --- Parse the xml ---
+        # If we have v2, it is run through v2v3. Keep track of the submitted version, though.
+        xmltree, xml_version = parse_submission_xml(submission)
 
     # --- Prep the xml ---
     today = date_today()
-    prep = xml2rfc.PrepToolWriter(xmltree, quiet=True, liberal=True, keep_pis=[xml2rfc.V3_PI_TARGET])
-    prep.options.accept_prepped = True
-    prep.options.date = today
-    xmltree.tree = prep.prep()
+    with timed_stage(submission, 'prep_xml'):
+        prep = xml2rfc.PrepToolWriter(xmltree, quiet=True, liberal=True, keep_pis=[xml2rfc.V3_PI_TARGET])
+        prep.options.accept_prepped = True
+        prep.options.date = today
+        xmltree.tree = prep.prep()
     if xmltree.tree == None:
         raise SubmissionError(f'Error from xml2rfc (prep): {prep.errors}')
 
     # --- Convert to txt ---
     txt_path = staging_path(submission.name, submission.rev, '.txt')
     if not txt_path.exists():
-        writer = xml2rfc.TextWriter(xmltree, quiet=True)
-        writer.options.accept_prepped = True
-        writer.options.date = today
-        writer.write(txt_path)
+        with timed_stage(submission, 'render_txt'):
+            writer = xml2rfc.TextWriter(xmltree, quiet=True)
+            writer.options.accept_prepped = True
+            writer.options.date = today
+            writer.write(txt_path)
         log.log(
             'In %s: xml2rfc %s generated %s from %s (version %s)' % (
                 str(xml_path.parent),
@@ -967,9 +1057,10 @@ def render_missing_formats(submission):
 
     # --- Convert to html ---
     html_path = staging_path(submission.name, submission.rev, '.html')
-    writer = xml2rfc.HtmlWriter(xmltree, quiet=True)
-    writer.options.date = today
-    writer.write(str(html_path))
+    with timed_stage(submission, 'render_html'):
+        writer = xml2rfc.HtmlWriter(xmltree, quiet=True)
+        writer.options.date = today
+        writer.write(str(html_path))
     log.log(
         'In %s: xml2rfc %s generated %s from %s (version %s)' % (
             str(xml_path.parent),
@@ -1134,10 +1225,14 @@ def _normalize_title(title):
     return normalize_text(title)  # normalize whitespace
 
 
-def process_submission_xml(filename, revision):
-    """Validate and extract info from an uploaded submission"""
-    xml_path = staging_path(filename, revision, '.xml')
-    xml_draft = XMLDraft(xml_path)
+def process_submission_xml(filename, revision, xml_draft=None):
+    """Validate and extract info from an uploaded submission
+
+    Parses the XML file, unless the XMLDraft is given.
+    """
+    if xml_draft is None:
+        xml_path = staging_path(filename, revision, '.xml')
+        xml_draft = XMLDraft(xml_path)
 
     if filename != xml_draft.filename:
         raise SubmissionError(
@@ -1259,12 +1354,18 @@ def process_and_validate_submission(submission):
 
     try:
         xml_metadata = None
-        # Parse XML first, if we have it
+        # Parse XML first, if we have it. It is parsed once, for both the
+        # metadata and the rendering.
         if ".xml" in submission.file_types:
-            xml_metadata = process_submission_xml(submission.name, submission.rev)
-            render_missing_formats(submission)  # makes HTML and text, unless text was uploaded
+            xmltree, xml_version = parse_submission_xml(submission)
+            xml_metadata = process_submission_xml(
+                submission.name, submission.rev, xml_draft_from_tree(xmltree, xml_version),
+            )
+            # makes HTML and text, unless text was uploaded
+            render_missing_formats(submission, xmltree, xml_version)
         # Parse text, whether uploaded or generated from XML
-        text_metadata = process_submission_text(submission.name, submission.rev)
+        with timed_stage(submission, 'process_txt'):
+            text_metadata = process_submission_text(submission.name, submission.rev)
 
         if (
             ".txt" in submission.file_types
@@ -1302,20 +1403,22 @@ def process_and_validate_submission(submission):
         submission.words = text_metadata["words"]
         submission.first_two_pages = text_metadata["first_two_pages"]
         submission.file_size = text_metadata["file_size"]
-        submission.save()
-        submission.formal_languages.set(text_metadata["formal_languages"])
-
-        consistency_error = check_submission_revision_consistency(submission)
-        if consistency_error:
-            raise InconsistentRevisionError(consistency_error)
-        set_extresources_from_existing_draft(submission)
-        apply_checkers(
-            submission,
-            {
-                ext: staging_path(submission.name, submission.rev, ext)
-                for ext in ['xml', 'txt', 'html']
-            }
-        )
+        with timed_stage(submission, 'save_metadata'):
+            submission.save()
+            submission.formal_languages.set(text_metadata["formal_languages"])
+
+            consistency_error = check_submission_revision_consistency(submission)
+            if consistency_error:
+                raise InconsistentRevisionError(consistency_error)
+            set_extresources_from_existing_draft(submission)
+        with timed_stage(submission, 'checkers'):
+            apply_checkers(
+                submission,
+                {
+                    ext: staging_path(submission.name, submission.rev, ext)
+                    for ext in ['xml', 'txt', 'html']
+                }
+            )
         errors = [c.message for c in submission.checks.filter(passed__isnull=False) if not c.passed]
         if len(errors) > 0:
             raise SubmissionError('Checks failed: ' + ' / '.join(errors))
@@ -1326,6 +1429,8 @@ def process_and_validate_submission(submission):
         log.log(f'Unexpected exception while processing submission {submission.pk}.')
         log.log(traceback.format_exc())
         raise SubmissionError('A system error occurred while processing the submission.')
+    finally:
+        Submission.objects.filter(pk=submission.pk).update(timings=submission.timings)
 
 
 def submitter_is_author(submission):
@@ -0,0 +1,11 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+from django.contrib import admin
+
+from ietf.sync.models import RfcIndexFingerprint
+
+
+class RfcIndexFingerprintAdmin(admin.ModelAdmin):
+    list_display = ["rfc_number", "fingerprint", "time"]
+    search_fields = ["rfc_number"]
+admin.site.register(RfcIndexFingerprint, RfcIndexFingerprintAdmin)
@@ -0,0 +1,36 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="RfcIndexFingerprint",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rfc_number", models.PositiveIntegerField(unique=True)),
+                ("fingerprint", models.CharField(max_length=64)),
+                (
+                    "time",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="When the entry was last synced",
+                    ),
+                ),
+            ],
+        ),
+    ]
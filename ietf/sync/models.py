@@ -0,0 +1,21 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+
+from django.db import models
+from django.utils import timezone
+
+import debug                            # pyflakes:ignore
+
+
+class RfcIndexFingerprint(models.Model):
+    """Fingerprint of an RFC's entry in the RFC Editor index, and of its errata, when last synced
+
+    See ietf.sync.rfceditor.rfc_index_fingerprint().
+    """
+    rfc_number = models.PositiveIntegerField(unique=True)
+    fingerprint = models.CharField(max_length=64)
+    time = models.DateTimeField(default=timezone.now, help_text="When the entry was last synced")
+
+    def __str__(self):
+        return f"RFC {self.rfc_number} index fingerprint {self.fingerprint}"
@@ -0,0 +1,27 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+# -*- coding: utf-8 -*-
+
+
+from tastypie.resources import ModelResource
+from tastypie.constants import ALL
+from tastypie.cache import SimpleCache
+
+from ietf import api
+
+from ietf.sync.models import RfcIndexFingerprint
+
+
+class RfcIndexFingerprintResource(ModelResource):
+    class Meta:
+        queryset = RfcIndexFingerprint.objects.all()
+        serializer = api.Serializer()
+        cache = SimpleCache()
+        #resource_name = 'rfcindexfingerprint'
+        ordering = ['id', ]
+        filtering = {
+            "id": ALL,
+            "rfc_number": ALL,
+            "fingerprint": ALL,
+            "time": ALL,
+        }
+api.sync.register(RfcIndexFingerprintResource())
@@ -4,14 +4,19 @@
 
 import base64
 import datetime
+import hashlib
+import json
 import re
 import requests
 
-from typing import Iterator, Optional, Union
+from collections import defaultdict
+from lxml import etree
+from typing import Iterator, NamedTuple, Optional, Union
 from urllib.parse import urlencode
 from xml.dom import pulldom, Node
 
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Subquery, OuterRef, F, Q
 from django.utils import timezone
 from django.utils.encoding import smart_bytes, force_str
@@ -19,13 +24,14 @@ from django.utils.encoding import smart_bytes, force_str
 import debug                            # pyflakes:ignore
 
 from ietf.doc.models import ( Document, State, StateType, DocEvent, DocRelationshipName,
-    DocTagName, RelatedDocument, RelatedDocHistory )
+    DocTagName, RelatedDocument, RelatedDocHistory, schedule_search_index_update )
 from ietf.doc.expire import move_draft_files_to_archive
 from ietf.doc.utils import add_state_change_event, prettify_std_name, update_action_holders
 from ietf.group.models import Group
 from ietf.ipr.models import IprDocRel
 from ietf.name.models import StdLevelName, StreamName
 from ietf.person.models import Person
+from ietf.sync.models import RfcIndexFingerprint
 from ietf.utils.log import log
 from ietf.utils.mail import send_mail_text
 from ietf.utils.timezone import datetime_from_date, RPC_TZINFO
@@ -241,8 +247,38 @@ def update_drafts_from_queue(drafts):
     return changed, warnings
 
 
+class RfcIndexEntry(NamedTuple):
+    """An rfc-entry from the RFC Editor index, see parse_index()"""
+    rfc_number: int
+    title: str
+    authors: list[str]
+    rfc_published_date: datetime.date
+    current_status: str
+    updates: list[str]
+    updated_by: list[str]
+    obsoletes: list[str]
+    obsoleted_by: list[str]
+    also: list[str]
+    draft: str
+    has_errata: bool
+    stream: str
+    wg: Optional[str]
+    file_formats: str
+    pages: str
+    abstract: str
+
+
+MONTHS = ["January","February","March","April","May","June","July","August","September","October","November","December"]
+
 def parse_index(response):
-    """Parse RFC Editor index XML into a bunch of tuples."""
+    """Parse RFC Editor index XML into a list of RfcIndexEntry tuples
+
+    The XML is parsed incrementally from response, a binary file-like object, and
+    each entry is discarded once it has been read, so neither the text nor
+    the tree of the whole index is held in memory.  The list can only be
+    returned at the end, as the std-entries that fill in the also lists
+    come after the rfc-entries.
+    """
 
     def normalize_std_name(std_name):
         # remove zero padding
@@ -254,89 +290,253 @@ def parse_index(response):
                 pass
         return std_name
 
-    def extract_doc_list(parentNode, tagName):
-        l = []
-        for u in parentNode.getElementsByTagName(tagName):
-            for d in u.getElementsByTagName("doc-id"):
-                l.append(normalize_std_name(d.firstChild.data))
-        return l
+    def child_text(elem, tag):
+        return '\n\n'.join(child.text or '' for child in elem.iterchildren('{*}' + tag))
 
-    also_list = {}
+    def extract_doc_list(elem, tag):
+        return [ normalize_std_name(d.text)
+                 for l in elem.iter('{*}' + tag) for d in l.iter('{*}doc-id') ]
+
+    also_list: dict[str, list[str]] = {}
     data = []
-    events = pulldom.parse(response)
-    for event, node in events:
+    entry_tags = ('{*}rfc-entry', '{*}bcp-entry', '{*}fyi-entry', '{*}std-entry')
+    for _, elem in etree.iterparse(response, events=('end',), tag=entry_tags):
         try:
-            if event == pulldom.START_ELEMENT and node.tagName in ["bcp-entry", "fyi-entry", "std-entry"]:
-                events.expandNode(node)
-                node.normalize()
-                bcpid = normalize_std_name(get_child_text(node, "doc-id"))
-                doclist = extract_doc_list(node, "is-also")
-                for docid in doclist:
-                    if docid in also_list:
-                        also_list[docid].append(bcpid)
-                    else:
-                        also_list[docid] = [bcpid]
-
-            elif event == pulldom.START_ELEMENT and node.tagName == "rfc-entry":
-                events.expandNode(node)
-                node.normalize()
-                rfc_number = int(get_child_text(node, "doc-id")[3:])
-                title = get_child_text(node, "title")
-
-                authors = []
-                for author in node.getElementsByTagName("author"):
-                    authors.append(get_child_text(author, "name"))
-
-                d = node.getElementsByTagName("date")[0]
-                year = int(get_child_text(d, "year"))
-                month = get_child_text(d, "month")
-                month = ["January","February","March","April","May","June","July","August","September","October","November","December"].index(month)+1
-                rfc_published_date = datetime.date(year, month, 1)
-
-                current_status = get_child_text(node, "current-status").title()
-
-                updates = extract_doc_list(node, "updates") 
-                updated_by = extract_doc_list(node, "updated-by")
-                obsoletes = extract_doc_list(node, "obsoletes") 
-                obsoleted_by = extract_doc_list(node, "obsoleted-by")
-                pages = get_child_text(node, "page-count")
-                stream = get_child_text(node, "stream")
-                wg = get_child_text(node, "wg_acronym")
+            if etree.QName(elem).localname != "rfc-entry":
+                bcpid = normalize_std_name(child_text(elem, "doc-id"))
+                for docid in extract_doc_list(elem, "is-also"):
+                    also_list.setdefault(docid, []).append(bcpid)
+            else:
+                d = next(elem.iter('{*}date'))
+                month = MONTHS.index(child_text(d, "month")) + 1
+
+                wg = child_text(elem, "wg_acronym")
                 if wg and ((wg == "NON WORKING GROUP") or len(wg) > 15):
                     wg = None
 
-                l = []
-                for fmt in node.getElementsByTagName("format"):
-                    l.append(get_child_text(fmt, "file-format"))
-                file_formats = (",".join(l)).lower()
-
                 abstract = ""
-                for abstract in node.getElementsByTagName("abstract"):
-                    abstract = get_child_text(abstract, "p")
+                for a in elem.iter('{*}abstract'):
+                    abstract = child_text(a, "p")
 
-                draft = get_child_text(node, "draft")
+                draft = child_text(elem, "draft")
                 if draft and re.search(r"-\d\d$", draft):
                     draft = draft[0:-3]
 
-                if len(node.getElementsByTagName("errata-url")) > 0:
-                    has_errata = 1
-                else:
-                    has_errata = 0
-
-                data.append((rfc_number,title,authors,rfc_published_date,current_status,updates,updated_by,obsoletes,obsoleted_by,[],draft,has_errata,stream,wg,file_formats,pages,abstract))
+                data.append(RfcIndexEntry(
+                    rfc_number=int(child_text(elem, "doc-id")[3:]),
+                    title=child_text(elem, "title"),
+                    authors=[ child_text(author, "name") for author in elem.iter('{*}author') ],
+                    rfc_published_date=datetime.date(int(child_text(d, "year")), month, 1),
+                    current_status=child_text(elem, "current-status").title(),
+                    updates=extract_doc_list(elem, "updates"),
+                    updated_by=extract_doc_list(elem, "updated-by"),
+                    obsoletes=extract_doc_list(elem, "obsoletes"),
+                    obsoleted_by=extract_doc_list(elem, "obsoleted-by"),
+                    also=[],
+                    draft=draft,
+                    has_errata=next(elem.iter('{*}errata-url'), None) is not None,
+                    stream=child_text(elem, "stream"),
+                    wg=wg,
+                    file_formats=",".join(child_text(fmt, "file-format") for fmt in elem.iter('{*}format')).lower(),
+                    pages=child_text(elem, "page-count"),
+                    abstract=abstract,
+                ))
         except Exception as e:
             log("Exception when processing an RFC index entry: %s" % e)
-            log("node: %s" % node)
+            log("entry: %s" % etree.tostring(elem, encoding='unicode'))
             raise
+        # free the entry, and anything else read before it
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
     for d in data:
-        k = "RFC%d" % d[0]
+        k = "RFC%d" % d.rfc_number
         if k in also_list:
-            d[9].extend(also_list[k])
+            d.also.extend(also_list[k])
     return data
 
 
+# Change this to make the next sync process every entry, e.g. when the sync itself has changed
+RFC_INDEX_FINGERPRINT_VERSION = "1"
+
+def rfc_index_fingerprint(entry, doc_errata):
+    """Hash of an RfcIndexEntry and the errata records of the RFC"""
+    data = {
+        "version": RFC_INDEX_FINGERPRINT_VERSION,
+        "entry": entry._asdict(),
+        "errata": sorted(doc_errata, key=lambda er: json.dumps(er, sort_keys=True, default=str)),
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def save_rfc_index_fingerprints(fingerprints):
+    """Record the fingerprints, a dict from RFC number, of the entries that have been synced"""
+    now = timezone.now()
+    RfcIndexFingerprint.objects.bulk_create(
+        [RfcIndexFingerprint(rfc_number=n, fingerprint=f, time=now) for n, f in fingerprints.items()],
+        update_conflicts=True,
+        unique_fields=["rfc_number"],
+        update_fields=["fingerprint", "time"],
+        batch_size=1000,
+    )
+
+
+def condition_subseries_names(also, doc):
+    """Turn the 'also' list of an index entry into subseries document names, e.g. BCP0014 into bcp14"""
+    conditioned_also = []
+    for a in also:
+        a = a.lower()
+        subseries_slug = a[:3]
+        if subseries_slug not in ["bcp", "std", "fyi"]:
+            log(f"Unexpected 'also' relationship of {a} encountered for {doc}")
+            continue
+        maybe_number = a[3:].strip()
+        if not maybe_number.isdigit():
+            log(f"Unexpected 'also' subseries element identifier {a} encountered for {doc}")
+            continue
+        subseries_number = int(maybe_number)
+        name = f"{subseries_slug}{subseries_number}" # Note the lack of leading zeros
+        if name not in conditioned_also:
+            conditioned_also.append(name)
+    return conditioned_also
+
+
+def reconcile_rfc_relations(entries, system, first_sync_creating_subseries):
+    """Bring the obsoletes, updates and subseries relations of RFCs in line with the index
+
+    The entries are (doc, obsoletes, updates, also) for each RFC, with the lists as
+    they are in the index. The relations that should exist are worked out in memory
+    and compared with those in the database, fetched in a few queries, and only the
+    differences are written, with bulk inserts and deletes in one transaction.
+    Obsoletes and updates relations are only ever added, subseries memberships are
+    added and removed.
+
+    Returns (changes, events), dicts from RFC document pk to the list of change
+    descriptions for the summary event and to the list of events added to the RFC.
+    """
+    changes = defaultdict(list)
+    events = defaultdict(list)
+    if not entries:
+        return changes, events
+
+    relationship_names = {
+        r.slug: r for r in DocRelationshipName.objects.filter(slug__in=["obs", "updates"])
+    }
+    targets = {
+        d.name: d
+        for d in Document.objects.filter(
+            type_id="rfc",
+            name__in=set(n.lower() for _, obsoletes, updates, _ in entries for n in obsoletes + updates),
+        )
+    }
+    rfc_ids = [doc.pk for doc, _, _, _ in entries]
+    existing_relations = set(
+        RelatedDocument.objects.filter(
+            source_id__in=rfc_ids,
+            relationship_id__in=list(relationship_names),
+        ).values_list("source_id", "target_id", "relationship_id")
+    )
+    subseries = {doc.pk: condition_subseries_names(also, doc) for doc, _, _, also in entries}
+    subseries_docs = {
+        d.name: d
+        for d in Document.objects.filter(
+            type_id__in=["bcp", "std", "fyi"],
+            name__in=set(n for names in subseries.values() for n in names),
+        )
+    }
+    existing_memberships = defaultdict(dict)
+    for r in RelatedDocument.objects.filter(
+        relationship_id="contains", target_id__in=rfc_ids
+    ).select_related("source"):
+        existing_memberships[r.target_id][r.source.name] = r
+
+    new_relations = []
+    new_subseries_docs = []
+    new_memberships = []
+    removed_memberships = []
+    # (doc, type, desc) of the events, in the order they happened
+    new_events = []
+    for doc, obsoletes, updates, _ in entries:
+        for slug, names in [("obs", obsoletes), ("updates", updates)]:
+            seen = set()
+            for name in names:
+                target = targets.get(name.lower())
+                if target is None or target.pk in seen:
+                    continue
+                seen.add(target.pk)
+                if (doc.pk, target.pk, slug) not in existing_relations:
+                    existing_relations.add((doc.pk, target.pk, slug))
+                    new_relations.append(RelatedDocument(source=doc, target=target, relationship_id=slug))
+                    changes[doc.pk].append(
+                        "created {rel_name} relation between {src_name} and {tgt_name}".format(
+                            rel_name=relationship_names[slug].name.lower(),
+                            src_name=prettify_std_name(doc.name),
+                            tgt_name=prettify_std_name(target.name),
+                        )
+                    )
+
+        memberships = existing_memberships[doc.pk]
+        for subseries_doc_name in subseries[doc.pk]:
+            subseries_slug = subseries_doc_name[:3]
+            subseries_doc = subseries_docs.get(subseries_doc_name)
+            if subseries_doc is None:
+                # Leaving most things to the default intentionally
+                # Of note, title and stream are left to the defaults of "" and none.
+                subseries_doc = Document(type_id=subseries_slug, name=subseries_doc_name)
+                subseries_docs[subseries_doc_name] = subseries_doc
+                new_subseries_docs.append(subseries_doc)
+                if first_sync_creating_subseries:
+                    new_events.append((subseries_doc, f"{subseries_slug}_history_marker", f"No history of this {subseries_slug.upper()} document is currently available in the datatracker before this point"))
+                    new_events.append((subseries_doc, f"{subseries_slug}_doc_created", f"Imported {subseries_doc_name} into the datatracker via sync to the rfc-index"))
+                else:
+                    new_events.append((subseries_doc, f"{subseries_slug}_doc_created", f"Created {subseries_doc_name} via sync to the rfc-index"))
+            if subseries_doc_name not in memberships:
+                membership = RelatedDocument(source=subseries_doc, target=doc, relationship_id="contains")
+                memberships[subseries_doc_name] = membership
+                new_memberships.append(membership)
+                if first_sync_creating_subseries:
+                    new_events.append((subseries_doc, "sync_from_rfc_editor", f"Imported membership of {doc.name} in {subseries_doc_name} via sync to the rfc-index"))
+                    new_events.append((doc, f"{subseries_slug}_history_marker", f"No history of {subseries_doc_name.upper()} is currently available in the datatracker before this point"))
+                    new_events.append((doc, "sync_from_rfc_editor", f"Imported membership of {doc.name} in {subseries_doc_name} via sync to the rfc-index"))
+                else:
+                    new_events.append((subseries_doc, "sync_from_rfc_editor", f"Added {doc.name} to {subseries_doc_name}"))
+                    new_events.append((doc, "sync_from_rfc_editor", f"Added {doc.name} to {subseries_doc_name}"))
+
+        for subseries_doc_name, membership in list(memberships.items()):
+            if subseries_doc_name not in subseries[doc.pk]:
+                assert(not first_sync_creating_subseries)
+                del memberships[subseries_doc_name]
+                removed_memberships.append(membership)
+                new_events.append((doc, "sync_from_rfc_editor", f"Removed {doc.name} from {subseries_doc_name}"))
+                new_events.append((membership.source, "sync_from_rfc_editor", f"Removed {doc.name} from {subseries_doc_name}"))
+
+    with transaction.atomic():
+        # subseries documents have no history to save, so bulk_create is fine here
+        Document.objects.bulk_create(new_subseries_docs)
+        RelatedDocument.objects.bulk_create(new_relations + new_memberships)
+        RelatedDocument.objects.filter(pk__in=[r.pk for r in removed_memberships]).delete()
+        doc_events = [DocEvent(doc=d, type=t, by=system, desc=desc) for d, t, desc in new_events]
+        DocEvent.objects.bulk_create(doc_events)
+
+    for e in doc_events:
+        if e.doc.type_id == "rfc":
+            events[e.doc.pk].append(e)
+    # bulk_create() doesn't send the post_save signals that keep the search
+    # index up to date, so the documents it touched are updated here. The
+    # queryset delete() above does send post_delete for each relation.
+    changed_ids = set(d.pk for d in new_subseries_docs)
+    changed_ids.update(r.target_id for r in new_memberships)
+    if changed_ids:
+        schedule_search_index_update(changed_ids)
+
+    return changes, events
+
+
 def update_docs_from_rfc_index(
-    index_data, errata_data, skip_older_than_date: Optional[datetime.date] = None
+    index_data,
+    errata_data,
+    skip_older_than_date: Optional[datetime.date] = None,
+    skip_unchanged: bool = False,
 ) -> Iterator[tuple[int, list[str], Document, bool]]:
     """Given parsed data from the RFC Editor index, update the documents in the database
 
@@ -344,6 +544,11 @@ def update_docs_from_rfc_index(
     RFC document and, if applicable, the I-D that it came from.
 
     The skip_older_than_date is a bare date, not a datetime.
+
+    The fingerprint of each entry that is processed is recorded, see
+    rfc_index_fingerprint(). With skip_unchanged, entries whose fingerprint is
+    the same as when they were last processed are skipped, so only the RFCs
+    with changes in the index or in their errata are looked at.
     """
     # Create dict mapping doc-id to list of errata records that apply to it
     errata: dict[str, list[dict]] = {}
@@ -377,14 +582,43 @@ def update_docs_from_rfc_index(
 
     tag_has_errata = DocTagName.objects.get(slug="errata")
     tag_has_verified_errata = DocTagName.objects.get(slug="verified-errata")
-    relationship_obsoletes = DocRelationshipName.objects.get(slug="obs")
-    relationship_updates = DocRelationshipName.objects.get(slug="updates")
     rfc_published_state = State.objects.get(type_id="rfc", slug="published")
 
     system = Person.objects.get(name="(System)")
 
     first_sync_creating_subseries = not Document.objects.filter(type_id__in=["bcp","std","fyi"]).exists()
 
+    index_data = [RfcIndexEntry(*entry) for entry in index_data]
+    if skip_older_than_date:
+        # speed up the process by skipping old entries
+        index_data = [entry for entry in index_data if entry.rfc_published_date >= skip_older_than_date]
+    fingerprints = {
+        entry.rfc_number: rfc_index_fingerprint(entry, errata.get(f"RFC{entry.rfc_number}", []))
+        for entry in index_data
+    }
+    if skip_unchanged and not first_sync_creating_subseries:
+        previous = dict(RfcIndexFingerprint.objects.values_list("rfc_number", "fingerprint"))
+        index_data = [entry for entry in index_data if previous.get(entry.rfc_number) != fingerprints[entry.rfc_number]]
+
+    # Fetch what is needed for the entries to be processed up front, rather than per entry
+    drafts = {
+        d.name: d
+        for d in Document.objects.filter(
+            type_id="draft", name__in=[entry.draft for entry in index_data if entry.draft]
+        ).prefetch_related("states")
+    }
+    rfcs = {
+        d.rfc_number: d
+        for d in Document.objects.filter(
+            type_id="rfc", rfc_number__in=[entry.rfc_number for entry in index_data]
+        ).prefetch_related("states", "tags")
+    }
+    # The obsoletes, updates and subseries relations of the RFCs, and the summary event of
+    # each RFC, are done after all the entries have been read, see reconcile_rfc_relations()
+    relation_entries = []
+    pending = []
+    synced = {}
+
     for (
         rfc_number,
         title,
@@ -404,11 +638,6 @@ def update_docs_from_rfc_index(
         pages,
         abstract,
     ) in index_data:
-        if skip_older_than_date and rfc_published_date < skip_older_than_date:
-            # speed up the process by skipping old entries (n.b., the comparison above is a
-            # lexical comparison between "YYYY-MM-DD"-formatted dates)
-            continue
-
         # we assume two things can happen: we get a new RFC, or an
         # attribute has been updated at the RFC Editor (RFC Editor
         # attributes take precedence over our local attributes)
@@ -417,25 +646,22 @@ def update_docs_from_rfc_index(
         rfc_published = False
 
         # Find the draft, if any
-        draft = None
-        if draft_name:
-            try:
-                draft = Document.objects.get(name=draft_name, type_id="draft")
-            except Document.DoesNotExist:
-                pass
-                # Logging below warning turns out to be unhelpful - there are many references
-                # to such things in the index:
-                # * all april-1 RFCs have an internal name that looks like a draft name, but there 
-                # was never such a draft. More of these will exist in the future
-                # * Several documents were created with out-of-band input to the RFC-editor, for a
-                # variety of reasons.
-                #
-                # What this exposes is that the rfc-index needs to stop talking about these things.
-                # If there is no draft to point to, don't point to one, even if there was an RPC
-                # internal name in use (and in the RPC database). This will be a requirement on the
-                # reimplementation of the creation of the rfc-index.
-                # 
-                # log(f"Warning: RFC index for {rfc_number} referred to unknown draft {draft_name}")
+        draft = drafts.get(draft_name) if draft_name else None
+        if draft_name and draft is None:
+            # Logging below warning turns out to be unhelpful - there are many references
+            # to such things in the index:
+            # * all april-1 RFCs have an internal name that looks like a draft name, but there 
+            # was never such a draft. More of these will exist in the future
+            # * Several documents were created with out-of-band input to the RFC-editor, for a
+            # variety of reasons.
+            #
+            # What this exposes is that the rfc-index needs to stop talking about these things.
+            # If there is no draft to point to, don't point to one, even if there was an RPC
+            # internal name in use (and in the RPC database). This will be a requirement on the
+            # reimplementation of the creation of the rfc-index.
+            # 
+            # log(f"Warning: RFC index for {rfc_number} referred to unknown draft {draft_name}")
+            pass
 
         # Find or create the RFC document
         creation_args: dict[str, Optional[Union[str, int]]] = {"name": f"rfc{rfc_number}"}
@@ -455,10 +681,11 @@ def update_docs_from_rfc_index(
                     "note": draft.note,
                 }
             )
-        doc, created_rfc = Document.objects.get_or_create(
-            rfc_number=rfc_number, type_id="rfc", defaults=creation_args
-        )
+        doc = rfcs.get(rfc_number)
+        created_rfc = doc is None
         if created_rfc:
+            doc = Document.objects.create(rfc_number=rfc_number, type_id="rfc", **creation_args)
+            rfcs[rfc_number] = doc
             rfc_changes.append(f"created document {prettify_std_name(doc.name)}")
             doc.set_state(rfc_published_state)
             if draft:
@@ -627,97 +854,16 @@ def update_docs_from_rfc_index(
             )
             rfc_published = True
 
-        def parse_relation_list(l):
-            res = []
-            for x in l:
-                for a in Document.objects.filter(name=x.lower(), type_id="rfc"):
-                    if a not in res:
-                        res.append(a)
-            return res
-
-        for x in parse_relation_list(obsoletes):
-            if not RelatedDocument.objects.filter(
-                source=doc, target=x, relationship=relationship_obsoletes
-            ):
-                r = RelatedDocument.objects.create(
-                    source=doc, target=x, relationship=relationship_obsoletes
-                )
-                rfc_changes.append(
-                    "created {rel_name} relation between {src_name} and {tgt_name}".format(
-                        rel_name=r.relationship.name.lower(),
-                        src_name=prettify_std_name(r.source.name),
-                        tgt_name=prettify_std_name(r.target.name),
-                    )
-                )
-
-        for x in parse_relation_list(updates):
-            if not RelatedDocument.objects.filter(
-                source=doc, target=x, relationship=relationship_updates
-            ):
-                r = RelatedDocument.objects.create(
-                    source=doc, target=x, relationship=relationship_updates
-                )
-                rfc_changes.append(
-                    "created {rel_name} relation between {src_name} and {tgt_name}".format(
-                        rel_name=r.relationship.name.lower(),
-                        src_name=prettify_std_name(r.source.name),
-                        tgt_name=prettify_std_name(r.target.name),
-                    )
-                )
-
-        if also:
-            # recondition also to have proper subseries document names:
-            conditioned_also = []
-            for a in also:
-                a = a.lower()
-                subseries_slug = a[:3]
-                if subseries_slug not in ["bcp", "std", "fyi"]:
-                    log(f"Unexpected 'also' relationship of {a} encountered for {doc}")
-                    next
-                maybe_number = a[3:].strip()
-                if not maybe_number.isdigit():
-                    log(f"Unexpected 'also' subseries element identifier {a} encountered for {doc}")
-                    next
-                else:
-                    subseries_number = int(maybe_number)
-                    conditioned_also.append(f"{subseries_slug}{subseries_number}") # Note the lack of leading zeros
-            also = conditioned_also
-
-            for a in also:
-                subseries_doc_name = a
-                subseries_slug=a[:3]
-                # Leaving most things to the default intentionally
-                # Of note, title and stream are left to the defaults of "" and none.
-                subseries_doc, created = Document.objects.get_or_create(type_id=subseries_slug, name=subseries_doc_name)
-                if created:
-                    if first_sync_creating_subseries:
-                        subseries_doc.docevent_set.create(type=f"{subseries_slug}_history_marker", by=system, desc=f"No history of this {subseries_slug.upper()} document is currently available in the datatracker before this point")
-                        subseries_doc.docevent_set.create(type=f"{subseries_slug}_doc_created", by=system, desc=f"Imported {subseries_doc_name} into the datatracker via sync to the rfc-index")
-                    else:
-                        subseries_doc.docevent_set.create(type=f"{subseries_slug}_doc_created", by=system, desc=f"Created {subseries_doc_name} via sync to the rfc-index")
-                _, relationship_created = subseries_doc.relateddocument_set.get_or_create(relationship_id="contains", target=doc)
-                if relationship_created:
-                    if first_sync_creating_subseries:
-                        subseries_doc.docevent_set.create(type="sync_from_rfc_editor", by=system, desc=f"Imported membership of {doc.name} in {subseries_doc.name} via sync to the rfc-index")
-                        rfc_events.append(doc.docevent_set.create(type=f"{subseries_slug}_history_marker", by=system, desc=f"No history of {subseries_doc.name.upper()} is currently available in the datatracker before this point"))
-                        rfc_events.append(doc.docevent_set.create(type="sync_from_rfc_editor", by=system, desc=f"Imported membership of {doc.name} in {subseries_doc.name} via sync to the rfc-index"))
-                    else:
-                        subseries_doc.docevent_set.create(type="sync_from_rfc_editor", by=system, desc=f"Added {doc.name} to {subseries_doc.name}")
-                        rfc_events.append(doc.docevent_set.create(type="sync_from_rfc_editor", by=system, desc=f"Added {doc.name} to {subseries_doc.name}"))
-
-        for subdoc in doc.related_that("contains"):
-            if subdoc.name not in also:
-                assert(not first_sync_creating_subseries)
-                subseries_doc.relateddocument_set.filter(target=subdoc).delete()
-                rfc_events.append(doc.docevent_set.create(type="sync_from_rfc_editor", by=system, desc=f"Removed {doc.name} from {subseries_doc.name}"))
-                subseries_doc.docevent_set.create(type="sync_from_rfc_editor", by=system, desc=f"Removed {doc.name} from {subseries_doc.name}")
+        relation_entries.append((doc, obsoletes, updates, also))
+        relation_changes_at = len(rfc_changes)
 
         doc_errata = errata.get(f"RFC{rfc_number}", [])
         all_rejected = doc_errata and all(
             er["errata_status_code"] == "Rejected" for er in doc_errata
         )
+        doc_tags = set(doc.tags.all())
         if has_errata and not all_rejected:
-            if not doc.tags.filter(pk=tag_has_errata.pk).exists():
+            if tag_has_errata not in doc_tags:
                 doc.tags.add(tag_has_errata)
                 rfc_changes.append("added Errata tag")
             has_verified_errata = any(
@@ -725,21 +871,28 @@ def update_docs_from_rfc_index(
             )
             if (
                 has_verified_errata
-                and not doc.tags.filter(pk=tag_has_verified_errata.pk).exists()
+                and tag_has_verified_errata not in doc_tags
             ):
                 doc.tags.add(tag_has_verified_errata)
                 rfc_changes.append("added Verified Errata tag")
         else:
-            if doc.tags.filter(pk=tag_has_errata.pk):
+            if tag_has_errata in doc_tags:
                 doc.tags.remove(tag_has_errata)
                 if all_rejected:
                     rfc_changes.append("removed Errata tag (all errata rejected)")
                 else:
                     rfc_changes.append("removed Errata tag")
-            if doc.tags.filter(pk=tag_has_verified_errata.pk):
+            if tag_has_verified_errata in doc_tags:
                 doc.tags.remove(tag_has_verified_errata)
                 rfc_changes.append("removed Verified Errata tag")
 
+        pending.append((rfc_number, doc, rfc_changes, relation_changes_at, rfc_events, rfc_published))
+
+    relation_changes, relation_events = reconcile_rfc_relations(relation_entries, system, first_sync_creating_subseries)
+
+    for rfc_number, doc, rfc_changes, relation_changes_at, rfc_events, rfc_published in pending:
+        rfc_changes[relation_changes_at:relation_changes_at] = relation_changes.get(doc.pk, [])
+        rfc_events.extend(relation_events.get(doc.pk, []))
         if rfc_changes:
             rfc_events.append(
                 DocEvent.objects.create(
@@ -752,6 +905,12 @@ def update_docs_from_rfc_index(
             )
             doc.save_with_history(rfc_events)
             yield rfc_number, rfc_changes, doc, rfc_published  # yield changes to the RFC
+
+        synced[rfc_number] = fingerprints[rfc_number]
+        if len(synced) >= 500:
+            save_rfc_index_fingerprints(synced)
+            synced.clear()
+    save_rfc_index_fingerprints(synced)
     
     if first_sync_creating_subseries:
         # First - create the known subseries documents that have ghosted. 
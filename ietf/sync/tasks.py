@@ -3,10 +3,10 @@
 # Celery task definitions
 #
 import datetime
-import io
 import requests
 
 from celery import shared_task
+from urllib3.exceptions import ReadTimeoutError
 
 from django.conf import settings
 from django.utils import timezone
@@ -14,40 +14,38 @@ from django.utils import timezone
 from ietf.sync import iana
 from ietf.sync import rfceditor
 from ietf.utils import log
-from ietf.utils.timezone import date_today
 
 
 @shared_task
 def rfc_editor_index_update_task(full_index=False):
     """Update metadata from the RFC index
     
-    Default is to examine only changes in the past 365 days. Call with full_index=True to update
-    the full RFC index.
-    
-    According to comments on the original script, a year's worth took about 20s on production as of
-    August 2022
+    Default is to examine only the entries that have changed, in the index or in their errata,
+    since they were last examined. Call with full_index=True to examine every entry of the
+    RFC index.
     
     The original rfc-editor-index-update script had a long-disabled provision for running the
     rebuild_reference_relations scripts after the update. That has not been brought over
     at all because it should be implemented as its own task if it is needed.
     """
-    skip_date = None if full_index else date_today() - datetime.timedelta(days=365)
     log.log(
-        "Updating document metadata from RFC index going back to {since}, from {url}".format(
-            since=skip_date if skip_date is not None else "the beginning",
+        "Updating document metadata from {which} of the RFC index, from {url}".format(
+            which="all entries" if full_index else "changed entries",
             url=settings.RFC_EDITOR_INDEX_URL,
         )
     )
     try:
-        response = requests.get(
+        # the index is parsed as it is received, rather than read into memory first
+        with requests.get(
             settings.RFC_EDITOR_INDEX_URL,
             timeout=30,  # seconds
-        )
-    except requests.Timeout as exc:
+            stream=True,
+        ) as response:
+            response.raw.decode_content = True  # undo any content-encoding, e.g. gzip
+            index_data = rfceditor.parse_index(response.raw)
+    except (requests.Timeout, ReadTimeoutError) as exc:  # the latter from reading response.raw
         log.log(f'GET request timed out retrieving RFC editor index: {exc}')
         return  # failed
-    rfc_index_xml = response.text
-    index_data = rfceditor.parse_index(io.StringIO(rfc_index_xml))
     try:
         response = requests.get(
             settings.RFC_EDITOR_ERRATA_JSON_URL,
@@ -64,7 +62,7 @@ def rfc_editor_index_update_task(full_index=False):
         log.log("Not enough errata entries, only %s" % len(errata_data))
         return  # failed
     for rfc_number, changes, doc, rfc_published in rfceditor.update_docs_from_rfc_index(
-        index_data, errata_data, skip_older_than_date=skip_date
+        index_data, errata_data, skip_unchanged=not full_index
     ):
         for c in changes:
             log.log("RFC%s, %s: %s" % (rfc_number, doc.name, c))
@@ -25,6 +25,7 @@ from ietf.doc.utils import add_state_change_event
 from ietf.group.factories import GroupFactory
 from ietf.person.models import Person
 from ietf.sync import iana, rfceditor, tasks
+from ietf.sync.models import RfcIndexFingerprint
 from ietf.utils.mail import outbox, empty_outbox
 from ietf.utils.test_utils import login_testing_unauthorized
 from ietf.utils.test_utils import TestCase
@@ -326,8 +327,9 @@ class RFCSyncTests(TestCase):
                 "update_date":"2019-09-10 09:09:03"},
         ]
 
-        data = rfceditor.parse_index(io.StringIO(t))
+        data = rfceditor.parse_index(io.BytesIO(t.encode()))
         self.assertEqual(len(data), 1)
+        self.assertIsInstance(data[0], rfceditor.RfcIndexEntry)
         rfc_number, title, authors, rfc_published_date, current_status, updates, updated_by, obsoletes, obsoleted_by, also, draft, has_errata, stream, wg, file_formats, pages, abstract = data[0]
 
         # currently, we only check what we actually use
@@ -451,6 +453,42 @@ class RFCSyncTests(TestCase):
         changed = list(rfceditor.update_docs_from_rfc_index(data, errata, today - datetime.timedelta(days=30)))
         self.assertEqual(len(changed), 0)
 
+        # the entry's fingerprint was recorded, so an unchanged entry is skipped
+        self.assertTrue(RfcIndexFingerprint.objects.filter(rfc_number=1234).exists())
+        Document.objects.filter(pk=rfc_doc.pk).update(title="Changed locally")
+        changed = list(rfceditor.update_docs_from_rfc_index(data, errata, skip_unchanged=True))
+        self.assertEqual(len(changed), 0)
+        self.assertEqual(Document.objects.get(pk=rfc_doc.pk).title, "Changed locally")
+
+        # new errata change the fingerprint, so the entry is processed again
+        errata.append(dict(errata[0], errata_id=2, **{"doc-id": "RFC1234"}))
+        changed = list(rfceditor.update_docs_from_rfc_index(data, errata, skip_unchanged=True))
+        self.assertEqual(len(changed), 1)
+        self.assertIn("changed title to 'A Testing RFC'", changed[0][1])
+        self.assertIn("added Verified Errata tag", changed[0][1])
+        changed = list(rfceditor.update_docs_from_rfc_index(data, errata, skip_unchanged=True))
+        self.assertEqual(len(changed), 0)
+
+        # subseries memberships are added and removed to match the index
+        data = [data[0]._replace(also=["BCP1", "BCP0002", "FYI1"])]
+        with self.captureOnCommitCallbacks(execute=True):
+            list(rfceditor.update_docs_from_rfc_index(data, errata, skip_unchanged=True))
+        self.assertCountEqual([d.name for d in rfc_doc.part_of()], ["bcp1", "bcp2", "fyi1"])
+        std2 = Document.objects.get(name="std2")
+        self.assertFalse(std2.contains())
+        self.assertTrue(std2.docevent_set.filter(desc="Removed rfc1234 from std2").exists())
+        self.assertTrue(rfc_doc.docevent_set.filter(desc="Removed rfc1234 from std2").exists())
+        bcp2 = Document.objects.get(name="bcp2")
+        self.assertEqual(bcp2.type_id, "bcp")
+        self.assertTrue(bcp2.docevent_set.filter(type="bcp_doc_created", desc="Created bcp2 via sync to the rfc-index").exists())
+        self.assertTrue(rfc_doc.docevent_set.filter(desc="Added rfc1234 to bcp2").exists())
+        rfc_doc = Document.objects.get(pk=rfc_doc.pk)
+        self.assertIn("bcp2", rfc_doc.search_index.subseries)
+        self.assertNotIn("std2", rfc_doc.search_index.subseries)
+        self.assertIn(" bcp2 ", rfc_doc.search_index.numbers)
+        # documents made with bulk_create get their entries too
+        self.assertEqual(bcp2.search_index.numbers, " bcp2 ")
+
     def _generate_rfc_queue_xml(self, draft, state, auth48_url=None):
         """Generate an RFC queue xml string for a draft"""
         t = '''<rfc-editor-queue xmlns="http://www.rfc-editor.org/rfc-editor-queue">
@@ -713,6 +751,16 @@ class TaskTests(TestCase):
             def json(self):
                 return MockIndexData(length=self.json_length)
 
+            @property
+            def raw(self):
+                return io.BytesIO(self.text.encode())
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
         # Response objects
         index_response = MockResponse(text="this is the index")
         errata_response = MockResponse(
@@ -733,9 +781,9 @@ class TaskTests(TestCase):
         self.assertTrue(parse_index_mock.called)
         (parse_index_args, _) = parse_index_mock.call_args
         self.assertEqual(
-            parse_index_args[0].read(),  # arg is a StringIO
-            "this is the index",
-            "parse_index is called with the index text in a StringIO",
+            parse_index_args[0].read(),  # arg is the raw response stream
+            b"this is the index",
+            "parse_index is called with the response stream",
         )
 
         # Check update_docs_from_rfc_index call
@@ -744,7 +792,7 @@ class TaskTests(TestCase):
         self.assertEqual(
             update_docs_args, (parse_index_mock.return_value, errata_response.json())
         )
-        self.assertIsNotNone(update_docs_kwargs["skip_older_than_date"])
+        self.assertTrue(update_docs_kwargs["skip_unchanged"])
 
         # Test again with full_index = True
         requests_get_mock.reset_mock()
@@ -757,9 +805,9 @@ class TaskTests(TestCase):
         self.assertTrue(parse_index_mock.called)
         (parse_index_args, _) = parse_index_mock.call_args
         self.assertEqual(
-            parse_index_args[0].read(),  # arg is a StringIO
-            "this is the index",
-            "parse_index is called with the index text in a StringIO",
+            parse_index_args[0].read(),  # arg is the raw response stream
+            b"this is the index",
+            "parse_index is called with the response stream",
         )
 
         # Check update_docs_from_rfc_index call
@@ -768,7 +816,7 @@ class TaskTests(TestCase):
         self.assertEqual(
             update_docs_args, (parse_index_mock.return_value, errata_response.json())
         )
-        self.assertIsNone(update_docs_kwargs["skip_older_than_date"])
+        self.assertFalse(update_docs_kwargs["skip_unchanged"])
 
         # Test error handling
         requests_get_mock.reset_mock()
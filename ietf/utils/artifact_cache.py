@@ -0,0 +1,241 @@
+# Copyright The IETF Trust 2024, All Rights Reserved
+# -*- coding: utf-8 -*-
+"""
+File cache for rendered artifacts, such as htmlized and pdfized documents.
+
+Entries are keyed by a hash of everything the artifact was rendered from:
+the source text and a renderer version string.  A changed document or a
+new renderer gives a new key, so entries never have to be invalidated, and
+a new release doesn't empty the cache unless the renderers changed.
+
+ * Entries are written to a temporary file which is then renamed into
+   place, so readers never see a partial file.
+ * Only one process renders a given artifact at a time; other processes
+   asking for it wait for the file lock and then read the result.  The
+   lock files are shared by the keys ending in the same four hex digits,
+   so there are at most 65536 of them and they are never removed.
+ * When the size of the cache goes over its limit, the least recently used
+   entries are removed.  Each process checks the total size after having
+   written a tenth of the limit, so the limit can be exceeded by that much
+   per process between checks.
+ * Hits, misses, bytes written and evictions are counted in the default
+   Django cache, see stats().
+"""
+
+import fcntl
+import functools
+import hashlib
+import importlib
+import importlib.metadata
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+import debug                            # pyflakes:ignore
+
+from ietf.utils.log import log
+
+
+STATS = ("hits", "misses", "bytes_written", "evictions")
+
+# Bytes written by this process per cache directory since the last size check
+_written_since_check = {}
+
+
+class ArtifactCache:
+    def __init__(self, directory, max_bytes, lock_timeout=120):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+
+    @staticmethod
+    def key(kind, *parts):
+        """Return the key for an artifact of the given kind rendered from parts (str or bytes)"""
+        h = hashlib.sha256(kind.encode())
+        for part in parts:
+            h.update(b"\0")
+            h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        return f"{kind}-{h.hexdigest()}"
+
+    def path(self, key):
+        return os.path.join(self.directory, key[-2:], key)
+
+    def lock_path(self, key):
+        # removing a lock file while another process waits for it would let
+        # a third process lock a new file of the same name, so a bounded
+        # set of lock files is reused instead
+        return os.path.join(self.directory, key[-2:], f".lock-{key[-4:-2]}")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)      # the modification time is the time of last use
+        except FileNotFoundError:
+            pass
+        count("hits")
+        return data
+
+    def set(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        count("bytes_written", len(data))
+        written = _written_since_check.get(self.directory, 0) + len(data)
+        if written >= self.max_bytes / 10:
+            written = 0
+            self.evict()
+        _written_since_check[self.directory] = written
+
+    def get_or_render(self, kind, parts, render):
+        """Return the cached artifact, or call render() and cache its result
+
+        Only one process renders a given artifact at a time; the others
+        wait for it (up to lock_timeout seconds) and then use its result.
+        Nothing is cached if render() returns a false value.
+        """
+        key = self.key(kind, *parts)
+        data = self.get(key)
+        if data is not None:
+            return data
+        lock_path = self.lock_path(key)
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, "a") as lock_file:
+            locked = self._lock(lock_file)
+            try:
+                if locked:
+                    # rendered by another process while we were waiting?
+                    data = self.get(key)
+                    if data is not None:
+                        return data
+                count("misses")
+                data = render()
+                if data:
+                    self.set(key, data)
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return data
+
+    def _lock(self, lock_file):
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    log(f"Timed out waiting for artifact cache lock {lock_file.name}, rendering anyway")
+                    return False
+                time.sleep(0.1)
+
+    def entries(self):
+        """Yield (mtime, size, path) for each cached artifact"""
+        with os.scandir(self.directory) as subdirs:
+            for subdir in subdirs:
+                if not subdir.is_dir():
+                    continue
+                with os.scandir(subdir.path) as files:
+                    for entry in files:
+                        if entry.name.startswith("."):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        yield stat.st_mtime, stat.st_size, entry.path
+
+    def evict(self, target=0.9):
+        """Remove the least recently used entries if the cache is over its size limit"""
+        if not os.path.isdir(self.directory):
+            return
+        self._remove_stale_temp_files()
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes * target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        count("evictions", evicted)
+        log(f"Evicted {evicted} entries from the artifact cache in {self.directory}, {total} bytes left")
+
+    def _remove_stale_temp_files(self, age=3600):
+        # left behind by processes killed while writing
+        limit = time.time() - age
+        with os.scandir(self.directory) as subdirs:
+            for subdir in subdirs:
+                if not subdir.is_dir():
+                    continue
+                with os.scandir(subdir.path) as files:
+                    for entry in files:
+                        try:
+                            if entry.name.startswith(".tmp-") and entry.stat().st_mtime < limit:
+                                os.unlink(entry.path)
+                        except FileNotFoundError:
+                            pass
+
+
+@functools.lru_cache(maxsize=None)
+def renderer_version(module_name):
+    """Return the installed version of a renderer package, for artifact keys"""
+    try:
+        return importlib.metadata.version(module_name)
+    except importlib.metadata.PackageNotFoundError:
+        module = importlib.import_module(module_name)
+        return getattr(module, "__version__", "")
+
+
+def count(stat, n=1):
+    key = f"artifact_cache:{stat}"
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        cache.add(key, n, None)
+
+
+def stats():
+    """Return the counters, and the size of the cache on disk"""
+    result = dict((stat, cache.get(f"artifact_cache:{stat}", 0)) for stat in STATS)
+    artifact_cache = get_artifact_cache()
+    if artifact_cache and os.path.isdir(artifact_cache.directory):
+        sizes = [size for _, size, _ in artifact_cache.entries()]
+        result["entries"] = len(sizes)
+        result["bytes"] = sum(sizes)
+    return result
+
+
+def get_artifact_cache():
+    """Return the configured ArtifactCache, or None if caching is disabled"""
+    if not settings.ARTIFACT_CACHE_DIR:
+        return None
+    return ArtifactCache(settings.ARTIFACT_CACHE_DIR, settings.ARTIFACT_CACHE_MAX_BYTES)
+
+
+def get_or_render(kind, parts, render):
+    """Return the artifact from the configured cache, rendering it if needed"""
+    artifact_cache = get_artifact_cache()
+    if artifact_cache is None:
+        return render()
+    return artifact_cache.get_or_render(kind, parts, render)
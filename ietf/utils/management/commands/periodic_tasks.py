@@ -81,9 +81,8 @@ class Command(BaseCommand):
                 enabled=False,
                 crontab=self.crontabs["every_15m"],
                 description=(
-                    "Reparse the last _year_ of RFC index entries until "
-                    "https://github.com/ietf-tools/datatracker/issues/3734 is addressed. "
-                    "This takes about 20s on production as of 2022-08-11."
+                    "Sync the RFC index entries that have changed, in the index or in their "
+                    "errata, since they were last synced"
                 )
             ),
         )
@@ -111,6 +110,16 @@ class Command(BaseCommand):
             ),
         )
 
+        PeriodicTask.objects.get_or_create(
+            name="Compute NomCom eligibility snapshot",
+            task="ietf.nomcom.tasks.eligibility_snapshot_task",
+            defaults=dict(
+                enabled=False,
+                crontab=self.crontabs["daily"],
+                description="Store who is eligible for the upcoming NomCom once its eligibility date has passed",
+            ),
+        )
+
         PeriodicTask.objects.get_or_create(
             name="Send review reminders",
             task="ietf.review.tasks.send_review_reminders_task",
@@ -156,7 +165,7 @@ class Command(BaseCommand):
             task="ietf.idindex.tasks.idindex_update_task",
             defaults=dict(
                 enabled=False,
-                crontab=self.crontabs["hourly"],
+                crontab=self.crontabs["every_15m"],
                 description="Update I-D index files",
             ),
         )
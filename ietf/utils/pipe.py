@@ -1,10 +1,17 @@
-# Copyright The IETF Trust 2010-2020, All Rights Reserved
+# Copyright The IETF Trust 2010-2024, All Rights Reserved
 # -*- coding: utf-8 -*-
 
 
 # Simplified interface to os.popen3()
 
-def pipe(cmd, str=None):
+def pipe(cmd, str=None, timeout=None, env=None):
+    """Run cmd in a shell and return (returncode, stdout, stderr)
+
+    If timeout (seconds) is given and the command hasn't finished by then,
+    the command and any processes it started are killed, and
+    subprocess.TimeoutExpired is raised. If env is given, it replaces the
+    environment of the command.
+    """
     from subprocess import Popen, PIPE
     bufsize = 4096
     MAX = 65536*16
@@ -12,7 +19,10 @@ def pipe(cmd, str=None):
     if str and len(str) > 4096:                 # XXX: Hardcoded Linux 2.4, 2.6 pipe buffer size
         bufsize = len(str)
 
-    with Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, bufsize=bufsize, shell=True) as pipe:
+    if timeout is not None:
+        return _pipe_with_timeout(cmd, str, timeout, env, bufsize, MAX)
+
+    with Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, bufsize=bufsize, shell=True, env=env) as pipe:
         if not str is None:
             pipe.stdin.write(str)
             pipe.stdin.close()
@@ -32,3 +42,27 @@ def pipe(cmd, str=None):
                 break
 
     return (code, out, err)
+
+def _pipe_with_timeout(cmd, str, timeout, env, bufsize, MAX):
+    import os
+    import signal
+    from subprocess import Popen, PIPE, TimeoutExpired
+
+    # A session of its own, so that the whole process group started by the
+    # shell can be killed, not just the shell
+    with Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, bufsize=bufsize, shell=True,
+               env=env, start_new_session=True) as pipe:
+        try:
+            out, err = pipe.communicate(str, timeout=timeout)
+        except TimeoutExpired:
+            try:
+                os.killpg(pipe.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            pipe.communicate()
+            raise
+        code = pipe.returncode
+    if len(out) > MAX:
+        out = out[:MAX]
+        err = "Output exceeds %s bytes and has been truncated" % MAX
+    return (code, out, err)
@@ -51,6 +51,8 @@ from tempfile import NamedTemporaryFile
 
 import django.test
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.text import slugify
 
 import debug                            # pyflakes:ignore
@@ -293,6 +295,24 @@ class TestCase(django.test.TestCase):
         else:
             self.assertGreater(len(mlist), 0)
 
+    def assertQueryCountIndependentOfSize(self, func, small, large):
+        """
+        Asserts that func(small) and func(large) make the same number of
+        database queries, e.g. when *small* and *large* are lists of 10 and
+        1000 objects to process.  A warm-up call is made first, so caches
+        that get filled on first use don't count.
+        """
+        func(small)
+        counts = []
+        for arg in (small, large):
+            with CaptureQueriesContext(connection) as context:
+                func(arg)
+            counts.append(len(context.captured_queries))
+        if counts[0] != counts[1]:
+            queries = "\n".join(q["sql"] for q in context.captured_queries)
+            raise self.failureException(
+                "%s queries for %s items, but %s queries for %s items:\n%s" % (counts[0], len(small), counts[1], len(large), queries))
+
     def __str__(self):
         return u"%s (%s.%s)" % (self._testMethodName, strclass(self.__class__),self._testMethodName)
 
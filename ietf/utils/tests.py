@@ -3,11 +3,14 @@
 
 
 import datetime
+import glob
 import io
 import json
 import os.path
 import pytz
 import shutil
+import threading
+import time
 import types
 
 from mock import patch
@@ -26,6 +29,7 @@ from django.apps import apps
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.forms import Form
+from django.test import override_settings
 from django.template import Context
 from django.template import Template    # pyflakes:ignore
 from django.template.defaulttags import URLNode
@@ -36,6 +40,8 @@ from django.urls import reverse as urlreverse
 import debug                            # pyflakes:ignore
 
 from ietf.person.name import name_parts, unidecode_name
+from ietf.utils import artifact_cache
+from ietf.utils.artifact_cache import ArtifactCache
 from ietf.submit.tests import submission_file
 from ietf.utils.draft import PlaintextDraft, getmeta
 from ietf.utils.fields import SearchableField
@@ -598,3 +604,87 @@ class SearchableFieldTests(TestCase):
         self.assertTrue(changed_form.has_changed())
         unchanged_form = TestForm(initial={'test_field': [1]}, data={'test_field': [1]})
         self.assertFalse(unchanged_form.has_changed())
+
+
+class ArtifactCacheTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        super().tearDown()
+
+    def test_get_or_render(self):
+        cache = ArtifactCache(self.cache_dir, max_bytes=1000)
+        renders = []
+        def render(data):
+            def _render():
+                renders.append(data)
+                return data
+            return _render
+
+        self.assertEqual(cache.get_or_render("html", ["source", "v1"], render(b"one")), b"one")
+        self.assertEqual(cache.get_or_render("html", ["source", "v1"], render(b"two")), b"one")
+        self.assertEqual(renders, [b"one"])
+        # new source or renderer version means a new entry
+        self.assertEqual(cache.get_or_render("html", ["changed source", "v1"], render(b"three")), b"three")
+        self.assertEqual(cache.get_or_render("html", ["source", "v2"], render(b"four")), b"four")
+        self.assertEqual(cache.get_or_render("pdf", ["source", "v1"], render(b"five")), b"five")
+        # nothing cached if nothing is rendered
+        self.assertEqual(cache.get_or_render("html", ["empty"], render(None)), None)
+        self.assertEqual(cache.get_or_render("html", ["empty"], render(b"six")), b"six")
+        self.assertEqual(len(renders), 6)
+        self.assertFalse([name for _, _, files in os.walk(self.cache_dir) for name in files if name.startswith(".tmp-")])
+
+    def test_lru_eviction(self):
+        cache = ArtifactCache(self.cache_dir, max_bytes=1000)
+        keys = [cache.key("pdf", str(i)) for i in range(5)]
+        for i, key in enumerate(keys):
+            cache.set(key, b"x" * 200)
+            os.utime(cache.path(key), (1000 + i, 1000 + i))
+        # reading an entry makes it most recently used
+        self.assertEqual(cache.get(keys[0]), b"x" * 200)
+        cache.set(cache.key("pdf", "new"), b"y" * 300)      # over the limit, evicts down to 900 bytes
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNone(cache.get(keys[2]))
+        self.assertIsNotNone(cache.get(keys[3]))
+        self.assertLessEqual(sum(size for _, size, _ in cache.entries()), 900)
+
+    def test_concurrent_render(self):
+        cache = ArtifactCache(self.cache_dir, max_bytes=1000)
+        renders = []
+        def render():
+            renders.append(1)
+            time.sleep(0.5)
+            return b"rendered"
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_render("pdf", ["doc"], render))) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [b"rendered"] * 3)
+        self.assertEqual(len(renders), 1)
+
+    def test_lock_files(self):
+        cache = ArtifactCache(self.cache_dir, max_bytes=100000)
+        keys = [cache.key("pdf", str(i)) for i in range(50)]
+        for i in range(50):
+            cache.get_or_render("pdf", [str(i)], lambda: b"pdf")
+        # lock files are shared by keys ending alike, and aren't cache entries
+        lock_files = set(glob.glob(os.path.join(self.cache_dir, "*", ".lock-*")))
+        self.assertEqual(lock_files, set(cache.lock_path(key) for key in keys))
+        self.assertEqual(len(list(cache.entries())), 50)
+
+    def test_renderer_version(self):
+        self.assertTrue(artifact_cache.renderer_version("rfc2html"))
+
+    def test_disabled(self):
+        with override_settings(ARTIFACT_CACHE_DIR=None):
+            self.assertEqual(artifact_cache.get_or_render("pdf", ["doc"], lambda: b"pdf"), b"pdf")
+        with override_settings(ARTIFACT_CACHE_DIR=self.cache_dir):
+            self.assertEqual(artifact_cache.get_or_render("pdf", ["doc"], lambda: b"pdf"), b"pdf")
+            self.assertEqual(artifact_cache.get_or_render("pdf", ["doc"], lambda: b"other"), b"pdf")
+            self.assertEqual(artifact_cache.stats()["entries"], 1)
@@ -20,19 +20,23 @@ class XMLDraft(Draft):
 
     Not all methods from the superclass are implemented yet.
     """
-    def __init__(self, xml_file):
+    def __init__(self, xml_file=None, xmltree=None, xml_version=None):
         """Initialize XMLDraft instance
 
         :parameter xml_file: path to file containing XML source
+        :parameter xmltree: XML source already parsed with parse_xml(), instead of xml_file
+        :parameter xml_version: original xml version of xmltree
         """
         super().__init__()
-        # cast xml_file to str so, e.g., this will work with a Path
-        self.xmltree, self.xml_version = self.parse_xml(str(xml_file))
+        if xmltree is None:
+            # cast xml_file to str so, e.g., this will work with a Path
+            xmltree, xml_version = self.parse_xml(str(xml_file))
+        self.xmltree, self.xml_version = xmltree, xml_version
         self.xmlroot = self.xmltree.getroot()
         self.filename, self.revision = self._parse_docname()
 
     @staticmethod
-    def parse_xml(filename):
+    def parse_xml(filename, remove_comments=True):
         """Parse XML draft
 
         Converts to xml2rfc v3 schema, then returns the root of the v3 tree and the original
@@ -54,7 +58,7 @@ class XMLDraft(Draft):
 
             parser = xml2rfc.XmlRfcParser(filename, quiet=True)
             try:
-                tree = parser.parse()
+                tree = parser.parse(remove_comments=remove_comments)
             except XMLSyntaxError:
                 raise InvalidXMLError()
             except Exception as e: